@@ -1,108 +1,225 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS  # 新增這行
 import serial
 import random
+import threading
+from collections import deque
 from datetime import datetime
 import time
+import rfid_protocol as proto
+from encode_pipeline import EncodePipeline, find_fresh_tags, locate_epcs, make_job
+import response_formats
+from epc_schema import registry as epc_schemas
+from write_jobs import WriteJobStore, STATUS_DONE, STATUS_INTERRUPTED, STATUS_SENDING
+from serial_supervisor import SerialSupervisor
+from link_probe import profiles as link_profiles
+import simulated_reader
+import hex_codec
+import static_assets
+import sampling_profiler
+from encode_coordinator import EncodeCoordinator, LocalStation, RemoteStation, TagIdAllocator
 
 app = Flask(__name__)
 CORS(app)  # 新增這行，啟用 CORS
 
 class RFIDController:
-    def __init__(self, port='COM4', baudrate=115200):
-        self.serial_port = serial.Serial(port, baudrate, timeout=1)
+    def __init__(self, port='COM4', baudrate=115200, serial_factory=None, allocator=None):
+        # 標籤ID由共用的 TagIdAllocator 依序保留，與編碼訂單保留的範圍不會重複
+        self.allocator = allocator
+        # 串口由監控器管理，斷線時自動以指數退避重新連線；鮑率以 link_probe 保存的為準
+        self.supervisor = SerialSupervisor(port, link_profiles.baudrate(port, baudrate), timeout=1,
+                                           serial_factory=serial_factory)
+        self.lock = threading.Lock()
+        self.decoder = proto.FrameDecoder()
+        self.pending_frames = deque()
+        self.encode_history = deque(maxlen=1000)
+        # 本行程寫入並驗證過的EPC，綁定新標籤時略過這些標籤
+        self.encoded_epcs = set()
         
-    def generate_tag_id(self):
-        """產生4碼隨機UUID"""
+    @property
+    def serial_port(self):
+        """目前的串口，斷線時最多等待2秒重新連線"""
+        ser = self.supervisor.wait_connected(2.0)
+        if ser is None:
+            raise serial.SerialException(f"串口未連線: {self.supervisor.last_error}")
+        return ser
+
+    def generate_tag_id(self, product_id, day):
+        """產生4碼標籤ID：有 allocator 時保留下一個未使用的ID，否則隨機產生"""
+        if self.allocator is not None:
+            return f"{self.allocator.reserve(product_id.upper(), day, 1):04X}"
         return f"{random.randint(0, 0xFFFF):04X}"
         
-    def bytes_to_hex_string(self, data):
-        """將位元組資料轉換為十六進位字串"""
-        return ''.join([f"{b:02X}" for b in data])
-        
     def parse_epc_data(self, epc_data):
         """解析EPC資料"""
         try:
-            # 將位元組轉換為十六進位字串
-            hex_str = self.bytes_to_hex_string(epc_data)
-            
-            # 找到實際資料的起始位置（跳過前導0000）
-            if hex_str.startswith('0000'):
-                actual_data = hex_str[4:]
-            else:
-                actual_data = hex_str
+            # 跳過前導0000（memoryview切片，不複製資料）
+            actual = hex_codec.strip_pc(epc_data)
                 
-            # 確保數據長度足夠
-            if len(actual_data) < 22:
-                return {"error": f"數據長度不足（需要22字符，實際{len(actual_data)}字符）", 
-                        "raw_data": hex_str}
+            # 確保數據長度足夠（22字符 = 11位元組）
+            if len(actual) < 11:
+                return {"error": f"數據長度不足（需要22字符，實際{len(actual) * 2}字符）", 
+                        "raw_data": hex_codec.to_hex(epc_data)}
                 
-            # 解析各個欄位
-            tag_id = actual_data[0:4]         # 4碼UUID
-            product_id = actual_data[4:17]    # 13碼產品ID
-            year = actual_data[17:19]         # 年份
-            month = actual_data[19:20]        # 月份
-            day = actual_data[20:22]          # 日期
-
-            # 數值轉換
-            year_dec = 2000 + int(year, 16)   # 年份轉換
-            month_dec = int(month, 16)        # 月份轉換（16進制到十進制）
-            day_dec = int(day, 16)            # 日期轉換
+            # 依登錄的EPC格式自動辨識，欄位直接由位元組解析
+            data = hex_codec.decode_reply(epc_data)
+            if data is None:
+                return {"error": "無法辨識的EPC格式", "raw_data": hex_codec.to_hex(epc_data)}
 
             return {
                 "success": True,
-                "data": {
-                    "tag_id": tag_id,
-                    "product_id": product_id,
-                    "year": year_dec,
-                    "month": month_dec,
-                    "day": day_dec,
-                    "raw_data": actual_data
-                }
+                "data": data
             }
                 
         except Exception as e:
-            return {"error": str(e), "raw_data": hex_str}
+            return {"error": str(e), "raw_data": hex_codec.to_hex(epc_data)}
             
     def read_tag(self):
         """讀取標籤"""
         try:
-            # 發送讀取命令
-            command = bytes.fromhex("BB 00 22 00 00 22 7E")
-            self.serial_port.write(command)
-            
-            # 等待回應
-            time.sleep(0.1)
-            if self.serial_port.in_waiting:
-                data = self.serial_port.read(self.serial_port.in_waiting)
+            with self.lock:
+                # 發送讀取命令
+                command = bytes.fromhex("BB 00 22 00 00 22 7E")
+                self.serial_port.write(command)
                 
-                # 檢查回應格式
-                if len(data) > 3 and data[0] == 0xBB and data[1] == 0x02:
-                    if len(data) >= 21:
-                        epc_data = data[7:21]
-                        return self.parse_epc_data(epc_data)
+                # 等待回應
+                time.sleep(0.1)
+                if self.serial_port.in_waiting:
+                    data = self.serial_port.read(self.serial_port.in_waiting)
+                    
+                    # 檢查回應格式
+                    self.supervisor.record_rx()
+                    if len(data) > 3 and data[0] == 0xBB and data[1] == 0x02:
+                        if len(data) >= 21:
+                            epc_data = data[7:21]
+                            return self.parse_epc_data(epc_data)
                     
             return {"error": "無法讀取標籤數據"}
             
+        except (serial.SerialException, OSError) as e:
+            self.supervisor.report_error(e)
+            return {"error": f"讀取錯誤: {str(e)}"}
         except Exception as e:
             return {"error": f"讀取錯誤: {str(e)}"}
             
-    def write_tag(self, product_id):
+    def send_frames(self, frames):
+        """一次送出多個命令封包"""
+        try:
+            self.serial_port.write(b''.join(frames))
+        except (serial.SerialException, OSError) as e:
+            self.supervisor.report_error(e)
+            raise
+
+    def reset_input(self):
+        """清空接收緩衝與尚未處理的封包"""
+        self.decoder.reset()
+        self.pending_frames.clear()
+        try:
+            self.serial_port.reset_input_buffer()
+        except (serial.SerialException, OSError) as e:
+            self.supervisor.report_error(e)
+            raise
+
+    def read_response(self, timeout=1.0, notices=False):
+        """等待下一個命令回應封包（notices 為 False 時略過盤點通知），逾時傳回None"""
+        deadline = time.monotonic() + timeout
+        while True:
+            while self.pending_frames:
+                frame = self.pending_frames.popleft()
+                if frame.type == proto.TYPE_RESPONSE or (notices and frame.type == proto.TYPE_NOTICE):
+                    return frame
+            if time.monotonic() >= deadline:
+                self.supervisor.record_timeout()
+                return None
+            try:
+                ser = self.serial_port
+                waiting = ser.in_waiting
+                if waiting:
+                    self.pending_frames.extend(self.decoder.feed(ser.read(waiting)))
+                    self.supervisor.record_rx()
+                else:
+                    time.sleep(0.001)
+            except (serial.SerialException, OSError) as e:
+                self.supervisor.report_error(e)
+                return None
+
+    def build_epc(self, product_id, tag_id=None):
+        """組合EPC資料: 00前綴 + 4碼UUID + 13碼產品ID + 2碼年 + 1碼月 + 2碼日"""
+        if len(product_id) != 13 or not all(c in '0123456789ABCDEF' for c in product_id.upper()):
+            raise ValueError("產品ID必須是13位十六進位數")
+
+        # 取得當前時間和生成UUID
+        now = datetime.now()
+        tag_id = tag_id or self.generate_tag_id(product_id, now.year * 10000 + now.month * 100 + now.day)
+        epc = epc_schemas.encode('standard', tag_id=tag_id, product_id=product_id,
+                                 year=now.year, month=now.month, day=now.day)
+        info = {
+            "tag_id": tag_id,
+            "product_id": product_id,
+            "year": now.year,
+            "month": now.month,
+            "day": now.day,
+            "epc": epc
+        }
+        return epc, info
+
+    def encode_tags(self, jobs):
+        """管線化執行 寫入 → 讀回比對 → 鎖定，並記錄每張標籤結果"""
+        results = EncodePipeline(self).run(jobs)
+        finished = datetime.now().isoformat(timespec='seconds')
+        for result in results:
+            result['time'] = finished
+            self.encode_history.append(result)
+            if result['verified'] and result['bank'] == 'epc':
+                self.encoded_epcs.add(result['data'])
+        return results
+
+    def encode_new_tags(self, jobs, wait=5.0):
+        """未指定目標的工作各自綁定天線範圍內一張尚未寫入的標籤（以目前的EPC為 target_epc）再寫入
+
+        每張實體標籤只寫入一個工作；找不到足夠的新標籤時，其餘工作不寫入並傳回錯誤。
+        """
+        unbound = [job for job in jobs if job['target_epc'] is None]
+        targets = find_fresh_tags(self, len(unbound), self.encoded_epcs, wait) if unbound else []
+        for job, target in zip(unbound, targets):
+            job['target_epc'] = bytes.fromhex(target)
+        runnable = [job for job in jobs if job['target_epc'] is not None]
+        encoded = iter(self.encode_tags(runnable) if runnable else [])
+        results = []
+        for index, job in enumerate(jobs):
+            if job['target_epc'] is None:
+                result = {
+                    'bank': job['bank'],
+                    'data': hex_codec.to_hex(job['data']),
+                    'target_epc': None,
+                    'written': False,
+                    'verified': False,
+                    'locked': False,
+                    'error': "天線範圍內沒有未寫入的標籤"
+                }
+            else:
+                result = next(encoded)
+            result['index'] = index
+            results.append(result)
+        return results
+
+    def write_tag(self, product_id, verify=False, lock=False):
         """寫入標籤"""
+        # 驗證產品ID格式並組合EPC資料
+        try:
+            epc, info = self.build_epc(product_id)
+        except ValueError as e:
+            return {"error": str(e)}
+        return self.write_epc(epc, info, verify, lock)
+
+    def write_epc(self, epc, info, verify=False, lock=False):
+        """將已組合好的EPC寫入標籤"""
         try:
-            # 驗證產品ID格式
-            if len(product_id) != 13 or not all(c in '0123456789ABCDEF' for c in product_id.upper()):
-                return {"error": "產品ID必須是13位十六進位數"}
-
-            # 生成UUID和取得當前時間
-            tag_id = self.generate_tag_id()
-            now = datetime.now()
-            year = now.year % 100
-            month = now.month
-            day = now.day
-
-            # 組合EPC資料
-            epc = f"00{tag_id}{product_id}{year:02X}{month:X}{day:02X}"
+            if verify or lock:
+                result = self.encode_tags([make_job(epc, lock=lock)])[0]
+                if result['error']:
+                    return {"error": result['error'], "result": result}
+                return {"success": True, "data": info, "result": result}
             
             # 組合寫入命令
             command_str = f"BB 00 49 00 15 00 00 00 00 01 00 02 00 06 {epc}"
@@ -110,48 +227,118 @@ class RFIDController:
             checksum = sum(command_bytes[1:]) & 0xFF
             write_cmd = command_bytes + bytes([checksum, 0x7E])
             
-            # 發送命令
-            self.serial_port.write(write_cmd)
-            
-            # 等待回應
-            time.sleep(0.1)
-            if self.serial_port.in_waiting:
-                response = self.serial_port.read(self.serial_port.in_waiting)
-                if len(response) > 3 and response[0] == 0xBB and response[1] == 0x01:
-                    if response[2] == 0xFF:  # 錯誤回應
-                        error_code = response[6] if len(response) > 6 else 0
-                        error_msg = {
-                            0x09: "找不到標籤",
-                            0x15: "寫入失敗",
-                            0x16: "存取密碼不正確",
-                            0x17: "標籤通訊錯誤",
-                            0xA3: "超出晶片容量範圍"
-                        }.get(error_code, f"未知錯誤(0x{error_code:02X})")
-                        return {"error": error_msg}
-                    return {
-                        "success": True,
-                        "data": {
-                            "tag_id": tag_id,
-                            "product_id": product_id,
-                            "year": now.year,
-                            "month": month,
-                            "day": day,
-                            "epc": epc
+            with self.lock:
+                # 發送命令
+                self.serial_port.write(write_cmd)
+                
+                # 等待回應
+                time.sleep(0.1)
+                if self.serial_port.in_waiting:
+                    response = self.serial_port.read(self.serial_port.in_waiting)
+                    self.supervisor.record_rx()
+                    if len(response) > 3 and response[0] == 0xBB and response[1] == 0x01:
+                        if response[2] == 0xFF:  # 錯誤回應
+                            error_code = response[6] if len(response) > 6 else 0
+                            return {"error": proto.error_message(error_code)}
+                        return {
+                            "success": True,
+                            "data": info
                         }
-                    }
                     
             return {"error": "寫入失敗，未收到回應"}
             
+        except (serial.SerialException, OSError) as e:
+            self.supervisor.report_error(e)
+            return {"error": f"寫入錯誤: {str(e)}"}
         except Exception as e:
             return {"error": f"寫入錯誤: {str(e)}"}
             
+    def configure(self, name, frame):
+        """送出設定命令，成功後記錄在監控器，斷線重新連線時自動重送"""
+        try:
+            with self.lock:
+                self.reset_input()
+                self.send_frames([frame])
+                response = self.read_response()
+        except (serial.SerialException, OSError) as e:
+            return {"error": f"設定錯誤: {str(e)}"}
+        if response is None:
+            return {"error": "設定逾時，未收到回應"}
+        error = proto.frame_error(response)
+        if error:
+            return {"error": error}
+        self.supervisor.remember(name, frame)
+        return {"success": True}
+
+    def set_power(self, dbm):
+        """設定發射功率（dBm）"""
+        return self.configure('power', proto.build_set_power(dbm))
+
+    def set_query(self, q, session=0, target=0):
+        """設定Query參數（Q值、Session、Target）"""
+        return self.configure('query', proto.build_set_query(q, session, target))
+
+    def set_select(self, epc=None, mode=None):
+        """設定Select遮罩與模式；未指定EPC時關閉Select"""
+        if mode not in (None, proto.SELECT_MODE_ALWAYS, proto.SELECT_MODE_NONE, proto.SELECT_MODE_EXCEPT_POLL):
+            raise ValueError("Select模式必須是0、1或2")
+        if epc:
+            result = self.configure('select', proto.build_select(bytes.fromhex(epc)))
+            if result.get('error'):
+                return result
+        else:
+            self.supervisor.forget('select')
+            mode = proto.SELECT_MODE_NONE
+        return self.configure('select_mode', proto.build_select_mode(
+            proto.SELECT_MODE_ALWAYS if mode is None else mode))
+
     def close(self):
         """關閉串口"""
-        if self.serial_port.is_open:
-            self.serial_port.close()
+        self.supervisor.close()
+
+# 初始化RFID控制器（設定 RFID_SIMULATE=1 時使用模擬讀寫器）
+# /write 與編碼訂單共用標籤ID保留紀錄
+tag_ids = TagIdAllocator()
+rfid = RFIDController(serial_factory=simulated_reader.factory_from_env(), allocator=tag_ids)
+write_jobs = WriteJobStore()
+# 多站編碼：本機讀寫器為預設的寫入站，可再登錄其他串口或其他工作站
+coordinator = EncodeCoordinator(tag_ids)
+coordinator.add_station(LocalStation('local', rfid))
+
+def check_interrupted(job, confirmed=False):
+    """中斷過的工作無法確定上一次是否已寫入：先確認天線範圍內是否有帶著該EPC的標籤
+
+    有則直接標記完成；沒有時需操作員確認放上的是要寫入的標籤（confirmed）才可重新寫入，
+    避免把同一個EPC寫到另一張標籤上。可以重新寫入時傳回None，否則傳回 (回應, HTTP狀態)
+    """
+    try:
+        present = locate_epcs(rfid, [job['epc']]).get(job['epc'])
+    except (serial.SerialException, OSError, TimeoutError) as e:
+        return {"error": f"無法確認標籤是否已寫入: {str(e)}", "job_id": job['id']}, 503
+    if present:
+        info = job['info'] or {}
+        result = {"success": True, "data": info.get('tag') if info.get('batch') else job['info'], "recovered": True}
+        write_jobs.finish(job['id'], True, result)
+        return dict(result, job_id=job['id'], attempts=job['attempts']), 200
+    if present is None:
+        return {"error": "無法確認標籤是否已寫入，請重試", "job_id": job['id']}, 409
+    if not confirmed:
+        return {"error": "上一次寫入中斷且找不到已寫入的標籤，請確認放上要寫入的標籤後以 confirm 重試",
+                "job_id": job['id'], "needs_confirmation": True}, 409
+    return None
 
-# 初始化RFID控制器
-rfid = RFIDController()
+def run_write_job(job, verify=False, lock=False, confirmed=False):
+    """執行寫入工作並記錄結果；中斷過的工作先確認是否已寫入，重新寫入時一律讀回比對"""
+    if job['status'] == STATUS_INTERRUPTED:
+        outcome = check_interrupted(job, confirmed)
+        if outcome is not None:
+            return outcome
+        verify = True
+    if write_jobs.begin_attempt(job['id']) is None:
+        return {"error": "此工作正在執行中", "job_id": job['id']}, 409
+    result = rfid.write_epc(job['epc'], job['info'], verify, lock)
+    write_jobs.finish(job['id'], bool(result.get('success')), result)
+    return dict(result, job_id=job['id'], attempts=job['attempts']), 200
 
 @app.route('/write', methods=['POST'])
 def write():
@@ -161,25 +348,310 @@ def write():
         if not data or 'product_id' not in data:
             return jsonify({"error": "缺少產品ID"}), 400
             
-        result = rfid.write_tag(data['product_id'])
-        return jsonify(result)
+        # 冪等鍵：用戶端重試時不會重複編碼，已完成的工作直接傳回原結果
+        key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+        job = write_jobs.get_by_key(key) if key else None
+        if job is None:
+            try:
+                epc, info = rfid.build_epc(data['product_id'])
+            except ValueError as e:
+                return jsonify({"error": str(e)})
+            job, _ = write_jobs.create(epc, info, key)
+        elif job['status'] == STATUS_DONE:
+            return jsonify(dict(job['result'], job_id=job['id'], attempts=job['attempts'], replayed=True))
+
+        result, status = run_write_job(job, verify=bool(data.get('verify')),
+                                       lock=bool(data.get('lock')),
+                                       confirmed=bool(data.get('confirm')))
+        return jsonify(result), status
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/write/batch', methods=['POST'])
+def write_batch():
+    """批次編碼API：寫入 → 讀回比對 → (選擇性)鎖定
+
+    帶冪等鍵（Idempotency-Key 標頭，或每個項目的 idempotency_key）時每個項目記錄為寫入工作，
+    同一批次重送時已完成的項目直接傳回原結果，只重新編碼尚未成功的項目。
+    bind 為 true 時，未指定 target_epc 的項目各自綁定天線範圍內一張尚未寫入的標籤
+    """
+    try:
+        data = request.get_json()
+        if not data or not data.get('items'):
+            return jsonify({"error": "缺少編碼項目"}), 400
+        batch_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+        encode = rfid.encode_new_tags if data.get('bind') else rfid.encode_tags
+        if (not data.get('bind') and len(data['items']) > 1
+                and not all(item.get('target_epc') for item in data['items'])):
+            return jsonify({"error": "多個項目時每個項目都需指定 target_epc，或設定 bind 綁定不同的標籤"}), 400
+
+        results = [None] * len(data['items'])
+        pending = []
+        for index, item in enumerate(data['items']):
+            options = {
+                "target_epc": item.get('target_epc'),
+                "lock": bool(item.get('lock', data.get('lock', False))),
+                "lock_action": item.get('lock_action', data.get('lock_action', 'lock')),
+                "access_password": item.get('access_password', data.get('access_password', '00000000'))
+            }
+            key = item.get('idempotency_key') or (f"{batch_key}:{index}" if batch_key else None)
+            bank = 'epc' if 'product_id' in item else item.get('bank', 'user')
+            job = write_jobs.get_by_key(key) if key else None
+            if job is not None:
+                if job['status'] == STATUS_DONE:
+                    results[index] = dict(job['result'], index=index, job_id=job['id'], replayed=True)
+                    continue
+                if job['status'] == STATUS_SENDING:
+                    results[index] = {"index": index, "job_id": job['id'], "error": "此工作正在執行中"}
+                    continue
+                if job['status'] == STATUS_INTERRUPTED and bank == 'epc':
+                    outcome = check_interrupted(job, bool(item.get('confirm')))
+                    if outcome is not None:
+                        results[index] = dict(outcome[0], index=index)
+                        continue
+                # 沿用工作記錄的EPC，重送時不會取用新的標籤ID
+                epc, info = job['epc'], (job['info'] or {}).get('tag')
+            elif 'product_id' in item:
+                epc, info = rfid.build_epc(item['product_id'])
+            else:
+                epc, info = item.get('data', ''), None
+            if 'product_id' in item:
+                encode_job = make_job(epc, bank='epc', **options)
+            else:
+                encode_job = make_job(epc, bank=bank, start_word=item.get('start_word'), **options)
+            if key and job is None:
+                # batch 工作由用戶端以同一冪等鍵重送批次來續做，不經 /write/jobs/resume
+                job, _ = write_jobs.create(epc, {'tag': info, 'bank': bank, 'batch': True}, key)
+            pending.append((index, encode_job, info, job))
+
+        runnable = []
+        for entry in pending:
+            index, _, _, job = entry
+            if job is not None and write_jobs.begin_attempt(job['id']) is None:
+                # 同一冪等鍵的另一個請求正在寫入
+                results[index] = {"index": index, "job_id": job['id'], "error": "此工作正在執行中"}
+                continue
+            runnable.append(entry)
+        try:
+            encoded = encode([encode_job for _, encode_job, _, _ in runnable]) if runnable else []
+        except Exception as e:
+            for _, _, _, job in runnable:
+                if job is not None:
+                    write_jobs.interrupt(job['id'], str(e))
+            raise
+        for (index, _, info, job), result in zip(runnable, encoded):
+            result['index'] = index
+            if info:
+                result['tag'] = info
+            if job is not None:
+                write_jobs.finish(job['id'], not result['error'], result)
+                result['job_id'] = job['id']
+            results[index] = result
+        return jsonify({
+            "success": all(not r.get('error') for r in results),
+            "results": results
+        })
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/write/jobs/<job_id>', methods=['GET'])
+def get_write_job(job_id):
+    """查詢寫入工作狀態"""
+    job = write_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "找不到工作"}), 404
+    return jsonify({"success": True, "job": job})
+
+@app.route('/write/jobs', methods=['GET'])
+def find_write_job():
+    """以冪等鍵查詢寫入工作，未指定時傳回統計"""
+    key = request.args.get('key')
+    if not key:
+        return jsonify({"success": True, "stats": write_jobs.stats()})
+    job = write_jobs.get_by_key(key)
+    if job is None:
+        return jsonify({"error": "找不到工作"}), 404
+    return jsonify({"success": True, "job": job})
+
+@app.route('/write/jobs/resume', methods=['POST'])
+def resume_write_jobs():
+    """重新執行未完成或中斷的寫入工作
+
+    中斷的工作先確認是否已寫入；仍需重新寫入的工作要列在 confirm（工作ID列表）中才會寫入
+    """
+    data = request.get_json(silent=True) or {}
+    confirmed = set(data.get('confirm') or [])
+    results = []
+    for job in write_jobs.unfinished():
+        if (job.get('info') or {}).get('batch'):
+            continue
+        result, _ = run_write_job(job, confirmed=job['id'] in confirmed)
+        results.append(result)
+    return jsonify({"success": all(r.get('success') for r in results), "results": results})
+
+@app.route('/encode/stations', methods=['GET'])
+def get_encode_stations():
+    """已登錄的寫入站"""
+    return jsonify({"success": True, "stations": coordinator.describe_stations()})
+
+@app.route('/encode/stations', methods=['POST'])
+def add_encode_station():
+    """登錄寫入站：{"name", "url"} 為其他工作站，{"name", "port"} 為本機另一個串口"""
+    data = request.get_json() or {}
+    if not data.get('name') or not (data.get('url') or data.get('port')):
+        return jsonify({"error": "需指定 name 與 url 或 port"}), 400
+    try:
+        if data.get('url'):
+            station = RemoteStation(data['name'], data['url'])
+        else:
+            controller = RFIDController(data['port'], data.get('baudrate', 115200),
+                                        serial_factory=simulated_reader.factory_from_env())
+            station = LocalStation(data['name'], controller)
+        coordinator.add_station(station)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"success": True, "station": station.describe()})
+
+@app.route('/encode/stations/<name>', methods=['DELETE'])
+def remove_encode_station(name):
+    if not coordinator.remove_station(name):
+        return jsonify({"error": "找不到寫入站"}), 404
+    return jsonify({"success": True})
+
+@app.route('/encode/orders', methods=['POST'])
+def create_encode_order():
+    """建立編碼訂單（產品ID × 數量），分配給所有（或指定的）寫入站同時編碼"""
+    data = request.get_json() or {}
+    if not data.get('product_id') or not data.get('quantity'):
+        return jsonify({"error": "需指定 product_id 與 quantity"}), 400
+    try:
+        order = coordinator.create_order(data['product_id'], data['quantity'],
+                                         lock=bool(data.get('lock')),
+                                         stations=data.get('stations'),
+                                         chunk_size=int(data.get('chunk_size', 8)))
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"success": True, "order": order.status()}), 202
+
+@app.route('/encode/orders/<order_id>', methods=['GET'])
+def get_encode_order(order_id):
+    """訂單進度（results=1 附上每張標籤結果）"""
+    order = coordinator.get(order_id)
+    if order is None:
+        return jsonify({"error": "找不到訂單"}), 404
+    return jsonify({"success": True, "order": order.status(request.args.get('results') == '1')})
+
+@app.route('/encode/orders/<order_id>', methods=['DELETE'])
+def cancel_encode_order(order_id):
+    order = coordinator.get(order_id)
+    if order is None:
+        return jsonify({"error": "找不到訂單"}), 404
+    order.cancel()
+    return jsonify({"success": True, "order": order.status()})
+
+@app.route('/health', methods=['GET'])
+def health():
+    """讀寫器連線狀態"""
+    status = rfid.supervisor.health()
+    return jsonify({"success": status['connected'], "data": status}), 200 if status['connected'] else 503
+
+@app.route('/config/power', methods=['POST'])
+def set_power():
+    """設定發射功率，body: {"dbm": 26}"""
+    data = request.get_json(silent=True) or {}
+    try:
+        result = rfid.set_power(float(data['dbm']))
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "缺少或無效的功率值(dbm)"}), 400
+    return jsonify(result), 200 if result.get('success') else 500
+
+@app.route('/config/query', methods=['POST'])
+def set_query():
+    """設定Query參數，body: {"q": 4, "session": 0, "target": 0}"""
+    data = request.get_json(silent=True) or {}
+    try:
+        result = rfid.set_query(int(data.get('q', 4)), int(data.get('session', 0)), int(data.get('target', 0)))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result), 200 if result.get('success') else 500
+
+@app.route('/config/select', methods=['POST'])
+def set_select():
+    """設定Select，body: {"epc": "...", "mode": 0}；不帶EPC時關閉Select"""
+    data = request.get_json(silent=True) or {}
+    try:
+        mode = data.get('mode')
+        result = rfid.set_select(data.get('epc'), None if mode is None else int(mode))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result), 200 if result.get('success') else 500
+
+@app.route('/admin/profile', methods=['GET'])
+def profile():
+    """取樣分析所有執行緒 seconds 秒，預設傳回 collapsed stack（format=json 另附各執行緒CPU時間）"""
+    if not sampling_profiler.authorized(request):
+        return jsonify({"error": "未授權"}), 403
+    seconds = request.args.get('seconds', 10, type=float)
+    interval = request.args.get('interval_ms', 5, type=float) / 1000
+    try:
+        summary, collapsed = sampling_profiler.profile(seconds, interval)
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 409
+    if request.args.get('format') == 'json':
+        return jsonify({"success": True, "data": dict(summary, collapsed=collapsed)})
+    return Response(collapsed, mimetype='text/plain', headers={
+        'Content-Disposition': 'attachment; filename=profile.folded',
+        'X-Profile-Samples': str(summary['samples']),
+        'X-Profile-Overhead-Seconds': str(summary['profiler_cpu_seconds'])
+    })
+
+@app.route('/write/history', methods=['GET'])
+def write_history():
+    """最近的編碼結果紀錄"""
+    return jsonify({"success": True, "results": list(rfid.encode_history)})
+
 @app.route('/read', methods=['GET'])
 def read():
-    """讀取標籤API"""
+    """讀取標籤API（支援 JSON / MessagePack / 二進位EPC記錄）"""
     try:
+        fmt = response_formats.negotiate(request)
+        if fmt is None:
+            return response_formats.not_acceptable()
+
         result = rfid.read_tag()
-        return jsonify(result)
+        if fmt == 'json' or not result.get('success'):
+            return jsonify(result)
+
+        # 還原12位元組EPC: 00前綴 + 22碼資料
+        tag = result['data']
+        epc = bytes.fromhex('00' + tag['raw_data'][:22])
+        payload = {
+            "success": True,
+            "data": {
+                "tag_id": tag['tag_id'],
+                "product_id": tag['product_id'],
+                "year": tag['year'],
+                "month": tag['month'],
+                "day": tag['day'],
+                "epc": epc
+            }
+        }
+        return response_formats.make_response(fmt, payload, [epc])
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# 設定 RFID_STATIC_ROOT 時由同一個行程提供前端
+static_assets.register_from_env(app)
+
 # 程式結束時關閉串口
 import atexit
 atexit.register(rfid.close)
+atexit.register(write_jobs.close)
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
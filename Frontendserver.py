@@ -1,13 +1,26 @@
 # 建立一個新的檔案 server.py，內容如下：
-from flask import Flask, send_file
+import os
+from flask import Flask, jsonify
 from flask_cors import CORS
+import static_assets
 
 app = Flask(__name__)
 CORS(app)
 
-@app.route('/')
-def home():
-    return send_file('index.html')
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DIST_DIR = os.path.join(BASE_DIR, 'my-rfid-app', 'dist')
+
+# 優先提供 RFID_STATIC_ROOT 或 React 建置結果（npm run build），否則只提供本目錄的 index.html
+if os.environ.get('RFID_STATIC_ROOT'):
+    site = static_assets.register(app, os.environ['RFID_STATIC_ROOT'])
+elif os.path.isdir(DIST_DIR):
+    site = static_assets.register(app, DIST_DIR)
+else:
+    site = static_assets.register(app, BASE_DIR, only=['index.html'])
+
+@app.route('/static-stats')
+def static_stats():
+    return jsonify(site.stats())
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8000)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=8000)
@@ -3,26 +3,49 @@ import random
 from datetime import datetime
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QPushButton, QVBoxLayout, 
                            QWidget, QTextEdit, QLabel, QLineEdit, QHBoxLayout,
-                           QComboBox, QGridLayout)
-from PyQt5.QtCore import QThread, pyqtSignal
+                           QComboBox, QGridLayout, QTableView, QHeaderView)
+from PyQt5.QtCore import QThread, pyqtSignal, Qt, QAbstractTableModel, QModelIndex
 import serial
 import time
+import rfid_protocol as proto
+from read_scheduler import ReadScheduler
+from epc_schema import registry as epc_schemas
+import hex_codec
 
 class RFIDReader(QThread):
-    data_received = pyqtSignal(bytes)
+    frames_received = pyqtSignal(list)
+    connection_lost = pyqtSignal(str)
     
-    def __init__(self, port='COM4', baudrate=115200):
+    def __init__(self, port='COM4', baudrate=115200, emit_interval=0.1):
         super().__init__()
-        self.serial_port = serial.Serial(port, baudrate, timeout=0.1)
+        self.serial_port = serial.Serial(port, baudrate, timeout=0.05)
+        self.emit_interval = emit_interval  # 介面更新間隔上限（秒）
+        # 閒置等待不超過更新間隔，讓最後一批資料能及時送出
+        self.scheduler = ReadScheduler(self.serial_port, max_timeout=emit_interval)
+        self.decoder = proto.FrameDecoder()
         self.is_running = True
 
     def run(self):
+        """阻塞讀取串口並解碼封包，依固定間隔批次送出給介面"""
+        batch = []
+        last_emit = time.monotonic()
         while self.is_running:
-            if self.serial_port.in_waiting:
-                data = self.serial_port.readline()
-                if data:
-                    self.data_received.emit(data)
-            time.sleep(0.1)
+            try:
+                # 有資料時一次取完，閒置時逐步拉長等待時間
+                data = self.scheduler.read_available()
+            except (serial.SerialException, OSError) as e:
+                if self.is_running:
+                    self.connection_lost.emit(str(e))
+                break
+            if data:
+                batch.extend(self.decoder.feed(data))
+            now = time.monotonic()
+            if batch and now - last_emit >= self.emit_interval:
+                self.frames_received.emit(batch)
+                batch = []
+                last_emit = now
+        if batch:
+            self.frames_received.emit(batch)
             
     def write_data(self, data):
         try:
@@ -34,11 +57,71 @@ class RFIDReader(QThread):
         
     def stop(self):
         self.is_running = False
+        self.wait(1000)
         self.serial_port.close()
 
-def bytes_to_hex_string(data):
-    """將位元組資料轉換為十六進位字串，保證每個byte都轉換"""
-    return ''.join([f"{b:02X}" for b in data])
+class TagTableModel(QAbstractTableModel):
+    """盤點標籤表格，以EPC為鍵，批次更新"""
+    HEADERS = ["EPC", "UUID", "產品ID", "日期", "RSSI", "次數", "最後讀取"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+        self.row_index = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        return self.rows[index.row()][index.column()]
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def clear(self):
+        self.beginResetModel()
+        self.rows = []
+        self.row_index = {}
+        self.endResetModel()
+
+    def update_tags(self, tags):
+        """加入或更新一批標籤 [(epc, 解析欄位, rssi)]"""
+        now = datetime.now().strftime("%H:%M:%S")
+        new_rows = []
+        changed = []
+        for epc, fields, rssi in tags:
+            row = self.row_index.get(epc)
+            if row is None:
+                self.row_index[epc] = len(self.rows) + len(new_rows)
+                if fields:
+                    date = f"{fields['year']}-{fields['month']:02d}-{fields['day']:02d}"
+                    new_rows.append([epc, fields['tag_id'], fields['product_id'], date, rssi, 1, now])
+                else:
+                    new_rows.append([epc, "", "", "", rssi, 1, now])
+            elif row >= len(self.rows):
+                record = new_rows[row - len(self.rows)]
+                record[4] = rssi
+                record[5] += 1
+            else:
+                record = self.rows[row]
+                record[4] = rssi
+                record[5] += 1
+                record[6] = now
+                changed.append(row)
+        if changed:
+            self.dataChanged.emit(self.index(min(changed), 4), self.index(max(changed), 6))
+        if new_rows:
+            first = len(self.rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(new_rows) - 1)
+            self.rows.extend(new_rows)
+            self.endInsertRows()
 
 def generate_tag_id():
     """產生4碼隨機UUID"""
@@ -99,10 +182,20 @@ class MainWindow(QMainWindow):
         button_layout = QHBoxLayout()
         self.read_button = QPushButton("讀取標籤")
         self.write_button = QPushButton("寫入資料")
+        self.clear_button = QPushButton("清除列表")
         button_layout.addWidget(self.read_button)
         button_layout.addWidget(self.write_button)
+        button_layout.addWidget(self.clear_button)
         layout.addLayout(button_layout)
         
+        # 標籤列表
+        self.tag_model = TagTableModel(self)
+        self.tag_table = QTableView()
+        self.tag_table.setModel(self.tag_model)
+        self.tag_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.tag_table.verticalHeader().setVisible(False)
+        layout.addWidget(self.tag_table)
+
         # 狀態顯示
         self.status_label = QLabel("狀態：")
         self.text_display = QTextEdit()
@@ -113,11 +206,13 @@ class MainWindow(QMainWindow):
         # 連接事件
         self.read_button.clicked.connect(self.read_tag)
         self.write_button.clicked.connect(self.write_tag)
+        self.clear_button.clicked.connect(self.tag_model.clear)
         
         # 初始化RFID讀寫器
         try:
             self.rfid_reader = RFIDReader()
-            self.rfid_reader.data_received.connect(self.handle_response)
+            self.rfid_reader.frames_received.connect(self.handle_frames)
+            self.rfid_reader.connection_lost.connect(self.handle_connection_lost)
             self.rfid_reader.start()
             self.status_label.setText("狀態：已連接")
         except Exception as e:
@@ -140,7 +235,8 @@ class MainWindow(QMainWindow):
             day = int(self.day_combo.currentText())
 
             # 組合EPC資料: 00前綴 + 4碼UUID + 13碼產品ID + 2碼年 + 1碼月(16進制) + 2碼日
-            epc = f"00{self.tag_id[:4]}{user_code[:13]}{year:02X}{month:X}{day:02X}"
+            epc = epc_schemas.encode('standard', tag_id=self.tag_id[:4], product_id=user_code[:13],
+                                     year=year, month=month, day=day)
             
             self.text_display.append(f"""寫入資料格式：
 前綴: 00
@@ -180,7 +276,7 @@ UUID (4碼): {self.tag_id[:4]}
             self.text_display.append(f"校驗和: {checksum:02X}")
             
             write_cmd = command_bytes + bytes([checksum, 0x7E])
-            self.text_display.append(f"發送寫入命令: {bytes_to_hex_string(write_cmd)}")
+            self.text_display.append(f"發送寫入命令: {hex_codec.to_hex(write_cmd)}")
             
             if self.rfid_reader.write_data(write_cmd):
                 self.text_display.append("正在寫入...")
@@ -194,75 +290,62 @@ UUID (4碼): {self.tag_id[:4]}
         except Exception as e:
             self.text_display.append(f"寫入過程錯誤: {str(e)}")
 
+    def decode_epc_fields(self, epc_data):
+        """解析EPC欄位，傳回dict；長度不足或格式錯誤傳回None"""
+        # 跳過前導0000後需有22碼（4位UUID + 13位產品ID + 2位年 + 1位月 + 2位日），
+        # 依登錄的EPC格式直接由位元組解析
+        return hex_codec.decode_reply(epc_data)
+
     def parse_epc_data(self, epc_data):
         """解析EPC資料"""
-        try:
-            # 將位元組轉換為十六進位字串
-            hex_str = bytes_to_hex_string(epc_data)
-            
-            # 找到實際資料的起始位置（跳過前導0000）
-            if hex_str.startswith('0000'):
-                actual_data = hex_str[4:]
-            else:
-                actual_data = hex_str
-                
-            # 確保數據長度足夠（4位UUID + 13位產品ID + 2位年 + 1位月 + 2位日 = 22位）
-            if len(actual_data) < 22:
-                return f"數據長度不足（需要22字符，實際{len(actual_data)}字符）\n原始資料: {hex_str}\n擷取資料: {actual_data}"
-                
-            # 解析各個欄位
-            tag_id = actual_data[0:4]         # 4碼UUID (BD49)
-            product_id = actual_data[4:17]    # 13碼產品ID (1234567890123)
-            year = actual_data[17:19]         # 年份 (18)
-            month = actual_data[19:20]        # 月份 (1)
-            day = actual_data[20:22]          # 日期 (01)
-
-            # 數值轉換
-            year_dec = 2000 + int(year, 16)   # 年份轉換
-            month_dec = int(month, 16)        # 月份轉換（16進制到十進制）
-            day_dec = int(day, 16)            # 日期轉換
-
-            return f"""原始資料: {actual_data}
+        hex_str = hex_codec.to_hex(epc_data)
+        fields = self.decode_epc_fields(epc_data)
+        if fields is None:
+            return f"解析錯誤：數據長度不足或格式錯誤（需要22字符）\n原始資料: {hex_str}"
+
+        actual_data = fields['raw_data']
+        return f"""原始資料: {actual_data}
     分解資料:
-    - UUID (4碼): {tag_id}
-    - 產品ID (13碼): {product_id}
-    - 年份: {year} -> {year_dec}年
-    - 月份: {month} -> {month_dec}月
-    - 日期: {day} -> {day_dec}日"""
-                
-        except Exception as e:
-            return f"解析錯誤: {str(e)}\n原始資料: {hex_str}"
-    def handle_response(self, data):
-        """處理接收到的RFID回應"""
-        hex_str = bytes_to_hex_string(data)
-        self.text_display.append(f"收到資料: {hex_str}")
-        
-        if len(data) > 3 and data[0] == 0xBB:
-            if data[1] == 0x02:  # 標籤讀取回應
-                if len(data) >= 21:  # 確保有足夠的數據長度
-                    # 修改取值範圍，確保包含完整的數據（包括日期）
-                    epc_data = data[7:21]  # 現在取14個bytes，確保包含所有需要的數據
-                    parsed_data = self.parse_epc_data(epc_data)
-                    if parsed_data:
-                        self.text_display.append("\n解析資料:")
-                        self.text_display.append(parsed_data)
-                    self.status_label.setText("狀態：讀取成功")
-                else:
-                    self.text_display.append(f"數據長度不足：收到 {len(data)} bytes")
-            elif data[1] == 0x01:  # 命令執行回應
-                if data[2] == 0xFF:  # 錯誤回應
-                    error_code = data[6] if len(data) > 6 else 0
-                    error_msg = {
-                        0x09: "找不到標籤",
-                        0x15: "寫入失敗",
-                        0x16: "存取密碼不正確",
-                        0x17: "標籤通訊錯誤",
-                        0xA3: "超出晶片容量範圍"
-                    }.get(error_code, f"未知錯誤(0x{error_code:02X})")
-                    self.text_display.append(f"錯誤: {error_msg}")
+    - UUID (4碼): {fields['tag_id']}
+    - 產品ID (13碼): {fields['product_id']}
+    - 年份: {actual_data[17:19]} -> {fields['year']}年
+    - 月份: {actual_data[19:20]} -> {fields['month']}月
+    - 日期: {actual_data[20:22]} -> {fields['day']}日"""
+
+    def handle_frames(self, frames):
+        """處理一批已解碼的RFID封包"""
+        tags = []
+        last_epc_data = None
+        for frame in frames:
+            if frame.type == proto.TYPE_NOTICE and frame.command == proto.CMD_SINGLE_POLL:
+                if len(frame.params) < 16:
+                    continue
+                notice = proto.parse_poll_notice(frame)
+                # PC低位元組 + EPC，與原本 data[7:21] 的擷取範圍相同
+                epc_data = frame.params[2:16]
+                tags.append((hex_codec.to_hex(notice['epc']),
+                             self.decode_epc_fields(epc_data),
+                             notice['rssi']))
+                last_epc_data = epc_data
+            elif frame.type == proto.TYPE_RESPONSE:
+                error = proto.frame_error(frame)
+                if error:
+                    self.text_display.append(f"錯誤: {error}")
                 else:
                     self.text_display.append("命令執行成功")
 
+        if tags:
+            self.tag_model.update_tags(tags)
+            self.status_label.setText(f"狀態：讀取成功（共 {self.tag_model.rowCount()} 張標籤）")
+            # 單次讀取才顯示詳細解析，連續讀取只更新表格，避免大量附加文字拖慢介面
+            if len(tags) == 1:
+                self.text_display.append("\n解析資料:")
+                self.text_display.append(self.parse_epc_data(last_epc_data))
+
+    def handle_connection_lost(self, message):
+        """串口中斷"""
+        self.status_label.setText(f"狀態：連線中斷 - {message}")
+
     def closeEvent(self, event):
         """停止串口"""
         self.rfid_reader.stop()
@@ -1,36 +1,89 @@
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 import serial
 import time
 import threading
+import uuid
 from queue import Queue
+from collections import deque
+from tag_sinks import SinkManager, StreamSink, create_sink
+import response_formats
+import rfid_protocol as proto
+from read_scheduler import ReadScheduler
+from inventory import InventoryTable
+from tag_query import TagQueryIndex, parse_date
+from expiry_index import ExpiryIndex
+from read_rollups import ReadRollups
+from read_archive import ArchiveSink, ReadArchive, parse_time
+from manifest import ManifestReconciler
+from zone_fusion import ZoneFusion
+from memory_reader import BulkMemoryReader, MemoryCache
+from inventory_pipeline import InventoryPipeline
+from serial_supervisor import SerialSupervisor
+import link_probe
+import simulated_reader
+import hex_codec
+import static_assets
+import sampling_profiler
 
 app = Flask(__name__)
 CORS(app)
 
 class RFIDController:
-    def __init__(self, port='COM4', baudrate=9600):
-        self.serial = None
+    def __init__(self, port='COM4', baudrate=9600, serial_factory=None):
+        self.supervisor = None
+        # 監控器停止後保留已記錄的設定（Select、功率、Q值），下一個監控器連線時重送
+        self.remembered = None
+        self.serial_factory = serial_factory
+        self.start_command = None
         self.port = port
-        self.baudrate = baudrate
+        # 以 link_probe 偵測並保存的鮑率為準
+        self.baudrate = link_probe.profiles.baudrate(port, baudrate)
         self.is_scanning = False
         self.scan_thread = None
         self.tag_queue = Queue()
         self.lock = threading.Lock()
+        self.sinks = SinkManager()
+        self.inventory = InventoryTable()
+        self.tag_index = TagQueryIndex(self.inventory)
+        self.expiry = ExpiryIndex(on_event=self._publish_expiry_event)
+        self.inventory.add_listener(self.expiry.on_inventory)
+        self.rollups = ReadRollups()
+        self.archive = ReadArchive()
+        self.pipeline = None
+        self.manifest = None
+        self.fusion = None
+        self.decoder = proto.FrameDecoder()
+        self.pending_frames = deque()
+        self.memory_cache = MemoryCache()
+
+    @property
+    def serial(self):
+        return self.supervisor.serial if self.supervisor else None
 
     def connect(self):
-        try:
-            if self.serial is None or not self.serial.is_open:
-                self.serial = serial.Serial(
-                    port=self.port,
-                    baudrate=self.baudrate,
-                    timeout=1
-                )
-                time.sleep(0.1)
-            return True
-        except Exception as e:
-            print(f"連接錯誤: {str(e)}")
+        """啟動串口監控，斷線後由監控執行緒自動重連並重送設定"""
+        if self.supervisor is None:
+            self.supervisor = SerialSupervisor(self.port, self.baudrate, timeout=1,
+                                               serial_factory=self.serial_factory,
+                                               config_frames=self.remembered)
+            self.supervisor.add_connect_callback(self._on_connect)
+        if self.supervisor.wait_connected(2.0) is None:
+            print(f"連接錯誤: {self.supervisor.last_error}")
             return False
+        return True
+
+    def _release_supervisor(self):
+        """停止串口監控（例如串口交給其他程式），保留已記錄的設定"""
+        if self.supervisor is not None:
+            self.remembered = self.supervisor.config_frames
+            self.supervisor.close()
+            self.supervisor = None
+
+    def _on_connect(self, ser):
+        """重新連線後若原本在掃描中，恢復盤點"""
+        if self.is_scanning and self.start_command:
+            ser.write(self.start_command)
 
     def send_command(self, data):
         try:
@@ -38,15 +91,61 @@ class RFIDController:
                 return False, "串口連接失敗"
 
             with self.lock:
-                self.serial.reset_input_buffer()
-                self.serial.write(bytes(data))
+                ser = self.serial
+                ser.reset_input_buffer()
+                ser.write(bytes(data))
                 time.sleep(0.1)
-                response = self.serial.read(100)
+                response = ser.read(100)
                 return True, response
+        except (serial.SerialException, OSError) as e:
+            self.supervisor.report_error(e)
+            print(f"發送命令錯誤: {str(e)}")
+            return False, str(e)
         except Exception as e:
             print(f"發送命令錯誤: {str(e)}")
             return False, str(e)
 
+    def send_frames(self, frames):
+        """一次送出多個命令封包"""
+        if not self.connect():
+            raise serial.SerialException("串口連接失敗")
+        try:
+            self.serial.write(b''.join(frames))
+        except (serial.SerialException, OSError) as e:
+            self.supervisor.report_error(e)
+            raise
+
+    def reset_input(self):
+        """清空接收緩衝與尚未處理的封包"""
+        self.decoder.reset()
+        self.pending_frames.clear()
+        ser = self.serial
+        if ser is not None:
+            ser.reset_input_buffer()
+
+    def read_response(self, timeout=1.0):
+        """等待下一個命令回應封包（略過盤點通知），逾時傳回None"""
+        deadline = time.monotonic() + timeout
+        while True:
+            while self.pending_frames:
+                frame = self.pending_frames.popleft()
+                if frame.type == proto.TYPE_RESPONSE:
+                    return frame
+            if time.monotonic() >= deadline:
+                self.supervisor.record_timeout()
+                return None
+            try:
+                ser = self.serial
+                waiting = ser.in_waiting if ser is not None else 0
+                if waiting:
+                    self.pending_frames.extend(self.decoder.feed(ser.read(waiting)))
+                    self.supervisor.record_rx()
+                else:
+                    time.sleep(0.001)
+            except (serial.SerialException, OSError) as e:
+                self.supervisor.report_error(e)
+                return None
+
     def calculate_checksum(self, data):
         return sum(data) & 0xFF
 
@@ -65,26 +164,64 @@ class RFIDController:
         command.append(self.calculate_checksum(command[1:]))
         command.append(0x7E)
 
+        self.start_command = bytes(command)
         success, response = self.send_command(command)
         if success:
             self.is_scanning = True
+            self.supervisor.expect_data = True
             self.scan_thread = threading.Thread(target=self._scan_loop)
             self.scan_thread.daemon = True
             self.scan_thread.start()
+            self._open_archive_session('inventory', [self.port])
             return True, "開始掃描"
         return False, "開始掃描失敗"
 
     def _scan_loop(self):
-        while self.is_scanning and self.serial and self.serial.is_open:
+        supervisor = self.supervisor
+        current = None
+        scheduler = None
+        decoder = proto.FrameDecoder()
+        while self.is_scanning:
+            # 斷線時等待監控執行緒重新連線，連線後換用新的串口
+            ser = supervisor.wait_connected(1.0)
+            if ser is None:
+                continue
+            if ser is not current:
+                current = ser
+                scheduler = ReadScheduler(ser)
+                decoder.reset()
             try:
-                response = self.serial.read(100)
-                if response and len(response) > 0:
-                    if response[0] == 0xBB and response[-1] == 0x7E:
-                        epc_data = response[8:20]
-                        self.tag_queue.put(epc_data)
-            except:
-                pass
-            time.sleep(0.1)
+                # 阻塞等待資料，一次取完並解出所有完整封包
+                data = scheduler.read_available()
+                if not data:
+                    continue
+                supervisor.record_rx()
+                now = time.time()
+                for frame in decoder.feed(data):
+                    if frame.type != proto.TYPE_NOTICE or frame.command != proto.CMD_SINGLE_POLL:
+                        continue
+                    notice = proto.parse_poll_notice(frame)
+                    epc_data = notice['epc']
+                    epc = hex_codec.to_hex(epc_data)
+                    self.tag_queue.put(epc_data)
+                    self.inventory.update(epc, now, notice['rssi'], self.port)
+                    self.rollups.record(now, epc, notice['rssi'], self.port)
+                    fusion = self.fusion
+                    if fusion is not None:
+                        fusion.observe(epc, now, notice['rssi'], self.port)
+                    self.sinks.publish({
+                        'ts': now,
+                        'epc': epc,
+                        'rssi': notice['rssi'],
+                        'reader': self.port,
+                        'antenna': 1
+                    })
+            except (serial.SerialException, OSError) as e:
+                print(f"掃描錯誤: {str(e)}")
+                supervisor.report_error(e)
+            except Exception as e:
+                print(f"掃描錯誤: {str(e)}")
+                time.sleep(0.1)
 
     def stop_inventory(self):
         if not self.is_scanning:
@@ -101,12 +238,75 @@ class RFIDController:
         command.append(0x7E)
 
         self.is_scanning = False
+        self.supervisor.expect_data = False
         if self.scan_thread:
             self.scan_thread.join(timeout=1)
+        self._close_archive_session()
         
         success, response = self.send_command(command)
         return success, "停止掃描" if success else "停止掃描失敗"
 
+    def start_pipeline(self, ports, workers=None):
+        """多讀寫器模式：串口I/O與解碼分離，由多個工作行程處理"""
+        if self.is_scanning or self.pipeline is not None:
+            return False, "已在掃描中"
+        if self.port in ports:
+            # 串口交給工作行程，停止監控避免重連搶佔
+            self._release_supervisor()
+        try:
+            # 各串口使用鮑率協商記錄的鮑率，本機串口使用目前的鮑率
+            baudrates = {port: self.baudrate if port == self.port else link_probe.profiles.baudrate(port, self.baudrate)
+                         for port in ports}
+            self.pipeline = InventoryPipeline(self.inventory, ports, workers,
+                                              baudrate=self.baudrate, baudrates=baudrates,
+                                              serial_factory=self.serial_factory,
+                                              on_merge=self._publish_merged)
+            self.pipeline.start()
+        except Exception as e:
+            self.pipeline = None
+            return False, f"啟動管線失敗: {str(e)}"
+        self._open_archive_session('pipeline', list(ports))
+        return True, f"已啟動 {len(ports)} 台讀寫器、{self.pipeline.workers} 個工作行程"
+
+    def stop_pipeline(self):
+        if self.pipeline is None:
+            return False, "管線未啟動"
+        self.pipeline.stop()
+        self.pipeline = None
+        self._close_archive_session()
+        return True, "已停止管線"
+
+    def _open_archive_session(self, mode, readers):
+        """盤點期間的讀取寫入封存檔，結束時成為一個區段"""
+        try:
+            self.sinks.add(ArchiveSink('archive', self.archive.directory,
+                                       info={'mode': mode, 'readers': readers, 'started': time.time()}))
+        except ValueError as e:
+            print(f"封存錯誤: {str(e)}")
+
+    def _close_archive_session(self):
+        sink = self.sinks.sinks.get('archive')
+        if isinstance(sink, ArchiveSink):
+            # 區段由 sink 的工作執行緒在背景寫出（大的區段需要數秒），停止請求不等待
+            self.sinks.remove('archive', timeout=0)
+
+    def _publish_merged(self, entries):
+        """管線彙總結果轉送給輸出通道，count 為該批次內的讀取次數"""
+        fusion = self.fusion
+        for epc, count, _, last_seen, rssi, reader, antenna, _ in entries:
+            if fusion is not None:
+                fusion.observe(epc, last_seen, rssi, reader, antenna, count)
+            self.rollups.record(last_seen, epc, rssi, reader, antenna, count)
+            self.tag_queue.put(bytes.fromhex(epc))
+            self.sinks.publish({
+                'ts': last_seen,
+                'epc': epc,
+                'rssi': rssi,
+                'reader': reader,
+                'antenna': antenna,
+                'count': count
+            })
+
     def get_select_param(self):
         command = [
             0xBB,                   # Header
@@ -139,6 +339,8 @@ class RFIDController:
         command.append(0x7E)
 
         success, response = self.send_command(command)
+        if success:
+            self.supervisor.remember('select', command)
         return success, "設置Select參數成功" if success else "設置Select參數失敗"
 
     def set_select_mode(self):
@@ -153,8 +355,110 @@ class RFIDController:
         command.append(0x7E)
 
         success, response = self.send_command(command)
+        if success:
+            self.supervisor.remember('select_mode', command)
         return success, "設置Select模式成功" if success else "設置Select模式失敗"
 
+    def set_power(self, dbm):
+        command = proto.build_set_power(dbm)
+        success, response = self.send_command(command)
+        if success:
+            self.supervisor.remember('power', command)
+        return success, "設置功率成功" if success else "設置功率失敗"
+
+    def set_query(self, q, session=0, target=0):
+        command = proto.build_set_query(q, session, target)
+        success, response = self.send_command(command)
+        if success:
+            self.supervisor.remember('query', command)
+        return success, "設置Q值成功" if success else "設置Q值失敗"
+
+    def read_tag_memory(self, epcs=None, banks=('tid',), words=None, refresh=False):
+        """批次讀取盤點到的標籤（或指定EPC）的TID/User記憶體，結果附加到盤點表"""
+        if self.is_scanning or self.pipeline is not None:
+            return False, "請先停止掃描", []
+        if epcs is None:
+            epcs = [record['epc'] for record in self.inventory.snapshot()]
+        if not epcs:
+            return False, "沒有可讀取的標籤", []
+        if not self.connect():
+            return False, "串口連接失敗", []
+        try:
+            results = BulkMemoryReader(self, self.memory_cache).run(epcs, banks, words, refresh)
+        except (serial.SerialException, OSError, TimeoutError) as e:
+            return False, f"讀取記憶體失敗: {str(e)}", []
+        for result in results:
+            values = {bank: result[bank] for bank in banks if bank in result}
+            if values:
+                self.inventory.annotate(result['epc'], **values)
+        failed = sum(1 for result in results if result['error'])
+        cached = sum(1 for result in results if result['cached'])
+        return True, f"已讀取 {len(results) - failed} 張標籤（快取 {cached} 張，失敗 {failed} 張）", results
+
+    def enable_fusion(self, config):
+        """啟用多讀寫器融合，區域改變時送出 type=zone 的事件到輸出通道"""
+        fusion = ZoneFusion(zones=config.get('zones'),
+                            window=float(config.get('window', 2.0)),
+                            settle=float(config.get('settle', 0.3)),
+                            alpha=float(config.get('alpha', 0.3)),
+                            hysteresis=float(config.get('hysteresis', 3.0)),
+                            max_tags=int(config.get('max_tags', 100000)),
+                            on_event=self._publish_zone_event)
+        self.disable_fusion()
+        fusion.start()
+        self.fusion = fusion
+        return fusion
+
+    def disable_fusion(self):
+        if self.fusion is not None:
+            self.fusion.stop()
+            self.fusion = None
+
+    def _publish_zone_event(self, event):
+        self.expiry.on_zone_event(event)
+        self.sinks.publish(dict(event, type='zone'))
+
+    def _publish_expiry_event(self, event):
+        self.sinks.publish(event)
+
+    def load_manifest(self, epcs=(), items=(), name=None, auto_complete=False):
+        """載入預期清單並開始即時比對，已在盤點表中的標籤會先比對一次"""
+        manifest = ManifestReconciler(epcs, items, name,
+                                      on_complete=self._manifest_complete if auto_complete else None)
+        self.clear_manifest()
+        self.manifest = manifest
+        # 註冊與取得現有標籤在同一個鎖內完成，同一張標籤不會既在複本中又通知一次
+        manifest.reconcile(self.inventory.subscribe(manifest.on_inventory))
+        return manifest
+
+    def clear_manifest(self):
+        if self.manifest is not None:
+            self.inventory.remove_listener(self.manifest.on_inventory)
+            self.manifest = None
+
+    def _manifest_complete(self, manifest):
+        """清單全部比對完成時停止盤點（由掃描執行緒呼叫，另開執行緒避免等待自己結束）"""
+        if self.is_scanning:
+            threading.Thread(target=self.stop_inventory, daemon=True).start()
+        elif self.pipeline is not None:
+            threading.Thread(target=self.stop_pipeline, daemon=True).start()
+
+    def negotiate_baudrate(self, switch=True):
+        """重新偵測鮑率（可切換到最高的穩定鮑率），偵測期間暫停串口監控"""
+        if self.is_scanning or self.pipeline is not None:
+            return {'success': False, 'message': "掃描中無法偵測鮑率"}
+        with self.lock:
+            self._release_supervisor()
+            result = link_probe.negotiate(self.port, switch=switch)
+            if result['success']:
+                self.baudrate = result['data']['baudrate']
+        return result
+
+    def health(self):
+        if self.supervisor is None:
+            return {'port': self.port, 'state': 'idle', 'connected': False}
+        return self.supervisor.health()
+
     def write_memory(self, data=None):
         if data is None:
             data = [0x12, 0x34, 0x56, 0x78]
@@ -191,7 +495,8 @@ class RFIDController:
         success, response = self.send_command(command)
         return success, "鎖定記憶體成功" if success else "鎖定記憶體失敗"
 
-rfid = RFIDController()
+# 設定 RFID_SIMULATE=1 時使用模擬讀寫器
+rfid = RFIDController(serial_factory=simulated_reader.factory_from_env())
 
 @app.route('/api/inventory/start', methods=['POST'])
 def start_inventory():
@@ -205,15 +510,207 @@ def stop_inventory():
 
 @app.route('/api/inventory/data', methods=['GET'])
 def get_inventory_data():
+    fmt = response_formats.negotiate(request)
+    if fmt is None:
+        return response_formats.not_acceptable()
+
     data = []
     try:
         while not rfid.tag_queue.empty():
-            tag_data = rfid.tag_queue.get_nowait()
-            data.append(' '.join([hex(x)[2:].zfill(2) for x in tag_data]))
+            data.append(rfid.tag_queue.get_nowait())
+        if fmt != 'json':
+            # MessagePack保留原始位元組，二進位格式輸出固定長度EPC記錄
+            return response_formats.make_response(fmt, {'success': True, 'data': data}, data)
+        data = [hex_codec.to_spaced_hex(tag_data, upper=False) for tag_data in data]
         return jsonify({'success': True, 'data': data})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
+@app.route('/api/inventory/table', methods=['GET'])
+def get_inventory_table():
+    return jsonify({'success': True, 'data': rfid.inventory.snapshot()})
+
+@app.route('/api/tags', methods=['GET'])
+def query_tags():
+    args = request.args
+    try:
+        result = rfid.tag_index.query(
+            product_id=args.get('product_id'),
+            date_from=parse_date(args['date_from']) if args.get('date_from') else None,
+            date_to=parse_date(args['date_to']) if args.get('date_to') else None,
+            seen_from=args.get('seen_from', type=float),
+            seen_to=args.get('seen_to', type=float),
+            reader=args.get('reader'),
+            limit=args.get('limit', 100, type=int),
+            cursor=args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, **result})
+
+@app.route('/api/inventory/table', methods=['DELETE'])
+def clear_inventory_table():
+    manifest = rfid.manifest
+    rfid.inventory.clear(manifest.reset if manifest is not None else None)
+    rfid.tag_index.clear()
+    rfid.expiry.clear()
+    return jsonify({'success': True, 'message': "已清除盤點資料"})
+
+@app.route('/api/admin/profile', methods=['GET'])
+def profile():
+    if not sampling_profiler.authorized(request):
+        return jsonify({'success': False, 'message': "未授權"}), 403
+    seconds = request.args.get('seconds', 10, type=float)
+    interval = request.args.get('interval_ms', 5, type=float) / 1000
+    try:
+        summary, collapsed = sampling_profiler.profile(seconds, interval)
+    except RuntimeError as e:
+        return jsonify({'success': False, 'message': str(e)}), 409
+    if request.args.get('format') == 'json':
+        return jsonify({'success': True, 'data': dict(summary, collapsed=collapsed)})
+    return Response(collapsed, mimetype='text/plain', headers={
+        'Content-Disposition': 'attachment; filename=profile.folded',
+        'X-Profile-Samples': str(summary['samples']),
+        'X-Profile-Overhead-Seconds': str(summary['profiler_cpu_seconds'])
+    })
+
+@app.route('/api/rollups', methods=['GET'])
+def get_rollups():
+    try:
+        data = rfid.rollups.series(request.args.get('resolution', '1s'),
+                                   request.args.get('reader'),
+                                   request.args.get('antenna', type=int),
+                                   request.args.get('window', type=float))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'data': data})
+
+@app.route('/api/rollups/readers', methods=['GET'])
+def get_rollup_readers():
+    return jsonify({'success': True, 'data': rfid.rollups.summary()})
+
+@app.route('/api/archive', methods=['GET'])
+def get_archive_segments():
+    return jsonify({'success': True, 'data': rfid.archive.list()})
+
+@app.route('/api/archive/scan', methods=['GET'])
+def scan_archive():
+    try:
+        rows, scanned, skipped = rfid.archive.scan(request.args.get('epc'),
+                                                   parse_time(request.args.get('since')),
+                                                   parse_time(request.args.get('until')),
+                                                   request.args.get('reader'),
+                                                   request.args.get('limit', 1000, type=int))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'data': rows, 'scanned': scanned, 'skipped': skipped})
+
+@app.route('/api/expiry', methods=['GET'])
+def get_expiring_tags():
+    days = request.args.get('days', type=int)
+    if days is None:
+        return jsonify({'success': False, 'message': "請指定天數 days"}), 400
+    count, tags = rfid.expiry.older_than(days, request.args.get('zone'),
+                                         request.args.get('limit', 1000, type=int))
+    return jsonify({'success': True, 'data': {'count': count, 'tags': tags}})
+
+@app.route('/api/expiry/rules', methods=['GET'])
+def get_expiry_rules():
+    return jsonify({'success': True, 'data': rfid.expiry.list_rules(), 'stats': rfid.expiry.stats()})
+
+@app.route('/api/expiry/rules', methods=['POST'])
+def add_expiry_rule():
+    config = request.get_json() or {}
+    if not config.get('name') or config.get('days') is None:
+        return jsonify({'success': False, 'message': "需指定 name 與 days"}), 400
+    try:
+        rfid.expiry.add_rule(config['name'], config['days'], config.get('zone'))
+    except (ValueError, TypeError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'message': f"已加入警示規則 {config['name']}"})
+
+@app.route('/api/expiry/rules/<name>', methods=['DELETE'])
+def remove_expiry_rule(name):
+    if not rfid.expiry.remove_rule(name):
+        return jsonify({'success': False, 'message': f"找不到警示規則 {name}"}), 404
+    return jsonify({'success': True, 'message': f"已移除警示規則 {name}"})
+
+@app.route('/api/fusion', methods=['POST'])
+def enable_fusion():
+    try:
+        fusion = rfid.enable_fusion(request.get_json() or {})
+    except (ValueError, TypeError, AttributeError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'message': "已啟用多讀寫器融合", 'data': fusion.stats()})
+
+@app.route('/api/fusion', methods=['GET'])
+def fusion_stats():
+    if rfid.fusion is None:
+        return jsonify({'success': False, 'message': "未啟用多讀寫器融合"}), 404
+    return jsonify({'success': True, 'data': rfid.fusion.stats()})
+
+@app.route('/api/fusion/tags', methods=['GET'])
+def fusion_tags():
+    if rfid.fusion is None:
+        return jsonify({'success': False, 'message': "未啟用多讀寫器融合"}), 404
+    data = rfid.fusion.assignments(request.args.get('zone'), request.args.get('limit', 1000, type=int))
+    return jsonify({'success': True, 'data': data})
+
+@app.route('/api/fusion', methods=['DELETE'])
+def disable_fusion():
+    rfid.disable_fusion()
+    return jsonify({'success': True, 'message': "已停用多讀寫器融合"})
+
+@app.route('/api/manifest', methods=['POST'])
+def load_manifest():
+    config = request.get_json(silent=True)
+    if config is None:
+        # 純文字：每行一個EPC
+        config = {'epcs': [line.strip() for line in request.get_data(as_text=True).splitlines() if line.strip()]}
+    try:
+        manifest = rfid.load_manifest(config.get('epcs', ()), config.get('items', ()),
+                                      config.get('name'), bool(config.get('auto_complete')))
+    except (ValueError, TypeError, AttributeError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'message': f"已載入 {manifest.expected} 筆預期項目",
+                    'data': manifest.status()})
+
+@app.route('/api/manifest', methods=['GET'])
+def get_manifest():
+    manifest = rfid.manifest
+    if manifest is None:
+        return jsonify({'success': False, 'message': "尚未載入清單"}), 404
+    data = manifest.status()
+    limit = request.args.get('limit', 1000, type=int)
+    detail = request.args.get('detail', '')
+    if 'missing' in detail:
+        data['missing_items'] = manifest.missing(limit)
+    if 'unexpected' in detail:
+        data['unexpected_tags'] = manifest.unexpected_tags(limit)
+    return jsonify({'success': True, 'data': data})
+
+@app.route('/api/manifest', methods=['DELETE'])
+def clear_manifest():
+    rfid.clear_manifest()
+    return jsonify({'success': True, 'message': "已清除清單"})
+
+@app.route('/api/pipeline/start', methods=['POST'])
+def start_pipeline():
+    data = request.get_json() or {}
+    ports = data.get('ports') or [rfid.port]
+    success, message = rfid.start_pipeline(ports, data.get('workers'))
+    return jsonify({'success': success, 'message': message})
+
+@app.route('/api/pipeline/stop', methods=['POST'])
+def stop_pipeline():
+    success, message = rfid.stop_pipeline()
+    return jsonify({'success': success, 'message': message})
+
+@app.route('/api/pipeline/stats', methods=['GET'])
+def pipeline_stats():
+    if rfid.pipeline is None:
+        return jsonify({'success': False, 'message': "管線未啟動"})
+    return jsonify({'success': True, 'data': rfid.pipeline.stats()})
+
 @app.route('/api/select/get', methods=['POST'])
 def get_select():
     success, message = rfid.get_select_param()
@@ -229,15 +726,108 @@ def set_mode():
     success, message = rfid.set_select_mode()
     return jsonify({'success': success, 'message': message})
 
+@app.route('/api/reader/power', methods=['POST'])
+def set_power():
+    try:
+        dbm = float((request.get_json() or {}).get('dbm', 26))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': "功率必須為數字"}), 400
+    success, message = rfid.set_power(dbm)
+    return jsonify({'success': success, 'message': message})
+
+@app.route('/api/reader/q', methods=['POST'])
+def set_query():
+    config = request.get_json() or {}
+    try:
+        success, message = rfid.set_query(int(config.get('q', 4)),
+                                           int(config.get('session', 0)),
+                                           int(config.get('target', 0)))
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': success, 'message': message})
+
+@app.route('/api/reader/baudrate', methods=['GET'])
+def get_baudrate():
+    return jsonify({'success': True, 'data': {
+        'baudrate': rfid.baudrate,
+        'profile': link_probe.profiles.get(rfid.port)
+    }})
+
+@app.route('/api/reader/baudrate', methods=['POST'])
+def negotiate_baudrate():
+    switch = bool((request.get_json() or {}).get('switch', True))
+    result = rfid.negotiate_baudrate(switch)
+    return jsonify(result), 200 if result['success'] else 409
+
+@app.route('/api/health', methods=['GET'])
+def health():
+    status = rfid.health()
+    return jsonify({'success': status['connected'], 'data': status}), 200 if status['connected'] else 503
+
 @app.route('/api/memory/write', methods=['POST'])
 def write_memory():
     success, message = rfid.write_memory()
     return jsonify({'success': success, 'message': message})
 
+@app.route('/api/memory/read-all', methods=['POST'])
+def read_all_memory():
+    config = request.get_json() or {}
+    try:
+        success, message, results = rfid.read_tag_memory(config.get('epcs'),
+                                                         tuple(config.get('banks', ['tid'])),
+                                                         config.get('words'),
+                                                         bool(config.get('refresh')))
+    except (ValueError, TypeError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': success, 'message': message, 'data': results})
+
+@app.route('/api/memory/cache', methods=['DELETE'])
+def clear_memory_cache():
+    rfid.memory_cache.clear()
+    return jsonify({'success': True, 'message': "已清除記憶體快取"})
+
 @app.route('/api/memory/lock', methods=['POST'])
 def lock_memory():
     success, message = rfid.lock_memory()
     return jsonify({'success': success, 'message': message})
 
+@app.route('/api/sinks', methods=['GET'])
+def get_sinks():
+    return jsonify({'success': True, 'data': rfid.sinks.stats()})
+
+@app.route('/api/sinks', methods=['POST'])
+def add_sink():
+    try:
+        config = request.get_json() or {}
+        sink = rfid.sinks.add(create_sink(config))
+        return jsonify({'success': True, 'message': f"已新增輸出通道 {sink.name}"})
+    except (ValueError, TypeError, OSError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+@app.route('/api/events/stream', methods=['GET'])
+def stream_events():
+    """以 NDJSON 串流送出標籤事件，連線期間為一個輸出通道；閒置時送出空行維持連線"""
+    sink = rfid.sinks.add(StreamSink(f"stream-{uuid.uuid4().hex[:8]}",
+                                     flush_interval=request.args.get('flush_interval', 0.2, type=float)))
+
+    def generate():
+        try:
+            while True:
+                yield sink.next_chunk(timeout=15) or '\n'
+        finally:
+            rfid.sinks.remove(sink.name)
+
+    return Response(generate(), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/sinks/<name>', methods=['DELETE'])
+def remove_sink(name):
+    if rfid.sinks.remove(name):
+        return jsonify({'success': True, 'message': f"已移除輸出通道 {name}"})
+    return jsonify({'success': False, 'message': f"找不到輸出通道 {name}"}), 404
+
+# 設定 RFID_STATIC_ROOT（例如 my-rfid-app/dist）時由同一個行程提供前端
+static_assets.register_from_env(app)
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
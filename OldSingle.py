@@ -6,7 +6,10 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QPushButton, QVBoxLayout
                            QComboBox, QGridLayout)
 from PyQt5.QtCore import QThread, pyqtSignal
 import serial
-import time
+import rfid_protocol as proto
+from read_scheduler import ReadScheduler
+from epc_schema import registry as epc_schemas
+import hex_codec
 
 class RFIDReader(QThread):
     data_received = pyqtSignal(bytes)
@@ -14,15 +17,19 @@ class RFIDReader(QThread):
     def __init__(self, port='COM4', baudrate=115200):
         super().__init__()
         self.serial_port = serial.Serial(port, baudrate, timeout=0.1)
+        self.scheduler = ReadScheduler(self.serial_port)
+        self.decoder = proto.FrameDecoder()
         self.is_running = True
 
     def run(self):
         while self.is_running:
-            if self.serial_port.in_waiting:
-                data = self.serial_port.readline()
-                if data:
-                    self.data_received.emit(data)
-            time.sleep(0.1)
+            try:
+                data = self.scheduler.read_available()
+            except (serial.SerialException, OSError):
+                break
+            # 以完整封包為單位送出，避免readline()在0x0A處切斷資料
+            for frame in self.decoder.feed(data):
+                self.data_received.emit(proto.build_frame(frame.command, frame.params, frame.type))
             
     def write_data(self, data):
         try:
@@ -34,12 +41,9 @@ class RFIDReader(QThread):
         
     def stop(self):
         self.is_running = False
+        self.wait(1000)
         self.serial_port.close()
 
-def bytes_to_hex_string(data):
-    """將位元組資料轉換為十六進位字串"""
-    return ' '.join([f"{b:02X}" for b in data])
-
 def generate_tag_id():
     """產生隨機標籤ID"""
     return f"{random.randint(0, 0xFFFFFF):06X}"
@@ -155,7 +159,8 @@ class MainWindow(QMainWindow):
             status = self.status_combo.currentData()  # 獲取狀態碼
 
             # 組合EPC資料：固定前綴(00) + 標籤ID + 產品ID + 年月日 + 狀態
-            epc = f"00{self.tag_id}{product_id}{year:02X}{month:02X}{day:02X}{status}"
+            epc = epc_schemas.encode('legacy', tag_id=self.tag_id, product_id=product_id,
+                                     year=year, month=month, day=day, status=status)
             
             # 顯示除錯資訊
             self.text_display.append(f"""寫入資料格式：
@@ -201,7 +206,7 @@ class MainWindow(QMainWindow):
             write_cmd = command_bytes + bytes([checksum, 0x7E])
             
             # 顯示將要發送的完整命令
-            self.text_display.append(f"發送寫入命令: {bytes_to_hex_string(write_cmd)}")
+            self.text_display.append(f"發送寫入命令: {hex_codec.to_spaced_hex(write_cmd)}")
             
             if self.rfid_reader.write_data(write_cmd):
                 self.text_display.append("正在寫入...")
@@ -218,7 +223,7 @@ class MainWindow(QMainWindow):
     def parse_epc_data(self, epc_data):
         """解析EPC資料"""
         try:
-            epc_str = bytes_to_hex_string(epc_data).replace(" ", "")
+            epc_str = hex_codec.to_hex(epc_data)
 
             # 直接從頭開始解析，跳過前導30 00
             tag_id = epc_str[4:10]       # 跳過30 00，取標籤ID (3字節)
@@ -228,10 +233,7 @@ class MainWindow(QMainWindow):
             day = epc_str[22:24]         # 日期 (1字節)
             status = epc_str[-2:]        # 狀態 (1字節，取最後兩位)
 
-            # 十六進位轉換為十進位顯示
-            year_dec = 2000 + int(year, 16)    # 修正年份計算
-            month_dec = int(month, 16)
-            day_dec = int(day, 16)
+            year_dec, month_dec, day_dec = hex_codec.byte_date(epc_data, 9)
 
             # 狀態代碼對應說明
             status_desc = {
@@ -255,7 +257,7 @@ class MainWindow(QMainWindow):
 
     def handle_response(self, data):
         """處理接收到的RFID回應"""
-        hex_str = bytes_to_hex_string(data)
+        hex_str = hex_codec.to_spaced_hex(data)
         self.text_display.append(f"收到資料: {hex_str}")
         
         # 分析回應
@@ -6,7 +6,15 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QPushButton, QVBoxLayout
                            QComboBox, QGridLayout)
 from PyQt5.QtCore import QThread, pyqtSignal
 import serial
-import time
+import rfid_protocol as proto
+from read_scheduler import ReadScheduler
+from epc_schema import registry as epc_schemas
+import hex_codec
+from collections import deque
+from encoded_index import EncodedTagIndex
+
+# 寫入指令失敗時的錯誤代碼；0x15 在盤點沒有標籤時也會回報，不能用來對應寫入
+WRITE_ERROR_CODES = frozenset([0x09, 0x10, 0x16, 0x17, 0xA3, *range(0xB0, 0xC0)])
 
 class RFIDReader(QThread):
     data_received = pyqtSignal(bytes)
@@ -14,15 +22,19 @@ class RFIDReader(QThread):
     def __init__(self, port='COM4', baudrate=115200):
         super().__init__()
         self.serial_port = serial.Serial(port, baudrate, timeout=0.1)
+        self.scheduler = ReadScheduler(self.serial_port)
+        self.decoder = proto.FrameDecoder()
         self.is_running = True
 
     def run(self):
         while self.is_running:
-            if self.serial_port.in_waiting:
-                data = self.serial_port.readline()
-                if data:
-                    self.data_received.emit(data)
-            time.sleep(0.1)
+            try:
+                data = self.scheduler.read_available()
+            except (serial.SerialException, OSError):
+                break
+            # 以完整封包為單位送出，避免readline()在0x0A處切斷資料
+            for frame in self.decoder.feed(data):
+                self.data_received.emit(proto.build_frame(frame.command, frame.params, frame.type))
             
     def write_data(self, data):
         try:
@@ -34,12 +46,9 @@ class RFIDReader(QThread):
         
     def stop(self):
         self.is_running = False
+        self.wait(1000)
         self.serial_port.close()
 
-def bytes_to_hex_string(data):
-    """将字节数据转换为十六进制字符串"""
-    return ' '.join([f"{b:02X}" for b in data])
-
 def generate_tag_id():
     """生成随机标签ID"""
     return f"{random.randint(0, 0xFFFFFF):06X}"
@@ -133,6 +142,9 @@ class MainWindow(QMainWindow):
 
         # 记录已处理的标签
         self.processed_tags = set()
+        # 已寫入的標籤（以寫入後的EPC為鍵）持久保存，重新啟動或標籤再次進入範圍時不重複寫入
+        self.encoded_index = EncodedTagIndex()
+        self.pending_writes = deque()
         self.is_multi_reading = False
         self.is_multi_writing = False
 
@@ -195,7 +207,7 @@ class MainWindow(QMainWindow):
         # 使用多次轮询命令进行连续读取
         command = bytes.fromhex("BB 00 27 00 03 22 FF FF 4A 7E")
         if self.rfid_reader.write_data(command):
-            self.text_display.append("开始连续写入模式...")
+            self.text_display.append(f"开始连续写入模式...（已写入标签记录：{len(self.encoded_index)}）")
             self.multi_write_button.setEnabled(False)
             self.stop_write_button.setEnabled(True)
             self.status_label.setText("状态：连续写入中")
@@ -227,7 +239,8 @@ class MainWindow(QMainWindow):
             status = self.status_combo.currentData()  # 获取状态码
 
             # 组合EPC数据：固定前缀(00) + 标签ID + 产品ID + 年月日 + 状态
-            epc = f"00{self.tag_id}{product_id}{year:02X}{month:02X}{day:02X}{status}"
+            epc = epc_schemas.encode('legacy', tag_id=self.tag_id, product_id=product_id,
+                                     year=year, month=month, day=day, status=status)
             
             # 显示debug信息
             self.text_display.append(f"""写入数据格式：
@@ -241,10 +254,16 @@ class MainWindow(QMainWindow):
         except ValueError as e:
             raise ValueError(f"数据格式错误: {str(e)}")
 
-    def handle_multi_write_response(self, epc_data):
+    def handle_multi_write_response(self, epc_data, current_epc=None):
         """处理连续写入模式下的标签"""
-        epc_str = bytes_to_hex_string(epc_data)
+        epc_str = hex_codec.to_spaced_hex(epc_data)
         
+        # 目前的EPC是之前写入的结果，表示已写入过（含重新启动前）
+        if epc_str not in self.processed_tags and current_epc and self.encoded_index.contains(epc=current_epc):
+            self.processed_tags.add(epc_str)
+            self.text_display.append(f"\n标签已写入过，略过：{epc_str}")
+            return
+
         # 检查是否已处理过这个标签
         if epc_str not in self.processed_tags:
             self.text_display.append(f"\n检测到新标签：{epc_str}")
@@ -262,6 +281,7 @@ class MainWindow(QMainWindow):
                 # 发送写入命令
                 if self.rfid_reader.write_data(write_cmd):
                     self.text_display.append("正在写入标签数据...")
+                    self.pending_writes.append((epc_hex, current_epc))
                     # 添加到已处理列表
                     self.processed_tags.add(epc_str)
                     self.text_display.append(f"已处理标签数：{len(self.processed_tags)}")
@@ -272,7 +292,7 @@ class MainWindow(QMainWindow):
     def parse_epc_data(self, epc_data):
         """解析EPC資料，跳過前導30 00"""
         try:
-            epc_str = bytes_to_hex_string(epc_data).replace(" ", "")
+            epc_str = hex_codec.to_hex(epc_data)
             
             # 檢查總長度是否足夠（跳過前導30 00後應為20位）
             if len(epc_str) != 24:
@@ -288,9 +308,7 @@ class MainWindow(QMainWindow):
             status = epc_str[-2:]         # 狀態 (1字節，取最後兩位)
 
             # 十六進制轉換為十進制顯示
-            year_dec = 2000 + int(year, 16)    # 修正年份計算
-            month_dec = int(month, 16)
-            day_dec = int(day, 16)
+            year_dec, month_dec, day_dec = hex_codec.byte_date(epc_data, 9)
 
             # 狀態代碼對應說明
             status_desc = {
@@ -334,10 +352,15 @@ class MainWindow(QMainWindow):
             if data[1] == 0x02:  # 标签读取响应
                 if len(data) >= 19:
                     epc_data = data[7:19]
-                    self.handle_multi_write_response(epc_data)
+                    # 完整EPC位于RSSI与PC之后
+                    current_epc = hex_codec.to_hex(data[8:20]) if len(data) >= 20 else None
+                    self.handle_multi_write_response(epc_data, current_epc)
             elif data[1] == 0x01:  # 命令执行响应
+                # 错误代码位于参数第一个字节；只有写入响应或写入相关错误才对应到待确认的写入
+                error_code = (data[5] if len(data) > 5 else 0) if data[2] == 0xFF else None
+                is_write = data[2] == 0x49 or error_code in WRITE_ERROR_CODES
+                written = self.pending_writes.popleft() if is_write and self.pending_writes else None
                 if data[2] == 0xFF:  # 错误响应
-                    error_code = data[6] if len(data) > 6 else 0
                     error_msg = {
                         0x09: "没有找到标签",
                         0x15: "写入失败",
@@ -346,7 +369,10 @@ class MainWindow(QMainWindow):
                         0xA3: "超出芯片容量范围"
                     }.get(error_code, f"未知错误(0x{error_code:02X})")
                     self.text_display.append(f"错误: {error_msg}")
-                else:
+                elif data[2] == 0x49:
+                    if written:
+                        epc_hex, source_epc = written
+                        self.encoded_index.add(epc_hex, source_epc=source_epc)
                     self.text_display.append("写入完成，可以移除标签")
                     
         # 普通模式或批量读取模式的响应处理
@@ -355,7 +381,7 @@ class MainWindow(QMainWindow):
                 if data[1] == 0x02:  # 标签读取响应
                     if len(data) >= 19:
                         epc_data = data[7:19]
-                        epc_str = bytes_to_hex_string(epc_data)
+                        epc_str = hex_codec.to_spaced_hex(epc_data)
                         
                         if epc_str not in self.processed_tags:
                             self.processed_tags.add(epc_str)
@@ -367,7 +393,7 @@ class MainWindow(QMainWindow):
                                 
         # 普通模式的响应处理
         else:
-            hex_str = bytes_to_hex_string(data)
+            hex_str = hex_codec.to_spaced_hex(data)
             self.text_display.append(f"收到数据: {hex_str}")
             
             if len(data) > 3 and data[0] == 0xBB:
@@ -388,6 +414,7 @@ class MainWindow(QMainWindow):
             self.stop_multi_read()
             self.stop_multi_write()
         self.rfid_reader.stop()
+        self.encoded_index.close()
         event.accept()
 
 if __name__ == '__main__':
@@ -0,0 +1,395 @@
+"""多站編碼工作分配
+
+一筆編碼訂單（產品ID × 數量）分給所有已登錄的寫入站同時執行，總速度隨站數增加：
+- 訂單建立時由 TagIdAllocator 保留一段連續的標籤ID（依 產品ID + 日期 持久記錄在
+  tag_id_ranges.json），不同訂單、不同站之間不會重複；Backend 的 /write、/write/batch
+  也由同一個 allocator 逐一取號，不會與訂單的範圍重複
+- 保留的標籤ID切成小區塊，依站數平均分到各站自己的佇列（每站一段連續範圍）
+- work stealing：站完成自己的區塊後，從剩餘最多的站的佇列尾端取走區塊；
+  慢的站只會少做，不會拖住整筆訂單
+- 單張標籤寫入失敗且確定沒有寫入時，該標籤ID放回重試佇列由任一站重試（最多 max_attempts 次）
+- 站發生例外（串口中斷、遠端逾時）或已寫入但驗證失敗時，先向該站對帳：已寫入的記為完成，
+  確定沒有寫入的才放回佇列，無法確認的記為失敗不重試，避免同一個EPC寫到兩張標籤
+- 站連續發生 max_station_errors 次例外即停用，佇列中的區塊由其他站取走
+
+寫入前每個EPC先綁定天線範圍內一張尚未寫入的標籤（以該標籤目前的EPC為 target_epc），
+沒有新標籤時該EPC不寫入、稍後重試；沒有綁定標籤的結果不計為完成。
+
+站的介面：encode(epcs, lock, keys) -> 每張標籤的結果（含 error、written、target_epc），
+reconcile(epcs, keys) -> {epc: True 已寫入 / False 沒有寫入 / None 無法確認}。
+LocalStation 使用本行程的 RFIDController，以 Select 讀取確認天線範圍內的標籤；
+RemoteStation 透過另一台工作站的 /write/batch，每張標籤帶冪等鍵，以 /write/jobs 查詢寫入紀錄。
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+
+from encode_pipeline import locate_epcs, make_job
+from epc_schema import registry as epc_schemas
+from write_jobs import STATUS_DONE, STATUS_FAILED, STATUS_PENDING
+
+DEFAULT_RANGE_PATH = 'tag_id_ranges.json'
+MAX_TAG_ID = 0xFFFF
+
+
+class TagIdAllocator:
+    """依 產品ID + 日期 保留連續的標籤ID範圍"""
+
+    def __init__(self, path=DEFAULT_RANGE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.next_ids = {}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    self.next_ids = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"讀取標籤ID範圍錯誤: {str(e)}")
+
+    def reserve(self, product_id, day, quantity):
+        """保留 quantity 個標籤ID，傳回起始值"""
+        key = f"{product_id}:{day}"
+        with self.lock:
+            start = self.next_ids.get(key, 0)
+            if start + quantity - 1 > MAX_TAG_ID:
+                raise ValueError(f"產品 {product_id} 在 {day} 剩餘的標籤ID不足"
+                                 f"（剩 {MAX_TAG_ID + 1 - start} 個）")
+            self.next_ids[key] = start + quantity
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.next_ids, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, self.path)
+        return start
+
+
+class LocalStation:
+    """本行程的讀寫器（RFIDController）"""
+
+    def __init__(self, name, controller, wait=5.0):
+        self.name = name
+        self.controller = controller
+        self.wait = wait
+
+    def encode(self, epcs, lock=False, keys=None):
+        # 每個EPC綁定天線範圍內不同的一張未寫入標籤，沒有新標籤的EPC不寫入
+        return self.controller.encode_new_tags([make_job(epc, lock=lock) for epc in epcs], self.wait)
+
+    def reconcile(self, epcs, keys=None):
+        return locate_epcs(self.controller, epcs)
+
+    def describe(self):
+        return {'name': self.name, 'type': 'local'}
+
+
+def job_written(job):
+    """由遠端的寫入工作紀錄判斷是否已寫入：True / False / None（無法確認）"""
+    if job is None or job['status'] == STATUS_PENDING:
+        return False
+    if job['status'] == STATUS_DONE:
+        return True
+    if job['status'] == STATUS_FAILED and not (job.get('result') or {}).get('written'):
+        return False
+    return None
+
+
+class RemoteStation:
+    """另一台工作站的 Backend，以 /write/batch 寫入指定的EPC"""
+
+    def __init__(self, name, url, timeout=30.0):
+        from rfid_client import RFIDClient
+        self.name = name
+        self.url = url
+        self.client = RFIDClient(url, pool_size=1, timeout=timeout)
+
+    def encode(self, epcs, lock=False, keys=None):
+        items = [{'data': epc, 'bank': 'epc', 'lock': lock} for epc in epcs]
+        for item, key in zip(items, keys or ()):
+            item['idempotency_key'] = key
+        return self.client.write_batch(items, bind=True)
+
+    def reconcile(self, epcs, keys):
+        found = {}
+        for epc, key in zip(epcs, keys):
+            try:
+                found[epc] = job_written(self.client.job_by_key(key))
+            except Exception as e:
+                print(f"查詢寫入站 {self.name} 的工作錯誤: {str(e)}")
+                found[epc] = None
+        return found
+
+    def describe(self):
+        return {'name': self.name, 'type': 'remote', 'url': self.url}
+
+
+class EncodeOrder:
+    def __init__(self, product_id, quantity, stations, start_id, day, lock=False,
+                 chunk_size=8, max_attempts=3, max_station_errors=3):
+        if not stations:
+            raise ValueError("沒有可用的寫入站")
+        self.id = uuid.uuid4().hex[:12]
+        self.product_id = product_id
+        self.quantity = quantity
+        self.day = day
+        self.lock = lock
+        self.max_attempts = max_attempts
+        self.max_station_errors = max_station_errors
+        self.chunk_size = chunk_size
+        self.stations = list(stations)
+        self.mutex = threading.Lock()
+        self.done = threading.Event()
+        self.results = {}
+        self.attempts = {}
+        self.retry = deque()
+        self.in_flight = 0
+        self.created = time.time()
+        self.finished = None
+        self.cancelled = False
+
+        # 每站一段連續的標籤ID，切成區塊放入該站的佇列
+        tag_ids = list(range(start_id, start_id + quantity))
+        share = -(-quantity // len(self.stations))
+        self.queues = {}
+        self.station_stats = {}
+        for index, station in enumerate(self.stations):
+            own = tag_ids[index * share:(index + 1) * share]
+            self.queues[station.name] = deque(own[i:i + chunk_size] for i in range(0, len(own), chunk_size))
+            self.station_stats[station.name] = {
+                'range': [f"{own[0]:04X}", f"{own[-1]:04X}"] if own else None,
+                'encoded': 0, 'failed': 0, 'stolen': 0, 'errors': 0,
+                'active': True, 'last_error': None, 'busy_seconds': 0.0
+            }
+
+    def epc(self, tag_id):
+        return epc_schemas.encode('standard', tag_id=f"{tag_id:04X}", product_id=self.product_id,
+                                  year=self.day // 10000, month=self.day // 100 % 100, day=self.day % 100)
+
+    def key(self, tag_id):
+        """遠端寫入站的冪等鍵，重送或對帳時對應同一筆寫入工作"""
+        return f"{self.id}-{tag_id:04X}"
+
+    def _reconcile(self, station, tag_ids):
+        """向寫入站確認標籤是否已寫入，傳回與 tag_ids 對應的 True / False / None"""
+        if not tag_ids:
+            return []
+        epcs = [self.epc(tag_id) for tag_id in tag_ids]
+        try:
+            found = station.reconcile(epcs, [self.key(tag_id) for tag_id in tag_ids])
+        except Exception as e:
+            print(f"寫入站 {station.name} 對帳錯誤: {str(e)}")
+            found = {}
+        return [found.get(epc) for epc in epcs]
+
+    def _settle(self, station, tag_id, result, found, stats):
+        """記錄一張標籤的結果，需要重試時傳回True（呼叫端需持有mutex）
+
+        result 為站回傳的結果（例外或未回傳時為None），found 為對帳結果（未對帳時為None）
+        """
+        attempts = self.attempts[tag_id] = self.attempts.get(tag_id, 0) + 1
+        retry = False
+        if found is True:
+            result = {'data': self.epc(tag_id), 'error': None, 'reconciled': True}
+        elif found is False:
+            result = dict(result or {'data': self.epc(tag_id), 'error': "寫入站未回應"}, reconciled=True)
+            retry = True
+        elif result is None or (result.get('error') and result.get('written')):
+            # 可能已寫入，重試會把同一個EPC寫到另一張標籤
+            result = dict(result or {'data': self.epc(tag_id)}, error="無法確認是否已寫入，未重試")
+        elif not result.get('error') and not result.get('target_epc'):
+            # 沒有綁定標籤的寫入無法確認是寫到自己的一張標籤，不計為完成
+            result = dict(result, error="寫入未綁定標籤，無法確認是否為不同的標籤")
+        else:
+            retry = bool(result.get('error'))
+        if retry and attempts < self.max_attempts:
+            return True
+        self.results[tag_id] = dict(result, tag_id=f"{tag_id:04X}", station=station.name, attempts=attempts)
+        stats['failed' if result.get('error') else 'encoded'] += 1
+        return False
+
+    def _next_chunk(self, name):
+        """自己的佇列 → 重試佇列 → 從剩餘最多的站尾端取走（呼叫端需持有mutex）"""
+        own = self.queues[name]
+        if own:
+            return own.popleft()
+        if self.retry:
+            chunk = []
+            while self.retry and len(chunk) < self.chunk_size:
+                chunk.append(self.retry.popleft())
+            return chunk
+        victim = max(self.queues, key=lambda other: len(self.queues[other]))
+        if self.queues[victim]:
+            self.station_stats[name]['stolen'] += 1
+            return self.queues[victim].pop()
+        return None
+
+    def _finished(self):
+        return (self.in_flight == 0 and not self.retry
+                and not any(self.queues.values()))
+
+    def _run_station(self, station):
+        stats = self.station_stats[station.name]
+        consecutive_errors = 0
+        while not self.cancelled:
+            with self.mutex:
+                chunk = self._next_chunk(station.name)
+                if chunk is None:
+                    if self._finished():
+                        self.done.set()
+                        return
+                else:
+                    self.in_flight += 1
+            if chunk is None:
+                # 其他站仍在處理，失敗時可能放回重試佇列
+                time.sleep(0.05)
+                continue
+            started = time.monotonic()
+            try:
+                results = station.encode([self.epc(tag_id) for tag_id in chunk], self.lock,
+                                         [self.key(tag_id) for tag_id in chunk])
+            except Exception as e:
+                consecutive_errors += 1
+                # 例外時站可能已寫入部分標籤，只放回確定沒有寫入的
+                found = self._reconcile(station, chunk)
+                with self.mutex:
+                    stats['errors'] += 1
+                    stats['last_error'] = str(e)
+                    unwritten = [tag_id for tag_id, state in zip(chunk, found)
+                                 if self._settle(station, tag_id, None, state, stats)]
+                    if unwritten:
+                        self.queues[station.name].appendleft(unwritten)
+                    self.in_flight -= 1
+                    if consecutive_errors >= self.max_station_errors:
+                        # 停用此站，剩餘區塊由其他站取走
+                        stats['active'] = False
+                        self._retire(station.name)
+                        return
+                time.sleep(min(0.5 * consecutive_errors, 5.0))
+                continue
+            consecutive_errors = 0
+            # 已寫入但驗證失敗、或站少回傳結果的標籤先對帳
+            results = list(results[:len(chunk)]) + [None] * (len(chunk) - len(results))
+            uncertain = [tag_id for tag_id, result in zip(chunk, results)
+                         if result is None or (result.get('error') and result.get('written'))]
+            found = dict(zip(uncertain, self._reconcile(station, uncertain)))
+            with self.mutex:
+                stats['busy_seconds'] += time.monotonic() - started
+                for tag_id, result in zip(chunk, results):
+                    if self._settle(station, tag_id, result, found.get(tag_id), stats):
+                        self.retry.append(tag_id)
+                self.in_flight -= 1
+
+    def _retire(self, name):
+        """停用的站的佇列併入其他仍在運作的站（呼叫端需持有mutex）"""
+        active = [station.name for station in self.stations if self.station_stats[station.name]['active']]
+        leftover = self.queues[name]
+        self.queues[name] = deque()
+        if not active:
+            # 所有站都停用，剩餘標籤記為失敗
+            for chunk in leftover:
+                for tag_id in chunk:
+                    self.results[tag_id] = {'tag_id': f"{tag_id:04X}", 'error': "所有寫入站都已停用"}
+            for tag_id in self.retry:
+                self.results[tag_id] = {'tag_id': f"{tag_id:04X}", 'error': "所有寫入站都已停用"}
+            self.retry.clear()
+            if self.in_flight == 0:
+                self.done.set()
+            return
+        for index, chunk in enumerate(leftover):
+            self.queues[active[index % len(active)]].append(chunk)
+
+    def start(self):
+        for station in self.stations:
+            threading.Thread(target=self._run_station, args=(station,),
+                             name=f"encode-{self.id}-{station.name}", daemon=True).start()
+
+        def finish():
+            self.done.wait()
+            self.finished = time.time()
+
+        threading.Thread(target=finish, daemon=True).start()
+        return self
+
+    def cancel(self):
+        """停止分配新的區塊（各站正在寫入的區塊會完成）"""
+        self.cancelled = True
+        self.done.set()
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+    def status(self, include_results=False):
+        with self.mutex:
+            encoded = sum(1 for result in self.results.values() if not result.get('error'))
+            elapsed = (self.finished or time.time()) - self.created
+            data = {
+                'id': self.id,
+                'product_id': self.product_id,
+                'quantity': self.quantity,
+                'encoded': encoded,
+                'failed': len(self.results) - encoded,
+                'remaining': self.quantity - len(self.results),
+                'complete': self.done.is_set(),
+                'cancelled': self.cancelled,
+                'elapsed': round(elapsed, 3),
+                'rate': round(encoded / elapsed, 2) if elapsed > 0 else 0.0,
+                'stations': {name: dict(stats) for name, stats in self.station_stats.items()}
+            }
+            if include_results:
+                data['results'] = [self.results[tag_id] for tag_id in sorted(self.results)]
+        return data
+
+
+class EncodeCoordinator:
+    """登錄寫入站並建立分散的編碼訂單"""
+
+    def __init__(self, allocator=None):
+        self.allocator = allocator or TagIdAllocator()
+        self.stations = {}
+        self.orders = {}
+        self.lock = threading.Lock()
+
+    def add_station(self, station):
+        with self.lock:
+            if station.name in self.stations:
+                raise ValueError(f"寫入站名稱重複: {station.name}")
+            self.stations = {**self.stations, station.name: station}
+        return station
+
+    def remove_station(self, name):
+        with self.lock:
+            stations = dict(self.stations)
+            removed = stations.pop(name, None)
+            self.stations = stations
+        return removed is not None
+
+    def create_order(self, product_id, quantity, lock=False, stations=None, chunk_size=8, day=None):
+        product_id = product_id.upper()
+        if len(product_id) != 13 or not all(c in '0123456789ABCDEF' for c in product_id):
+            raise ValueError("產品ID必須是13位十六進位數")
+        quantity = int(quantity)
+        if quantity <= 0:
+            raise ValueError("數量必須大於0")
+        if stations:
+            unknown = [name for name in stations if name not in self.stations]
+            if unknown:
+                raise ValueError(f"找不到寫入站: {', '.join(unknown)}")
+            selected = [self.stations[name] for name in stations]
+        else:
+            selected = list(self.stations.values())
+        if day is None:
+            now = datetime.now()
+            day = now.year * 10000 + now.month * 100 + now.day
+        start_id = self.allocator.reserve(product_id, day, quantity)
+        order = EncodeOrder(product_id, quantity, selected, start_id, day, lock, chunk_size)
+        with self.lock:
+            self.orders[order.id] = order
+        return order.start()
+
+    def get(self, order_id):
+        return self.orders.get(order_id)
+
+    def describe_stations(self):
+        return [station.describe() for station in self.stations.values()]
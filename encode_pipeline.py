@@ -0,0 +1,308 @@
+"""管線化編碼：寫入 → 讀回比對 → (選擇性)鎖定
+
+每張標籤的 Select/寫入/讀回 指令一次送出，讀寫器依序回應；
+下一張標籤的指令在本張比對時就先送出，避免每個步驟都等待完整往返時間。
+多個工作必須各自指定 target_epc（不同的實體標籤），未指定時一次只寫入一張。
+"""
+import time
+import rfid_protocol as proto
+import hex_codec
+
+# 記憶體區塊名稱 -> (區塊代碼, 預設起始字組)
+BANKS = {
+    'epc': (proto.BANK_EPC, 2),     # 跳過CRC與PC
+    'user': (proto.BANK_USER, 0)
+}
+
+
+def make_job(data, bank='epc', start_word=None, target_epc=None,
+             lock=False, lock_action='lock', access_password='00000000'):
+    """建立編碼工作，資料皆為十六進位字串"""
+    if bank not in BANKS:
+        raise ValueError(f"不支援的記憶體區塊: {bank}")
+    bank_code, default_start = BANKS[bank]
+    data_bytes = bytes.fromhex(data)
+    if not data_bytes or len(data_bytes) % 2:
+        raise ValueError("寫入資料長度必須為字組(4碼十六進位)的倍數")
+    password = bytes.fromhex(access_password)
+    if len(password) != 4:
+        raise ValueError("存取密碼必須是8位十六進位數")
+    if lock_action not in proto.LOCK_ACTIONS:
+        raise ValueError(f"不支援的鎖定動作: {lock_action}")
+    return {
+        'bank': bank,
+        'bank_code': bank_code,
+        'start_word': default_start if start_word is None else start_word,
+        'data': data_bytes,
+        'target_epc': bytes.fromhex(target_epc) if target_epc else None,
+        'lock': lock,
+        'lock_action': lock_action,
+        'access_password': password
+    }
+
+
+def restore_select(controller, timeout=1.0):
+    """還原批次作業前的Select設定（呼叫端需持有 controller.lock）
+
+    重送已記錄的Select參數與模式；沒有記錄時關閉Select，避免最後一張標籤的遮罩
+    影響之後的讀寫指令。成功傳回None，失敗傳回錯誤訊息，由呼叫端回報。
+    """
+    supervisor = getattr(controller, 'supervisor', None)
+    remembered = supervisor.config_frames if supervisor is not None else {}
+    frames = [remembered[name] for name in ('select', 'select_mode') if name in remembered]
+    if 'select_mode' not in remembered:
+        frames.append(proto.build_select_mode(proto.SELECT_MODE_NONE))
+    try:
+        # 先清除逾時後殘留的回應
+        time.sleep(0.05)
+        controller.reset_input()
+        controller.send_frames(frames)
+        for _ in frames:
+            frame = controller.read_response(timeout)
+            if frame is None:
+                return "還原Select設定逾時"
+            error = proto.frame_error(frame)
+            if error:
+                return f"還原Select設定失敗: {error}"
+    except Exception as e:
+        return f"還原Select設定錯誤: {str(e)}"
+    return None
+
+
+def locate_epcs(controller, epcs, timeout=1.0):
+    """確認天線範圍內是否有標籤帶著指定的EPC（以EPC為遮罩Select後讀取EPC區塊）
+
+    傳回 {epc: True / False / None}：True 找到，False 讀寫器回報找不到標籤，
+    None 無法確定（逾時或其他錯誤）。用於重試寫入前確認上一次是否已寫入。
+    Select設定還原失敗時拋出 OSError。
+    """
+    found = {}
+    restore_error = None
+    with controller.lock:
+        controller.reset_input()
+        controller.send_frames([proto.build_select_mode(proto.SELECT_MODE_EXCEPT_POLL)])
+        if controller.read_response(timeout) is None:
+            raise TimeoutError("設定Select模式逾時")
+        try:
+            for epc in epcs:
+                data = bytes.fromhex(epc)
+                controller.send_frames([
+                    proto.build_select(data),
+                    proto.build_read_memory(proto.BANK_EPC, BANKS['epc'][1], len(data) // 2)
+                ])
+                select_resp = controller.read_response(timeout)
+                read_resp = controller.read_response(timeout) if select_resp is not None else None
+                if read_resp is None:
+                    found[epc] = None
+                    time.sleep(0.05)
+                    controller.reset_input()
+                    continue
+                if proto.frame_error(select_resp):
+                    found[epc] = None
+                elif proto.frame_error_code(read_resp) is not None:
+                    found[epc] = False if proto.frame_error_code(read_resp) == proto.ERROR_NO_TAG else None
+                else:
+                    _, read_back = proto.parse_memory_response(read_resp)
+                    found[epc] = read_back[:len(data)] == data
+        finally:
+            restore_error = restore_select(controller, timeout)
+    if restore_error:
+        raise OSError(restore_error)
+    return found
+
+
+def inventory_field(controller, rounds=8, timeout=0.3):
+    """以單次盤點取得天線範圍內標籤目前的EPC（依讀到的先後，不重複）
+
+    controller.read_response 需支援 notices=True（一併傳回盤點通知）。
+    """
+    found = {}
+    with controller.lock:
+        controller.reset_input()
+        controller.send_frames([proto.build_single_poll()] * rounds)
+        while True:
+            frame = controller.read_response(timeout, notices=True)
+            if frame is None:
+                break
+            if frame.type == proto.TYPE_NOTICE:
+                found.setdefault(hex_codec.to_hex(proto.parse_poll_notice(frame)['epc']), None)
+    return list(found)
+
+
+def find_fresh_tags(controller, count, exclude=(), wait=5.0):
+    """找出最多 count 張目前EPC不在 exclude（已寫入的EPC）中的標籤，傳回各標籤目前的EPC
+
+    天線範圍內沒有新標籤時持續盤點，最多等待 wait 秒；已找到標籤但再盤點也沒有新的時就傳回。
+    """
+    deadline = time.monotonic() + wait
+    fresh = []
+    while True:
+        new = [epc for epc in inventory_field(controller)
+               if epc not in exclude and epc not in fresh]
+        fresh += new
+        if len(fresh) >= count or (fresh and not new) or time.monotonic() >= deadline:
+            return fresh[:count]
+        time.sleep(0.1)
+
+
+class EncodePipeline:
+    """依序對多張標籤執行寫入、讀回比對與鎖定"""
+
+    def __init__(self, controller, timeout=1.0):
+        self.controller = controller
+        self.timeout = timeout
+
+    def _job_frames(self, job):
+        """組合單張標籤的 Select + 寫入 + 讀回 指令"""
+        frames = []
+        if job['target_epc']:
+            frames.append(proto.build_select(job['target_epc']))
+        frames.append(proto.build_write_memory(
+            job['bank_code'], job['start_word'], job['data'], job['access_password']))
+        if job['target_epc'] and job['bank'] == 'epc':
+            # 寫入後EPC已改變，原本的遮罩選不到標籤，改以寫入的資料重新Select
+            frames.append(proto.build_select(job['data'], proto.BANK_EPC, job['start_word'] * 16))
+        frames.append(proto.build_read_memory(
+            job['bank_code'], job['start_word'], len(job['data']) // 2, job['access_password']))
+        return frames
+
+    def _collect(self, count):
+        """依序收取指定數量的命令回應，逾時傳回None"""
+        frames = []
+        for _ in range(count):
+            frame = self.controller.read_response(self.timeout)
+            if frame is None:
+                return None
+            frames.append(frame)
+        return frames
+
+    def _resync(self):
+        """逾時後等待殘餘回應到達再清空，重新對齊指令與回應"""
+        time.sleep(0.05)
+        self.controller.reset_input()
+
+    def run(self, jobs):
+        """執行編碼工作，傳回每張標籤的結果
+
+        批次結束後還原Select設定失敗時，每張標籤的結果附上 select_error（寫入結果仍有效）。
+        """
+        results = []
+        restore_error = None
+        if not jobs:
+            return results
+
+        targeted = [job['target_epc'] is not None for job in jobs]
+        if any(targeted) and not all(targeted):
+            raise ValueError("指定目標標籤時，所有工作都必須提供target_epc")
+        if not targeted[0] and len(jobs) > 1:
+            # 沒有Select時每個工作都寫到同一張（最先回應的）標籤
+            raise ValueError("未指定target_epc時一次只能寫入一張標籤")
+
+        controller = self.controller
+        with controller.lock:
+            controller.reset_input()
+            if targeted[0]:
+                # Select只套用於讀寫與鎖定指令，不影響盤點
+                controller.send_frames([proto.build_select_mode(proto.SELECT_MODE_EXCEPT_POLL)])
+                if self._collect(1) is None:
+                    raise TimeoutError("設定Select模式逾時")
+
+            try:
+                pending = self._job_frames(jobs[0])
+                for index, job in enumerate(jobs):
+                    started = time.monotonic()
+                    result = {
+                        'index': index,
+                        'bank': job['bank'],
+                        'data': hex_codec.to_hex(job['data']),
+                        'target_epc': hex_codec.to_hex(job['target_epc']) if job['target_epc'] else None,
+                        'written': False,
+                        'verified': False,
+                        'locked': False,
+                        'error': None
+                    }
+                    results.append(result)
+
+                    if pending is not None:
+                        controller.send_frames(pending)
+                        step_count = len(pending)
+                        pending = None
+                    else:
+                        step_count = len(self._job_frames(job))
+
+                    responses = self._collect(step_count)
+                    # 只有指定目標標籤的工作會提前送出下一張的指令
+                    next_frames = (self._job_frames(jobs[index + 1])
+                                   if targeted[0] and index + 1 < len(jobs) else [])
+
+                    if responses is None:
+                        result['error'] = "等待回應逾時"
+                        self._resync()
+                        pending = next_frames or None
+                        result['elapsed_ms'] = round((time.monotonic() - started) * 1000, 1)
+                        continue
+
+                    write_index = 1 if job['target_epc'] else 0
+                    setup = responses[:write_index]
+                    write_resp, verify_resp = responses[write_index], responses[-1]
+                    reselect = responses[write_index + 1:-1]
+
+                    # 不需鎖定時，下一張標籤的指令與本張的比對重疊進行
+                    if not job['lock'] and next_frames:
+                        controller.send_frames(next_frames)
+                        next_frames = []
+
+                    error = None
+                    for frame in setup + [write_resp]:
+                        error = proto.frame_error(frame)
+                        if error:
+                            break
+                    if error:
+                        result['error'] = error
+                    else:
+                        result['written'] = True
+                        verify_error = None
+                        for frame in reselect + [verify_resp]:
+                            verify_error = proto.frame_error(frame)
+                            if verify_error:
+                                break
+                        if verify_error:
+                            result['error'] = f"讀回失敗: {verify_error}"
+                        else:
+                            _, read_back = proto.parse_memory_response(verify_resp)
+                            if read_back[:len(job['data'])] == job['data']:
+                                result['verified'] = True
+                            else:
+                                result['error'] = "讀回資料不符"
+                                result['read_back'] = hex_codec.to_hex(read_back)
+
+                    burst = []
+                    if job['lock'] and result['verified']:
+                        burst.append(proto.build_lock([job['bank']], job['lock_action'],
+                                                      job['access_password']))
+                    burst.extend(next_frames)
+                    if burst:
+                        controller.send_frames(burst)
+                    if job['lock'] and result['verified']:
+                        lock_resp = self._collect(1)
+                        if lock_resp is None:
+                            result['error'] = "鎖定回應逾時"
+                            self._resync()
+                            pending = next_frames or None
+                        else:
+                            lock_error = proto.frame_error(lock_resp[0])
+                            if lock_error:
+                                result['error'] = f"鎖定失敗: {lock_error}"
+                            else:
+                                result['locked'] = True
+
+                    result['elapsed_ms'] = round((time.monotonic() - started) * 1000, 1)
+
+            finally:
+                if targeted[0]:
+                    restore_error = restore_select(controller, self.timeout)
+
+        if restore_error:
+            for result in results:
+                result['select_error'] = restore_error
+        return results
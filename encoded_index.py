@@ -0,0 +1,180 @@
+"""已寫入標籤索引（可重新啟動）
+
+連續寫入模式原本只用記憶體中的 set 記錄寫入前的EPC，程式重新啟動或標籤以新EPC
+再次進入讀取範圍時會被重複寫入。這裡把寫入完成的標籤以 最終EPC（及TID，若有）
+記錄在 SQLite，前面放一個記憶體中的 Bloom filter：
+- 絕大多數讀到的都是尚未寫入的標籤，Bloom filter 判定不存在即可直接寫入，不查資料庫
+- Bloom filter 判定可能存在時才以主鍵查 SQLite 確認，誤判率預設 0.1%
+- Bloom filter 關閉時存成 .bloom 檔並記錄最後的 rowid，下次啟動只補上之後新增的列；
+  異常中斷沒有存檔時由資料庫重建
+- 標籤數超過容量時容量加倍並重建，誤判率維持在設定值
+"""
+import hashlib
+import math
+import os
+import sqlite3
+import struct
+import threading
+import time
+
+BLOOM_MAGIC = b'RFBL1'
+BLOOM_HEADER = struct.Struct('>5sQQIq')
+
+
+def _key(kind, value):
+    return f"{kind}:{value.replace(' ', '').upper()}"
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = max(int(capacity), 1)
+        self.error_rate = error_rate
+        self.size = max(int(-self.capacity * math.log(error_rate) / math.log(2) ** 2), 64)
+        self.hashes = max(int(round(self.size / self.capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hashes)]
+
+    def add(self, key):
+        bits = self.bits
+        for position in self._positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        bits = self.bits
+        for position in self._positions(key):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class EncodedTagIndex:
+    def __init__(self, path='encoded_tags.db', capacity=1000000, error_rate=0.001):
+        self.path = path
+        self.bloom_path = path + '.bloom'
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS encoded_keys '
+            '(key TEXT PRIMARY KEY, epc TEXT, tid TEXT, source_epc TEXT, encoded_at REAL)')
+        self.conn.commit()
+        self.lookups = 0
+        self.bloom_hits = 0
+        self.false_positives = 0
+        self.count = self.conn.execute('SELECT COUNT(*) FROM encoded_keys').fetchone()[0]
+        self.bloom = self._load_bloom(max(int(capacity), self.count * 2))
+        if self.count > self.bloom.capacity:
+            self._rebuild(self.count * 2)
+
+    def _load_bloom(self, capacity):
+        """讀取存檔的 Bloom filter 並補上之後新增的列，無法使用時重建"""
+        last_rowid = 0
+        bloom = None
+        try:
+            with open(self.bloom_path, 'rb') as f:
+                magic, saved_capacity, size, hashes, last_rowid = BLOOM_HEADER.unpack(f.read(BLOOM_HEADER.size))
+                bits = f.read()
+            if magic == BLOOM_MAGIC and len(bits) == (size + 7) // 8:
+                bloom = BloomFilter.__new__(BloomFilter)
+                bloom.capacity = saved_capacity
+                bloom.error_rate = self.error_rate
+                bloom.size = size
+                bloom.hashes = hashes
+                bloom.bits = bytearray(bits)
+        except (OSError, struct.error):
+            bloom = None
+        max_rowid = self.conn.execute('SELECT COALESCE(MAX(rowid), 0) FROM encoded_keys').fetchone()[0]
+        if bloom is None or last_rowid > max_rowid:
+            # 沒有存檔，或存檔屬於已被刪除重建的資料庫
+            bloom = BloomFilter(capacity, self.error_rate)
+            last_rowid = 0
+        for (key,) in self.conn.execute('SELECT key FROM encoded_keys WHERE rowid > ?', (last_rowid,)):
+            bloom.add(key)
+        return bloom
+
+    def _rebuild(self, capacity):
+        bloom = BloomFilter(capacity, self.error_rate)
+        for (key,) in self.conn.execute('SELECT key FROM encoded_keys'):
+            bloom.add(key)
+        self.bloom = bloom
+
+    def _exists(self, key):
+        """Bloom filter 判定不存在直接傳回，可能存在時查資料庫（呼叫端需持有lock）"""
+        self.lookups += 1
+        if key not in self.bloom:
+            return False
+        self.bloom_hits += 1
+        found = self.conn.execute('SELECT 1 FROM encoded_keys WHERE key = ?', (key,)).fetchone() is not None
+        if not found:
+            self.false_positives += 1
+        return found
+
+    def contains(self, epc=None, tid=None):
+        """標籤是否已寫入過（以TID或目前的EPC判斷）"""
+        with self.lock:
+            if tid and self._exists(_key('T', tid)):
+                return True
+            return bool(epc) and self._exists(_key('E', epc))
+
+    def add(self, epc, tid=None, source_epc=None):
+        """記錄寫入完成的標籤，傳回是否為新紀錄"""
+        now = time.time()
+        keys = [_key('E', epc)]
+        if tid:
+            keys.append(_key('T', tid))
+        epc = epc.replace(' ', '').upper()
+        tid = tid.replace(' ', '').upper() if tid else None
+        source_epc = source_epc.replace(' ', '').upper() if source_epc else None
+        added = False
+        with self.lock:
+            with self.conn:
+                for key in keys:
+                    cursor = self.conn.execute(
+                        'INSERT OR IGNORE INTO encoded_keys VALUES (?, ?, ?, ?, ?)',
+                        (key, epc, tid, source_epc, now))
+                    if cursor.rowcount:
+                        self.bloom.add(key)
+                        self.count += 1
+                        added = True
+            if self.count > self.bloom.capacity:
+                self._rebuild(self.bloom.capacity * 2)
+        return added
+
+    def save(self):
+        """把 Bloom filter 存檔，下次啟動不必重建"""
+        with self.lock:
+            last_rowid = self.conn.execute('SELECT COALESCE(MAX(rowid), 0) FROM encoded_keys').fetchone()[0]
+            bloom = self.bloom
+            temp_path = self.bloom_path + '.tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(BLOOM_HEADER.pack(BLOOM_MAGIC, bloom.capacity, bloom.size, bloom.hashes, last_rowid))
+                f.write(bloom.bits)
+            os.replace(temp_path, self.bloom_path)
+
+    def close(self):
+        self.save()
+        with self.lock:
+            self.conn.close()
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'keys': self.count,
+            'capacity': self.bloom.capacity,
+            'bloom_bytes': len(self.bloom.bits),
+            'hashes': self.bloom.hashes,
+            'lookups': self.lookups,
+            'bloom_hits': self.bloom_hits,
+            'false_positives': self.false_positives
+        }
+
+    def __len__(self):
+        return self.count
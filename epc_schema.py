@@ -0,0 +1,212 @@
+"""EPC格式登錄與編解碼
+
+每種EPC格式只宣告一次欄位（名稱、十六進位位數、型態），登錄時編譯成
+以位移/遮罩直接取值的編碼與解碼函式；盤點時自動辨識格式。
+
+standard 與 legacy 同為12位元組、同樣以 00 開頭，標籤上沒有可區分的欄位，
+同一個EPC可能同時符合兩種格式（約四成的 legacy EPC 也符合 standard 的範圍檢查）。
+自動辨識只在恰好一種格式符合時傳回結果，符合多種時視為無法辨識並傳回None；
+已知格式的呼叫端以 schema 參數指定，只使用單一格式的站點可設定環境變數
+RFID_EPC_SCHEMA（例如 legacy），符合多種格式時採用該格式。
+
+內建格式：
+  standard: 00 + 4碼UUID + 13碼產品ID + 2碼年 + 1碼月 + 2碼日 (Backend.py / NewSingle.py)
+  legacy:   00 + 6碼標籤ID + 8碼產品ID + 2碼年 + 2碼月 + 2碼日 + 2碼狀態 (OldSingle.py / OldTest.py)
+"""
+import os
+from collections import namedtuple
+
+# kind: 'const' 固定值, 'hex' 十六進位字串, 'int' 整數, 'year' 2000 + 整數
+Field = namedtuple('Field', ['name', 'width', 'kind', 'value', 'valid'])
+
+
+def field(name, width, kind='hex', value=None, valid=None):
+    """宣告欄位，width 為十六進位位數，valid 為 (最小值, 最大值)"""
+    return Field(name, width, kind, value, valid)
+
+
+class EpcSchema:
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = list(fields)
+        self.width = sum(item.width for item in self.fields)
+        if self.width % 2:
+            raise ValueError(f"EPC格式 {name} 的總長度必須為整數位元組")
+        self.byte_length = self.width // 2
+        self.decode_int = self._compile_decoder()
+        self.decode_str = self._compile_str_decoder()
+        self.encode = self._compile_encoder()
+
+    def _layout(self):
+        """傳回 [(欄位, 位移, 遮罩)]，位移以整個EPC整數的最低位為0"""
+        layout = []
+        offset = self.width
+        for item in self.fields:
+            offset -= item.width
+            layout.append((item, offset * 4, (1 << (item.width * 4)) - 1))
+        return layout
+
+    def _compile_decoder(self):
+        lines = ["def decode(value):"]
+        result = [f"'schema': {self.name!r}"]
+        for item, shift, mask in self._layout():
+            expr = f"(value >> {shift}) & {mask:#x}" if shift else f"value & {mask:#x}"
+            if item.kind == 'const':
+                lines.append(f"    if {expr} != {item.value:#x}: return None")
+                continue
+            lines.append(f"    {item.name} = {expr}")
+            if item.valid:
+                low, high = item.valid
+                lines.append(f"    if not ({low} <= {item.name} <= {high}): return None")
+            if item.kind == 'hex':
+                result.append(f"{item.name!r}: f'{{{item.name}:0{item.width}X}}'")
+            elif item.kind == 'year':
+                result.append(f"{item.name!r}: 2000 + {item.name}")
+            else:
+                result.append(f"{item.name!r}: {item.name}")
+        lines.append("    return {" + ", ".join(result) + "}")
+        namespace = {}
+        exec("\n".join(lines), namespace)
+        return namespace['decode']
+
+    def _compile_str_decoder(self):
+        """十六進位字串輸入：字串欄位直接切片，數值欄位才轉換"""
+        lines = ["def decode(text):",
+                 f"    if len(text) != {self.width} or text.strip('0123456789ABCDEF'): return None"]
+        result = [f"'schema': {self.name!r}"]
+        start = 0
+        for item in self.fields:
+            end = start + item.width
+            if item.kind == 'const':
+                constant = f"{item.value:0{item.width}X}"
+                lines.append(f"    if text[{start}:{end}] != {constant!r}: return None")
+            elif item.kind == 'hex':
+                if item.valid:
+                    low, high = item.valid
+                    lines.append(f"    if not ({low} <= int(text[{start}:{end}], 16) <= {high}): return None")
+                result.append(f"{item.name!r}: text[{start}:{end}]")
+            else:
+                lines.append(f"    {item.name} = int(text[{start}:{end}], 16)")
+                if item.valid:
+                    low, high = item.valid
+                    lines.append(f"    if not ({low} <= {item.name} <= {high}): return None")
+                value = f"2000 + {item.name}" if item.kind == 'year' else item.name
+                result.append(f"{item.name!r}: {value}")
+            start = end
+        lines.append("    return {" + ", ".join(result) + "}")
+        namespace = {}
+        exec("\n".join(lines), namespace)
+        return namespace['decode']
+
+    def _compile_encoder(self):
+        names = [item.name for item in self.fields if item.kind != 'const']
+        lines = [f"def encode({', '.join(names)}):", "    value = 0"]
+        for item, shift, mask in self._layout():
+            if item.kind == 'const':
+                part = f"{item.value:#x}"
+            else:
+                if item.kind == 'hex':
+                    lines.append(f"    {item.name} = int({item.name}, 16)")
+                elif item.kind == 'year':
+                    lines.append(f"    {item.name} = int({item.name}) % 100")
+                else:
+                    lines.append(f"    {item.name} = int({item.name})")
+                low, high = item.valid if item.valid else (0, mask)
+                lines.append(f"    if not ({low} <= {item.name} <= {min(high, mask)}):")
+                lines.append(f"        raise ValueError('欄位 {item.name} 超出範圍')")
+                part = item.name
+            lines.append(f"    value |= {part} << {shift}" if shift else f"    value |= {part}")
+        lines.append(f"    return f'{{value:0{self.width}X}}'")
+        namespace = {}
+        exec("\n".join(lines), namespace)
+        return namespace['encode']
+
+    def decode(self, epc):
+        """解析EPC位元組，格式不符傳回None"""
+        if len(epc) != self.byte_length:
+            return None
+        return self.decode_int(int.from_bytes(epc, 'big'))
+
+
+class SchemaRegistry:
+    def __init__(self):
+        self.schemas = {}
+        self.by_length = {}
+        self.preferred = None
+
+    def register(self, name, fields):
+        schema = EpcSchema(name, fields)
+        self.schemas[name] = schema
+        self.by_length.setdefault(schema.byte_length, []).append(schema)
+        return schema
+
+    def get(self, name):
+        return self.schemas[name]
+
+    def prefer(self, name):
+        """EPC符合多種格式時採用的格式，None 表示視為無法辨識"""
+        if name is not None and name not in self.schemas:
+            raise ValueError(f"未登錄的EPC格式: {name}")
+        self.preferred = name
+
+    def _pick(self, matches):
+        if len(matches) == 1:
+            return matches[0]
+        for fields in matches:
+            if fields['schema'] == self.preferred:
+                return fields
+        return None
+
+    def decode_all(self, epc):
+        """以所有相同長度的格式解析EPC位元組，傳回每個符合格式的結果"""
+        candidates = self.by_length.get(len(epc))
+        if not candidates:
+            return []
+        value = int.from_bytes(epc, 'big')
+        return [fields for fields in (schema.decode_int(value) for schema in candidates)
+                if fields is not None]
+
+    def decode(self, epc, schema=None):
+        """解析EPC位元組；未指定 schema 時自動辨識，不符合或無法辨識時傳回None"""
+        if schema is not None:
+            return self.schemas[schema].decode(epc)
+        return self._pick(self.decode_all(epc))
+
+    def decode_hex(self, epc, schema=None):
+        """解析EPC十六進位字串，規則同 decode"""
+        epc = epc.upper()
+        if schema is not None:
+            return self.schemas[schema].decode_str(epc)
+        if len(epc) % 2:
+            return None
+        matches = [fields for fields in (item.decode_str(epc) for item in self.by_length.get(len(epc) // 2, ()))
+                   if fields is not None]
+        return self._pick(matches)
+
+    def encode(self, name, **values):
+        """以指定格式組合EPC，傳回十六進位字串"""
+        return self.schemas[name].encode(**values)
+
+
+registry = SchemaRegistry()
+
+registry.register('standard', [
+    field('prefix', 2, 'const', 0x00),
+    field('tag_id', 4),
+    field('product_id', 13),
+    field('year', 2, 'year', valid=(0, 99)),
+    field('month', 1, 'int', valid=(1, 12)),
+    field('day', 2, 'int', valid=(1, 31))
+])
+
+registry.register('legacy', [
+    field('prefix', 2, 'const', 0x00),
+    field('tag_id', 6),
+    field('product_id', 8),
+    field('year', 2, 'year', valid=(0, 99)),
+    field('month', 2, 'int', valid=(1, 12)),
+    field('day', 2, 'int', valid=(1, 31)),
+    field('status', 2, 'hex', valid=(1, 4))
+])
+
+registry.prefer(os.environ.get('RFID_EPC_SCHEMA') or None)
@@ -0,0 +1,259 @@
+"""在場標籤的編碼日期索引與過期警示
+
+EPC內含生產日期，這裡以 (日期, EPC) 排序保存目前在場的標籤（全部及各區域各一份），
+「區域Z內超過N天的標籤」只需由最舊的開始掃描到截止日期，不必掃描整個資料表：
+- 以 InventoryTable listener 接收讀取；區域預設為讀寫器名稱，啟用多讀寫器融合時
+  以融合判定的區域為準
+- 超過 depart_after 秒沒有讀到的標籤視為已離開，由最久未讀到的開始移除
+- 警示規則 (名稱, 天數, 區域)：標籤進入區域時已超過天數、或在場期間跨日後超過天數時
+  送出一次事件；離開區域後再進入會再次警示
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+
+from tag_query import SortedKeys, date_key
+
+
+def _to_date(value):
+    try:
+        return date(value // 10000, value // 100 % 100, value % 100)
+    except ValueError:
+        return None
+
+
+def _to_key(day):
+    return day.year * 10000 + day.month * 100 + day.day
+
+
+def format_date(value):
+    return f"{value // 10000:04d}-{value // 100 % 100:02d}-{value % 100:02d}"
+
+
+class ExpiryIndex:
+    def __init__(self, depart_after=300.0, on_event=None, load=512):
+        self.depart_after = depart_after
+        self.on_event = on_event
+        self.load = load
+        self.lock = threading.Lock()
+        self.rules = {}
+        self.thread = None
+        self.running = False
+        self.alerts = 0
+        self.departed = 0
+        self._reset()
+
+    def _reset(self):
+        # epc -> [日期, 區域, 最後讀取時間, 區域是否由融合判定]，依最後讀取時間排序
+        self.tags = OrderedDict()
+        self.by_date = SortedKeys(self.load)
+        self.by_zone = {}
+        for rule in self.rules.values():
+            rule['alerted'] = set()
+
+    def clear(self):
+        with self.lock:
+            self._reset()
+
+    def _zone_keys(self, zone):
+        keys = self.by_zone.get(zone)
+        if keys is None:
+            keys = self.by_zone[zone] = SortedKeys(self.load)
+        return keys
+
+    def _enter_zone(self, epc, state, zone, events, new=False):
+        """標籤移到新區域（或第一次出現），更新區域索引並檢查警示規則（呼叫端需持有lock）"""
+        day = state[0]
+        old_zone = state[1]
+        if old_zone == zone and not new:
+            return
+        if old_zone is not None and not new:
+            keys = self.by_zone[old_zone]
+            keys.discard((day, epc))
+            if not keys:
+                del self.by_zone[old_zone]
+            for rule in self.rules.values():
+                if rule['zone'] == old_zone:
+                    rule['alerted'].discard(epc)
+        state[1] = zone
+        if zone is not None:
+            self._zone_keys(zone).add((day, epc))
+        for rule in self.rules.values():
+            if (rule['zone'] is None or rule['zone'] == zone) and day < rule['cutoff']:
+                self._alert(rule, epc, state, events)
+
+    def _alert(self, rule, epc, state, events):
+        if epc in rule['alerted']:
+            return
+        rule['alerted'].add(epc)
+        self.alerts += 1
+        tag_date = _to_date(state[0])
+        events.append({
+            'type': 'expiry',
+            'ts': state[2],
+            'rule': rule['name'],
+            'epc': epc,
+            'zone': state[1],
+            'date': format_date(state[0]),
+            'age_days': (date.today() - tag_date).days if tag_date else None
+        })
+
+    def _emit(self, events):
+        if self.on_event:
+            for event in events:
+                self.on_event(event)
+
+    def observe(self, epc, day, ts, zone=None, fused=False):
+        """加入一筆讀取；day 為 YYYYMMDD 整數，fused 表示區域由融合判定"""
+        events = []
+        with self.lock:
+            state = self.tags.get(epc)
+            if state is None:
+                state = self.tags[epc] = [day, None, ts, fused]
+                self.by_date.add((day, epc))
+                self._enter_zone(epc, state, zone, events, new=True)
+            else:
+                self.tags.move_to_end(epc)
+                state[2] = max(state[2], ts)
+                # 融合判定的區域優先於讀寫器名稱
+                if zone is not None and (fused or not state[3]):
+                    state[3] = state[3] or fused
+                    self._enter_zone(epc, state, zone, events)
+        self._emit(events)
+
+    def on_inventory(self, record, is_new):
+        """InventoryTable listener，無法解析日期的標籤不列入"""
+        day = date_key(record)
+        if day is not None:
+            self.observe(record['epc'], day, record['last_seen'], record.get('reader'))
+
+    def on_zone_event(self, event):
+        """多讀寫器融合的區域事件"""
+        with self.lock:
+            state = self.tags.get(event['epc'])
+            day = state[0] if state else None
+        if day is not None:
+            self.observe(event['epc'], day, event['ts'], event['zone'], fused=True)
+
+    def _depart(self, now):
+        """移除超過 depart_after 秒沒有讀到的標籤（呼叫端需持有lock）"""
+        tags = self.tags
+        while tags:
+            epc, state = next(iter(tags.items()))
+            if now - state[2] <= self.depart_after:
+                break
+            del tags[epc]
+            self.by_date.discard((state[0], epc))
+            keys = self.by_zone.get(state[1])
+            if keys is not None:
+                keys.discard((state[0], epc))
+                if not keys:
+                    del self.by_zone[state[1]]
+            for rule in self.rules.values():
+                rule['alerted'].discard(epc)
+            self.departed += 1
+
+    def _advance_cutoffs(self, events):
+        """跨日後把新超過天數的標籤送出警示（呼叫端需持有lock）"""
+        today = date.today()
+        for rule in self.rules.values():
+            cutoff = _to_key(today - timedelta(days=rule['days']))
+            if cutoff <= rule['cutoff']:
+                continue
+            keys = self.by_date if rule['zone'] is None else self.by_zone.get(rule['zone'])
+            previous = rule['cutoff']
+            rule['cutoff'] = cutoff
+            if keys is None:
+                continue
+            for day, epc in keys.iter_from((previous,)):
+                if day >= cutoff:
+                    break
+                self._alert(rule, epc, self.tags[epc], events)
+
+    def sweep(self, now=None):
+        now = time.time() if now is None else now
+        events = []
+        with self.lock:
+            self._depart(now)
+            self._advance_cutoffs(events)
+        self._emit(events)
+
+    def add_rule(self, name, days, zone=None):
+        """加入警示規則，目前已符合條件的標籤立即送出警示"""
+        days = int(days)
+        if days < 0:
+            raise ValueError("天數不可為負數")
+        with self.lock:
+            # cutoff 由 0 開始，下面的 _advance_cutoffs 會掃描所有已超過天數的標籤
+            self.rules[name] = {'name': name, 'days': days, 'zone': zone, 'cutoff': 0, 'alerted': set()}
+        self.sweep()
+        self.start()
+
+    def remove_rule(self, name):
+        with self.lock:
+            return self.rules.pop(name, None) is not None
+
+    def list_rules(self):
+        with self.lock:
+            return [{'name': rule['name'], 'days': rule['days'], 'zone': rule['zone'],
+                     'alerted': len(rule['alerted'])} for rule in self.rules.values()]
+
+    def older_than(self, days, zone=None, limit=1000, today=None):
+        """在場且超過 days 天的標籤，由最舊的開始，傳回 (總數, 列表)"""
+        self.sweep()
+        today = today or date.today()
+        cutoff = _to_key(today - timedelta(days=int(days)))
+        result = []
+        count = 0
+        with self.lock:
+            keys = self.by_date if zone is None else self.by_zone.get(zone)
+            if keys is None:
+                return 0, []
+            for day, epc in keys.iter_from():
+                if day >= cutoff:
+                    break
+                count += 1
+                if len(result) < limit:
+                    state = self.tags[epc]
+                    tag_date = _to_date(day)
+                    result.append({
+                        'epc': epc,
+                        'date': format_date(day),
+                        'age_days': (today - tag_date).days if tag_date else None,
+                        'zone': state[1],
+                        'last_seen': state[2]
+                    })
+        return count, result
+
+    def start(self, interval=60.0):
+        """啟動背景執行緒定期移除離開的標籤並檢查跨日警示"""
+        if self.running:
+            return
+        self.running = True
+
+        def loop():
+            while self.running:
+                time.sleep(interval)
+                self.sweep()
+
+        self.thread = threading.Thread(target=loop, name='expiry-index', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=1)
+            self.thread = None
+
+    def stats(self):
+        with self.lock:
+            oldest = next(self.by_date.iter_from(), None)
+            return {
+                'tags': len(self.tags),
+                'zones': {zone: len(keys) for zone, keys in self.by_zone.items()},
+                'oldest': format_date(oldest[0]) if oldest else None,
+                'rules': len(self.rules),
+                'alerts': self.alerts,
+                'departed': self.departed
+            }
@@ -0,0 +1,47 @@
+"""十六進位與EPC位元組轉換
+
+原本各檔案各自以逐位元組 f-string 組字串（bytes_to_hex_string），
+解析時再切十六進位子字串、int(..., 16) 轉回數值。這裡統一改用
+bytes.hex() 與 memoryview 切片（不複製），欄位直接由位元組的整數位元取出。
+"""
+from epc_schema import registry as epc_schemas
+
+EPC_LENGTH = 12
+
+
+def to_hex(data):
+    """位元組轉大寫十六進位字串，例如 BB0222"""
+    return data.hex().upper()
+
+
+def to_spaced_hex(data, upper=True):
+    """位元組轉以空白分隔的十六進位字串，例如 BB 02 22"""
+    text = data.hex(' ')
+    return text.upper() if upper else text
+
+
+def strip_pc(data):
+    """去掉讀取回應開頭的 00 00（PC低位元組與EPC前綴），傳回 memoryview 不複製資料"""
+    view = memoryview(data)
+    return view[2:] if view[:2] == b'\x00\x00' else view
+
+
+def decode_reply(data):
+    """解析讀取回應 data[7:21]（PC低位元組 + EPC + CRC高位元組）的EPC欄位
+
+    去掉前導 00 00 後取11個位元組、補回00前綴即為12位元組EPC，欄位由整數位元直接取出；
+    長度不足或格式不符傳回None，raw_data 為去掉前導 00 00 後的十六進位字串
+    """
+    actual = strip_pc(data)
+    if len(actual) < EPC_LENGTH - 1:
+        return None
+    fields = epc_schemas.decode(b'\x00' + actual[:EPC_LENGTH - 1])
+    if fields is None:
+        return None
+    fields['raw_data'] = to_hex(actual)
+    return fields
+
+
+def byte_date(data, offset):
+    """年/月/日各佔一個位元組（OldSingle / OldTest 格式），傳回 (西元年, 月, 日)"""
+    return 2000 + data[offset], data[offset + 1], data[offset + 2]
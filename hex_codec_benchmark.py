@@ -0,0 +1,102 @@
+"""hex_codec 效能比較
+
+以相同的讀取回應資料比較舊寫法（逐位元組 f-string 組字串、十六進位子字串解析）
+與 hex_codec（bytes.hex / memoryview、由位元組直接取欄位）的耗時。
+
+    python hex_codec_benchmark.py --count 1000000
+"""
+import argparse
+import random
+import sys
+import time
+
+import hex_codec
+from epc_schema import registry as epc_schemas
+
+
+def legacy_hex(data):
+    return ''.join([f"{b:02X}" for b in data])
+
+
+def legacy_spaced_hex(data):
+    return ' '.join([hex(x)[2:].zfill(2) for x in data])
+
+
+def legacy_decode(epc_data):
+    """原 Backend.parse_epc_data：十六進位子字串切出欄位再以 int(..., 16) 轉換"""
+    hex_str = legacy_hex(epc_data)
+    actual_data = hex_str[4:] if hex_str.startswith('0000') else hex_str
+    if len(actual_data) < 22:
+        return None
+    return {
+        'tag_id': actual_data[0:4],
+        'product_id': actual_data[4:17],
+        'year': 2000 + int(actual_data[17:19], 16),
+        'month': int(actual_data[19:20], 16),
+        'day': int(actual_data[20:22], 16),
+        'raw_data': actual_data
+    }
+
+
+def legacy_byte_date(epc_data):
+    epc_str = legacy_spaced_hex(epc_data).replace(' ', '')
+    return 2000 + int(epc_str[18:20], 16), int(epc_str[20:22], 16), int(epc_str[22:24], 16)
+
+
+def make_replies(count, seed):
+    """產生讀取回應 data[7:21]: PC低位元組(00) + 標準格式EPC + CRC高位元組"""
+    rng = random.Random(seed)
+    replies = []
+    for _ in range(count):
+        epc = epc_schemas.encode('standard', tag_id=f"{rng.getrandbits(16):04X}",
+                                 product_id=f"{rng.getrandbits(52):013X}",
+                                 year=rng.randint(2020, 2030), month=rng.randint(1, 12),
+                                 day=rng.randint(1, 28))
+        replies.append(b'\x00' + bytes.fromhex(epc) + bytes([rng.getrandbits(8)]))
+    return replies
+
+
+def timed(label, func, items):
+    started = time.perf_counter()
+    for item in items:
+        func(item)
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<24}{elapsed:>8.3f}s  {len(items) / elapsed / 1e6:>6.2f} M/s")
+    return elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="hex_codec 效能比較")
+    parser.add_argument('--count', type=int, default=1000000, help="標籤數量")
+    parser.add_argument('--seed', type=int, default=1, help="亂數種子")
+    args = parser.parse_args(argv)
+
+    replies = make_replies(args.count, args.seed)
+    # 確認兩種寫法結果一致
+    for reply in replies[:1000]:
+        decoded = hex_codec.decode_reply(reply)
+        decoded.pop('schema', None)
+        if legacy_decode(reply) != decoded:
+            print(f"解析結果不一致: {reply.hex()}")
+            return 1
+        if legacy_spaced_hex(reply) != hex_codec.to_spaced_hex(reply, upper=False):
+            print(f"十六進位字串不一致: {reply.hex()}")
+            return 1
+
+    cases = [
+        ("十六進位字串", legacy_hex, hex_codec.to_hex),
+        ("空白分隔字串", legacy_spaced_hex, lambda data: hex_codec.to_spaced_hex(data, upper=False)),
+        ("EPC欄位解析", legacy_decode, hex_codec.decode_reply),
+        ("日期欄位", legacy_byte_date, lambda data: hex_codec.byte_date(data, 9))
+    ]
+    print(f"{args.count} 筆讀取回應")
+    for name, legacy, current in cases:
+        print(name)
+        before = timed("舊寫法", legacy, replies)
+        after = timed("hex_codec", current, replies)
+        print(f"  加速 {before / after:.1f} 倍")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
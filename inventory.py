@@ -0,0 +1,110 @@
+"""盤點標籤資料表
+
+以EPC為鍵保存目前在場標籤的最新狀態，單讀寫器掃描與多行程管線都合併到這裡。
+其他模組可透過 add_listener 取得每次更新 (record, is_new)。
+"""
+import threading
+
+from epc_schema import registry as epc_schemas
+
+
+def decode_epc(epc):
+    """依登錄的EPC格式自動辨識並解析EPC十六進位字串，格式不符傳回None"""
+    # 含PC低位元組（0000開頭）時去掉第一個位元組
+    if len(epc) >= 26 and epc.startswith('0000'):
+        epc = epc[2:26]
+    return epc_schemas.decode_hex(epc)
+
+
+class InventoryTable:
+    def __init__(self):
+        self.tags = {}
+        self.lock = threading.Lock()
+        self.listeners = []
+
+    def add_listener(self, listener):
+        """註冊更新通知 listener(record, is_new)"""
+        self.listeners = self.listeners + [listener]
+
+    def remove_listener(self, listener):
+        self.listeners = [item for item in self.listeners if item is not listener]
+
+    def subscribe(self, listener):
+        """註冊 listener 並傳回當下盤點表的複本；之後的更新才會通知 listener，不會與複本重複"""
+        with self.lock:
+            self.listeners = self.listeners + [listener]
+            return [dict(record) for record in self.tags.values()]
+
+    def _merge(self, epc, count, first_seen, last_seen, rssi, reader, antenna, fields):
+        record = self.tags.get(epc)
+        is_new = record is None
+        if is_new:
+            record = {
+                'epc': epc,
+                'first_seen': first_seen,
+                'last_seen': last_seen,
+                'count': count,
+                'rssi': rssi,
+                'reader': reader,
+                'antenna': antenna
+            }
+            if fields is None:
+                fields = decode_epc(epc)
+            if fields:
+                record.update(fields)
+            self.tags[epc] = record
+        else:
+            record['count'] += count
+            if last_seen >= record['last_seen']:
+                record['last_seen'] = last_seen
+                record['rssi'] = rssi
+                record['reader'] = reader
+                record['antenna'] = antenna
+        return record, is_new
+
+    def update(self, epc, ts, rssi=None, reader='', antenna=1, fields=None):
+        """加入單次讀取"""
+        with self.lock:
+            record, is_new = self._merge(epc, 1, ts, ts, rssi, reader, antenna, fields)
+            listeners = self.listeners
+        for listener in listeners:
+            listener(record, is_new)
+        return record
+
+    def merge_batch(self, entries):
+        """合併已彙總的讀取 [(epc, count, first_seen, last_seen, rssi, reader, antenna, fields)]"""
+        updated = []
+        with self.lock:
+            for entry in entries:
+                updated.append(self._merge(*entry))
+            listeners = self.listeners
+        for record, is_new in updated:
+            for listener in listeners:
+                listener(record, is_new)
+        return len(updated)
+
+    def annotate(self, epc, **values):
+        """為已在表中的標籤附加資料（例如TID），標籤不存在傳回None"""
+        with self.lock:
+            record = self.tags.get(epc)
+            if record is not None:
+                record.update(values)
+            return record
+
+    def remove(self, epc):
+        with self.lock:
+            return self.tags.pop(epc, None)
+
+    def clear(self, on_clear=None):
+        """清除盤點表；on_clear 在持有鎖時呼叫，用來同時重設依盤點表累計的狀態"""
+        with self.lock:
+            self.tags = {}
+            if on_clear is not None:
+                on_clear()
+
+    def snapshot(self):
+        with self.lock:
+            return [dict(record) for record in self.tags.values()]
+
+    def __len__(self):
+        return len(self.tags)
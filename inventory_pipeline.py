@@ -0,0 +1,274 @@
+"""多行程盤點管線
+
+串口I/O執行緒只負責把原始資料寫入共享記憶體環形緩衝區（每台讀寫器一個），
+由多個工作行程解碼封包、解析EPC並在本地彙總，再把彙總結果送回主行程合併到盤點資料表。
+解碼與解析不再佔用主行程的GIL，吞吐量可隨CPU核心數增加。
+"""
+import multiprocessing
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+from queue import Empty
+
+import rfid_protocol as proto
+import hex_codec
+from inventory import decode_epc
+from read_scheduler import ReadScheduler
+
+# 環形緩衝區標頭: head(uint64) + tail(uint64) + 容量(uint64)
+RING_HEADER = struct.Struct('<QQQ')
+# 每筆記錄: 資料長度(uint32) + 時間戳(float64)
+RECORD_HEADER = struct.Struct('<Id')
+WRAP_MARKER = 0xFFFFFFFF
+
+# 開始連續盤點命令（與 OldBackend.start_inventory 相同）
+START_INVENTORY = proto.build_frame(proto.CMD_MULTI_POLL, [0x22, 0x27, 0x10])
+STOP_INVENTORY = proto.build_frame(proto.CMD_STOP_POLL)
+
+
+class SharedRing:
+    """單一生產者/單一消費者的共享記憶體環形緩衝區
+
+    head 只由生產者更新，tail 只由消費者更新，因此不需要跨行程的鎖。
+    """
+
+    def __init__(self, name=None, capacity=1 << 20, create=True):
+        if create:
+            self.shm = shared_memory.SharedMemory(create=True, size=RING_HEADER.size + capacity)
+            RING_HEADER.pack_into(self.shm.buf, 0, 0, 0, capacity)
+        else:
+            # 工作行程由主行程以spawn啟動，共用同一個資源追蹤器，只有建立者會unlink
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.owner = create
+        self.capacity = RING_HEADER.unpack_from(self.shm.buf, 0)[2]
+        self.data = self.shm.buf[RING_HEADER.size:RING_HEADER.size + self.capacity]
+        self.dropped = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def _positions(self):
+        head, tail, _ = RING_HEADER.unpack_from(self.shm.buf, 0)
+        return head, tail
+
+    def write(self, ts, payload):
+        """寫入一筆資料，空間不足時丟棄並傳回False"""
+        need = RECORD_HEADER.size + len(payload)
+        head, tail = self._positions()
+        index = head % self.capacity
+        remaining = self.capacity - index
+        # 放不下時跳到緩衝區開頭，剩餘空間也算在使用量內
+        skip = remaining if remaining < need else 0
+        if need + skip > self.capacity - (head - tail):
+            self.dropped += 1
+            return False
+        if skip:
+            if remaining >= RECORD_HEADER.size:
+                RECORD_HEADER.pack_into(self.data, index, WRAP_MARKER, 0.0)
+            head += skip
+            index = 0
+        RECORD_HEADER.pack_into(self.data, index, len(payload), ts)
+        start = index + RECORD_HEADER.size
+        self.data[start:start + len(payload)] = payload
+        struct.pack_into('<Q', self.shm.buf, 0, head + need)
+        return True
+
+    def read_all(self):
+        """取出目前所有資料 [(時間戳, bytes)]"""
+        head, tail = self._positions()
+        records = []
+        while tail < head:
+            index = tail % self.capacity
+            remaining = self.capacity - index
+            if remaining < RECORD_HEADER.size:
+                tail += remaining
+                continue
+            length, ts = RECORD_HEADER.unpack_from(self.data, index)
+            if length == WRAP_MARKER:
+                tail += remaining
+                continue
+            start = index + RECORD_HEADER.size
+            records.append((ts, bytes(self.data[start:start + length])))
+            tail += RECORD_HEADER.size + length
+        struct.pack_into('<Q', self.shm.buf, 8, tail)
+        return records
+
+    def close(self):
+        self.data.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def worker_main(ring_specs, result_queue, stop_event, flush_interval):
+    """工作行程：解碼並彙總所負責的環形緩衝區
+
+    ring_specs: [(共享記憶體名稱, 讀寫器名稱)]
+    """
+    rings = [(SharedRing(name, create=False), reader) for name, reader in ring_specs]
+    decoders = [proto.FrameDecoder() for _ in rings]
+    fields_cache = {}
+    pending = {}
+    frames = 0
+    last_flush = time.monotonic()
+    idle_sleep = 0.001
+
+    def flush():
+        if pending:
+            result_queue.put(list(pending.values()))
+            pending.clear()
+
+    try:
+        while not stop_event.is_set():
+            got_data = False
+            for (ring, reader), decoder in zip(rings, decoders):
+                for ts, data in ring.read_all():
+                    got_data = True
+                    for frame in decoder.feed(data):
+                        if frame.type != proto.TYPE_NOTICE or frame.command != proto.CMD_SINGLE_POLL:
+                            continue
+                        frames += 1
+                        notice = proto.parse_poll_notice(frame)
+                        epc = hex_codec.to_hex(notice['epc'])
+                        fields = fields_cache.get(epc)
+                        if fields is None and epc not in fields_cache:
+                            fields = decode_epc(epc)
+                            fields_cache[epc] = fields
+                        key = (epc, reader)
+                        entry = pending.get(key)
+                        if entry is None:
+                            # (epc, count, first_seen, last_seen, rssi, reader, antenna, fields)
+                            pending[key] = [epc, 1, ts, ts, notice['rssi'], reader, 1, fields]
+                        else:
+                            entry[1] += 1
+                            entry[3] = ts
+                            entry[4] = notice['rssi']
+            now = time.monotonic()
+            if now - last_flush >= flush_interval:
+                flush()
+                last_flush = now
+            if got_data:
+                idle_sleep = 0.001
+            else:
+                time.sleep(idle_sleep)
+                idle_sleep = min(idle_sleep * 2, flush_interval)
+        flush()
+    finally:
+        for ring, _ in rings:
+            ring.close()
+
+
+class InventoryPipeline:
+    """多讀寫器、多行程的盤點管線"""
+
+    def __init__(self, table, ports, workers=None, baudrate=115200,
+                 ring_capacity=1 << 20, flush_interval=0.05, on_merge=None,
+                 baudrates=None, serial_factory=None):
+        """baudrates: 各串口的鮑率（未列出的使用 baudrate）；serial_factory 預設為 serial.Serial"""
+        self.table = table
+        self.ports = list(ports)
+        self.workers = max(1, min(workers or multiprocessing.cpu_count(), len(self.ports)))
+        self.baudrate = baudrate
+        self.baudrates = dict(baudrates or {})
+        self.serial_factory = serial_factory
+        self.ring_capacity = ring_capacity
+        self.flush_interval = flush_interval
+        self.on_merge = on_merge
+        self.rings = []
+        self.serials = []
+        self.io_threads = []
+        self.processes = []
+        self.running = False
+        self.merged_batches = 0
+        self.merged_entries = 0
+        self.io_errors = {}
+
+    def start(self):
+        import serial
+
+        serial_factory = self.serial_factory or serial.Serial
+        ctx = multiprocessing.get_context('spawn')
+        self.result_queue = ctx.Queue()
+        self.stop_event = ctx.Event()
+        self.running = True
+
+        for port in self.ports:
+            self.rings.append(SharedRing(capacity=self.ring_capacity))
+            self.serials.append(serial_factory(port, self.baudrates.get(port, self.baudrate), timeout=0.1))
+
+        # 環形緩衝區平均分配給工作行程，每個緩衝區只有一個消費者
+        for worker_index in range(self.workers):
+            specs = [(ring.name, port) for i, (ring, port) in enumerate(zip(self.rings, self.ports))
+                     if i % self.workers == worker_index]
+            process = ctx.Process(target=worker_main,
+                                  args=(specs, self.result_queue, self.stop_event, self.flush_interval),
+                                  daemon=True)
+            process.start()
+            self.processes.append(process)
+
+        for port, ser, ring in zip(self.ports, self.serials, self.rings):
+            thread = threading.Thread(target=self._io_loop, args=(port, ser, ring), daemon=True)
+            thread.start()
+            self.io_threads.append(thread)
+
+        self.merge_thread = threading.Thread(target=self._merge_loop, daemon=True)
+        self.merge_thread.start()
+
+    def _io_loop(self, port, ser, ring):
+        """串口I/O執行緒：只搬移原始位元組"""
+        scheduler = ReadScheduler(ser)
+        try:
+            ser.write(START_INVENTORY)
+            while self.running:
+                data = scheduler.read_available()
+                if data:
+                    ring.write(time.time(), data)
+        except Exception as e:
+            self.io_errors[port] = str(e)
+        finally:
+            try:
+                ser.write(STOP_INVENTORY)
+            except Exception:
+                pass
+
+    def _merge_loop(self):
+        """主行程：合併工作行程送回的彙總結果"""
+        while self.running or not self.result_queue.empty():
+            try:
+                entries = self.result_queue.get(timeout=0.2)
+            except Empty:
+                continue
+            self.table.merge_batch(entries)
+            self.merged_batches += 1
+            self.merged_entries += len(entries)
+            if self.on_merge:
+                self.on_merge(entries)
+
+    def stop(self):
+        self.running = False
+        for thread in self.io_threads:
+            thread.join(timeout=1)
+        self.stop_event.set()
+        for process in self.processes:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+        self.merge_thread.join(timeout=2)
+        for ser in self.serials:
+            ser.close()
+        for ring in self.rings:
+            ring.close()
+
+    def stats(self):
+        return {
+            'running': self.running,
+            'ports': self.ports,
+            'workers': self.workers,
+            'merged_batches': self.merged_batches,
+            'merged_entries': self.merged_entries,
+            'tags': len(self.table),
+            'ring_dropped': {port: ring.dropped for port, ring in zip(self.ports, self.rings)},
+            'io_errors': dict(self.io_errors)
+        }
@@ -0,0 +1,229 @@
+"""讀寫器鮑率偵測與協商
+
+同一系列讀寫器在 Backend.py 使用 115200、OldBackend.py 使用 9600，
+9600 時一筆24位元組的盤點通知約需25ms，盤點上限約每秒40張。
+
+probe_baudrate   依序嘗試候選鮑率，送出查詢硬體版本命令，收到合法回應即為目前鮑率
+measure_link     連續送出查詢命令，統計回應率、校驗錯誤與延遲
+negotiate        由高到低嘗試切換鮑率，連線品質不穩定時切回原鮑率
+
+結果依串口保存在 reader_links.json，兩個後端啟動時以保存的鮑率連線。
+
+    python link_probe.py COM4              偵測目前鮑率
+    python link_probe.py COM4 --switch     切換到最高的穩定鮑率
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import serial
+
+import rfid_protocol as proto
+
+CANDIDATE_BAUDRATES = (115200, 57600, 38400, 19200, 9600)
+DEFAULT_PROFILE_PATH = 'reader_links.json'
+
+
+class LinkProfileStore:
+    """每台讀寫器（以串口區分）的鮑率與最近一次量測結果"""
+
+    def __init__(self, path=DEFAULT_PROFILE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.profiles = {}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    self.profiles = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"讀取連線設定錯誤: {str(e)}")
+
+    def baudrate(self, port, default):
+        profile = self.profiles.get(port)
+        return profile['baudrate'] if profile else default
+
+    def get(self, port):
+        return self.profiles.get(port)
+
+    def save(self, port, baudrate, stats=None):
+        with self.lock:
+            self.profiles[port] = {
+                'baudrate': baudrate,
+                'checked': time.time(),
+                'stats': stats
+            }
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.profiles, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, self.path)
+        return self.profiles[port]
+
+
+profiles = LinkProfileStore()
+
+
+def _frame_time(baudrate, size):
+    """傳送 size 位元組所需時間（10 bits/byte）"""
+    return size * 10 / baudrate
+
+
+def _request(ser, frame, decoder, command, timeout):
+    """送出命令並等待對應回應，傳回回應封包或None"""
+    ser.write(frame)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        data = ser.read(ser.in_waiting or 1)
+        if not data:
+            continue
+        for item in decoder.feed(data):
+            if item.type == proto.TYPE_RESPONSE and item.command in (command, proto.CMD_ERROR):
+                return item
+    return None
+
+
+def _open(port, baudrate, serial_factory):
+    ser = serial_factory(port, baudrate, timeout=0.05)
+    ser.reset_input_buffer()
+    return ser
+
+
+def probe_baudrate(port, candidates=CANDIDATE_BAUDRATES, serial_factory=None, first=None):
+    """偵測讀寫器目前的鮑率，找不到傳回None；first 為優先嘗試的鮑率（例如上次保存的值）"""
+    serial_factory = serial_factory or serial.Serial
+    order = list(candidates)
+    if first in order:
+        order.remove(first)
+        order.insert(0, first)
+    frame = proto.build_get_info()
+    for baudrate in order:
+        try:
+            ser = _open(port, baudrate, serial_factory)
+        except (serial.SerialException, OSError) as e:
+            print(f"開啟 {port} 失敗: {str(e)}")
+            return None
+        try:
+            # 鮑率不符時收到的是亂碼，校驗和不會通過
+            for _ in range(2):
+                response = _request(ser, frame, proto.FrameDecoder(), proto.CMD_GET_INFO,
+                                    0.1 + _frame_time(baudrate, 64))
+                if response is not None:
+                    return baudrate
+        finally:
+            ser.close()
+    return None
+
+
+def measure_link(ser, baudrate, count=50):
+    """連續送出查詢命令量測連線品質"""
+    decoder = proto.FrameDecoder()
+    frame = proto.build_get_info()
+    timeout = 0.1 + _frame_time(baudrate, 64)
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        if _request(ser, frame, decoder, proto.CMD_GET_INFO, timeout) is not None:
+            latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return {
+        'baudrate': baudrate,
+        'requests': count,
+        'responses': len(latencies),
+        'checksum_errors': decoder.checksum_errors,
+        'dropped_bytes': decoder.dropped_bytes,
+        'latency_ms': round(latencies[len(latencies) // 2] * 1000, 2) if latencies else None,
+        'max_latency_ms': round(latencies[-1] * 1000, 2) if latencies else None,
+        'notify_capacity': int(baudrate / (24 * 10))
+    }
+
+
+def is_stable(stats):
+    """全部有回應且沒有校驗錯誤、丟棄位元組才視為穩定"""
+    return (stats['responses'] == stats['requests']
+            and stats['checksum_errors'] == 0
+            and stats['dropped_bytes'] == 0)
+
+
+def _switch(port, current, target, serial_factory):
+    """以目前鮑率送出切換命令，傳回以新鮑率開啟的串口或None"""
+    ser = _open(port, current, serial_factory)
+    try:
+        ser.write(proto.build_set_baudrate(target))
+        ser.flush()
+        # 等待命令送完再切換本機鮑率
+        time.sleep(_frame_time(current, 16) + 0.05)
+    finally:
+        ser.close()
+    try:
+        return _open(port, target, serial_factory)
+    except (serial.SerialException, OSError):
+        return None
+
+
+def negotiate(port, candidates=CANDIDATE_BAUDRATES, count=50, switch=True,
+              serial_factory=None, store=None):
+    """偵測目前鮑率並視需要切換到最高的穩定鮑率，結果寫入 store"""
+    serial_factory = serial_factory or serial.Serial
+    store = store or profiles
+    saved = store.get(port)
+    current = probe_baudrate(port, candidates, serial_factory,
+                             first=saved['baudrate'] if saved else None)
+    if current is None:
+        return {'success': False, 'message': f"{port} 無法偵測讀寫器鮑率"}
+
+    ser = _open(port, current, serial_factory)
+    try:
+        stats = measure_link(ser, current, count)
+    finally:
+        ser.close()
+    best, best_stats = current, stats
+
+    if switch:
+        for target in sorted(candidates, reverse=True):
+            if target <= current:
+                break
+            ser = _switch(port, current, target, serial_factory)
+            trial = None
+            if ser is not None:
+                try:
+                    trial = measure_link(ser, target, count)
+                finally:
+                    ser.close()
+            if trial is not None and is_stable(trial):
+                best, best_stats = target, trial
+                break
+            # 新鮑率不穩定，以新鮑率送出切回原鮑率的命令後重新偵測；
+            # 讀寫器若未切換，這個命令在原鮑率下只是無效資料
+            ser = _switch(port, target, current, serial_factory)
+            if ser is not None:
+                ser.close()
+            detected = probe_baudrate(port, candidates, serial_factory, first=current)
+            if detected != current:
+                return {'success': False,
+                        'message': f"{port} 切換鮑率失敗，目前偵測為 {detected}",
+                        'data': trial}
+
+    store.save(port, best, best_stats)
+    return {'success': True,
+            'message': f"{port} 使用鮑率 {best}",
+            'data': best_stats}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="讀寫器鮑率偵測與協商")
+    parser.add_argument('port', help="串口名稱，例如 COM4 或 /dev/ttyUSB0")
+    parser.add_argument('--switch', action='store_true', help="切換到最高的穩定鮑率")
+    parser.add_argument('--count', type=int, default=50, help="量測連線品質的命令次數")
+    parser.add_argument('--baudrates', type=int, nargs='+', default=list(CANDIDATE_BAUDRATES),
+                        help="候選鮑率")
+    args = parser.parse_args(argv)
+
+    result = negotiate(args.port, args.baudrates, args.count, args.switch)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0 if result['success'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,372 @@
+"""HTTP API 壓力測試
+
+以多個並行客戶端依比例呼叫 API，回報吞吐量、延遲百分位數、錯誤率與串口競爭。
+
+未指定 --url 時在同一行程內以模擬讀寫器（RFID_SIMULATE）啟動指定的後端，
+並量測 RFIDController.lock 的等待時間與模擬讀寫器的命令佇列深度；
+指定 --url 時只量測 HTTP 層，結束時讀取健康狀態端點取得串口狀態。
+
+    python load_test.py --app backend --clients 200 --duration 30
+    python load_test.py --app oldbackend --mix inventory_data=8,inventory_start=1,inventory_stop=1
+    python load_test.py --app backend --url http://127.0.0.1:5000 --max-p99-ms 500
+
+--max-p99-ms / --max-error-rate 超過時以結束碼1結束，可用於比對效能退化。
+"""
+import argparse
+import http.client
+import importlib
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from urllib.parse import urlsplit
+
+
+def _write_body(rng):
+    body = json.dumps({'product_id': f"{rng.getrandbits(52):013X}"})
+    return body, {'Content-Type': 'application/json', 'Idempotency-Key': uuid.uuid4().hex}
+
+
+def _write_batch_body(rng):
+    items = [{'product_id': f"{rng.getrandbits(52):013X}"} for _ in range(5)]
+    return json.dumps({'items': items, 'bind': True}), {'Content-Type': 'application/json'}
+
+
+# 各應用程式可用的操作: 名稱 -> (方法, 路徑, 產生請求內容的函式)
+OPERATIONS = {
+    'backend': {
+        'read': ('GET', '/read', None),
+        'write': ('POST', '/write', _write_body),
+        'write_batch': ('POST', '/write/batch', _write_batch_body),
+        'history': ('GET', '/write/history', None),
+        'health': ('GET', '/health', None)
+    },
+    'oldbackend': {
+        'inventory_start': ('POST', '/api/inventory/start', None),
+        'inventory_data': ('GET', '/api/inventory/data', None),
+        'inventory_stop': ('POST', '/api/inventory/stop', None),
+        'inventory_table': ('GET', '/api/inventory/table', None),
+        'health': ('GET', '/api/health', None)
+    },
+    'frontend': {
+        'index': ('GET', '/', None)
+    }
+}
+
+DEFAULT_MIX = {
+    'backend': 'read=6,write=3,health=1',
+    'oldbackend': 'inventory_data=8,inventory_start=1,inventory_stop=1',
+    'frontend': 'index=1'
+}
+
+# 應用程式 -> (模組, 健康狀態端點)
+APPS = {
+    'backend': ('Backend', '/health'),
+    'oldbackend': ('OldBackend', '/api/health'),
+    'frontend': ('Frontendserver', None)
+}
+
+
+def parse_mix(text, operations):
+    """解析 name=weight,... 格式的操作比例"""
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.strip().partition('=')
+        if name not in operations:
+            raise ValueError(f"不支援的操作: {name}（可用: {', '.join(operations)}）")
+        mix[name] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError("操作比例總和必須大於0")
+    return mix
+
+
+class InstrumentedLock:
+    """包裝 threading.Lock，記錄取得鎖的等待時間與持有時間"""
+
+    def __init__(self, lock):
+        self.lock = lock
+        self.waits = []
+        self.contended = 0
+        self.hold_time = 0.0
+        self.acquired_at = 0.0
+
+    def acquire(self, blocking=True, timeout=-1):
+        started = time.perf_counter()
+        if self.lock.acquire(False):
+            acquired = True
+        else:
+            acquired = self.lock.acquire(blocking, timeout)
+            if acquired:
+                self.contended += 1
+        if acquired:
+            self.acquired_at = time.perf_counter()
+            self.waits.append(self.acquired_at - started)
+        return acquired
+
+    def release(self):
+        self.hold_time += time.perf_counter() - self.acquired_at
+        self.lock.release()
+
+    def locked(self):
+        return self.lock.locked()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def stats(self, elapsed):
+        waits = sorted(self.waits)
+        return {
+            'acquisitions': len(waits),
+            'contended': self.contended,
+            'contention_rate': round(self.contended / len(waits), 4) if waits else 0.0,
+            'wait_ms': _latency_summary(waits),
+            'utilization': round(self.hold_time / elapsed, 4) if elapsed else 0.0
+        }
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    index = min(len(values) - 1, int(fraction * len(values)))
+    return values[index]
+
+
+def _latency_summary(values):
+    """已排序的秒數 -> 毫秒百分位數"""
+    def ms(value):
+        return None if value is None else round(value * 1000, 2)
+    return {
+        'p50': ms(_percentile(values, 0.50)),
+        'p90': ms(_percentile(values, 0.90)),
+        'p99': ms(_percentile(values, 0.99)),
+        'max': ms(values[-1] if values else None)
+    }
+
+
+def classify(status, content_type, payload):
+    """transport_error / http_error / app_error / ok"""
+    if status >= 400:
+        return 'http_error'
+    if content_type and 'json' in content_type:
+        try:
+            body = json.loads(payload)
+        except ValueError:
+            return 'app_error'
+        if isinstance(body, dict) and (body.get('error') or body.get('success') is False):
+            return 'app_error'
+    return 'ok'
+
+
+def client_loop(index, host, port, operations, mix, deadline, think, seed, results):
+    rng = random.Random(seed + index)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    samples = []
+    while time.monotonic() < deadline:
+        name = rng.choices(names, weights)[0]
+        method, path, make_body = operations[name]
+        body, headers = make_body(rng) if make_body else (None, {})
+        started = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            payload = response.read()
+            outcome = classify(response.status, response.getheader('Content-Type'), payload)
+        except (OSError, http.client.HTTPException):
+            outcome = 'transport_error'
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+        samples.append((name, time.perf_counter() - started, outcome))
+        if think:
+            time.sleep(rng.expovariate(1.0 / think))
+    conn.close()
+    results[index] = samples
+
+
+def start_local(app_name, workdir):
+    """在同一行程內以模擬讀寫器啟動後端，傳回 (server, module, lock)"""
+    from werkzeug.serving import make_server
+
+    os.environ.setdefault('RFID_SIMULATE', '1')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    # 寫入工作日誌等檔案寫到暫存目錄，不影響正式資料
+    os.chdir(workdir)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    module = importlib.import_module(APPS[app_name][0])
+    lock = None
+    controller = getattr(module, 'rfid', None)
+    if controller is not None:
+        lock = InstrumentedLock(controller.lock)
+        controller.lock = lock
+        if controller.supervisor is None:
+            controller.connect()
+        controller.supervisor.wait_connected(5.0)
+    server = make_server('127.0.0.1', 0, module.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name='load-test-server')
+    thread.daemon = True
+    thread.start()
+    return server, module, lock
+
+
+def fetch_health(host, port, path):
+    if not path:
+        return None
+    try:
+        conn = http.client.HTTPConnection(host, port, timeout=5)
+        conn.request('GET', path)
+        body = json.loads(conn.getresponse().read())
+        conn.close()
+        return body.get('data')
+    except (OSError, ValueError, http.client.HTTPException) as e:
+        return {'error': str(e)}
+
+
+def run(args):
+    operations = OPERATIONS[args.app]
+    mix = parse_mix(args.mix or DEFAULT_MIX[args.app], operations)
+    server = module = lock = None
+    if args.url:
+        parts = urlsplit(args.url)
+        host, port = parts.hostname, parts.port or 80
+    else:
+        server, module, lock = start_local(args.app, args.workdir or tempfile.mkdtemp(prefix='rfid-load-'))
+        host, port = server.server_address[:2]
+
+    results = [None] * args.clients
+    started = time.monotonic()
+    deadline = started + args.duration
+    threads = []
+    for index in range(args.clients):
+        thread = threading.Thread(target=client_loop, args=(
+            index, host, port, operations, mix, deadline, args.think_ms / 1000, args.seed, results))
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    report = summarize(results, elapsed, args)
+    serial_report = {'health': fetch_health(host, port, APPS[args.app][1])}
+    if lock is not None:
+        serial_report['lock'] = lock.stats(elapsed)
+    controller = getattr(module, 'rfid', None) if module else None
+    # 兩個後端的控制器都由 SerialSupervisor 持有串口
+    supervisor = getattr(controller, 'supervisor', None)
+    reader = getattr(supervisor, 'serial', None)
+    if reader is not None and hasattr(reader, 'stats'):
+        serial_report['reader'] = reader.stats()
+    report['serial'] = serial_report
+    if server is not None:
+        server.shutdown()
+    return report
+
+
+def summarize(results, elapsed, args):
+    samples = [sample for client in results if client for sample in client]
+    by_operation = {}
+    for name, latency, outcome in samples:
+        entry = by_operation.setdefault(name, {'latencies': [], 'outcomes': Counter()})
+        entry['latencies'].append(latency)
+        entry['outcomes'][outcome] += 1
+
+    operations = {}
+    for name, entry in sorted(by_operation.items()):
+        latencies = sorted(entry['latencies'])
+        errors = sum(count for outcome, count in entry['outcomes'].items() if outcome != 'ok')
+        operations[name] = {
+            'requests': len(latencies),
+            'throughput': round(len(latencies) / elapsed, 2),
+            'error_rate': round(errors / len(latencies), 4),
+            'latency_ms': _latency_summary(latencies),
+            'outcomes': dict(entry['outcomes'])
+        }
+
+    latencies = sorted(sample[1] for sample in samples)
+    outcomes = Counter(sample[2] for sample in samples)
+    errors = sum(count for outcome, count in outcomes.items() if outcome != 'ok')
+    return {
+        'app': args.app,
+        'target': args.url or 'local (simulated reader)',
+        'clients': args.clients,
+        'duration': round(elapsed, 2),
+        'requests': len(samples),
+        'throughput': round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        'error_rate': round(errors / len(samples), 4) if samples else 0.0,
+        'latency_ms': _latency_summary(latencies),
+        'outcomes': dict(outcomes),
+        'operations': operations
+    }
+
+
+def print_report(report):
+    print(f"目標: {report['target']}  應用程式: {report['app']}  客戶端: {report['clients']}  "
+          f"時間: {report['duration']}s")
+    latency = report['latency_ms']
+    print(f"總計 {report['requests']} 次請求, {report['throughput']} req/s, "
+          f"錯誤率 {report['error_rate']:.2%}, p50 {latency['p50']}ms p90 {latency['p90']}ms "
+          f"p99 {latency['p99']}ms max {latency['max']}ms")
+    print(f"{'操作':<16}{'請求':>8}{'req/s':>10}{'錯誤率':>9}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}")
+    for name, entry in report['operations'].items():
+        latency = entry['latency_ms']
+        print(f"{name:<16}{entry['requests']:>8}{entry['throughput']:>10}{entry['error_rate']:>9.2%}"
+              f"{latency['p50']:>10}{latency['p90']:>10}{latency['p99']:>10}{latency['max']:>10}")
+    serial_report = report['serial']
+    if 'lock' in serial_report:
+        lock = serial_report['lock']
+        print(f"串口鎖: {lock['acquisitions']} 次取得, 競爭 {lock['contention_rate']:.2%}, "
+              f"使用率 {lock['utilization']:.2%}, 等待 p99 {lock['wait_ms']['p99']}ms "
+              f"max {lock['wait_ms']['max']}ms")
+    if 'reader' in serial_report:
+        reader = serial_report['reader']
+        print(f"模擬讀寫器: {reader['commands']} 個命令, 最大佇列 {reader['max_queue']}, "
+              f"忙碌 {reader['busy_time']}s")
+    if serial_report.get('health'):
+        print(f"連線狀態: {json.dumps(serial_report['health'], ensure_ascii=False)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP API 壓力測試")
+    parser.add_argument('--app', choices=sorted(OPERATIONS), default='backend', help="測試的應用程式")
+    parser.add_argument('--url', help="已啟動的服務位址，未指定時在本行程以模擬讀寫器啟動")
+    parser.add_argument('--clients', type=int, default=100, help="並行客戶端數")
+    parser.add_argument('--duration', type=float, default=30, help="測試秒數")
+    parser.add_argument('--mix', help="操作比例，例如 read=6,write=3,health=1")
+    parser.add_argument('--think-ms', type=float, default=0, help="每次請求後的平均等待時間(ms)")
+    parser.add_argument('--seed', type=int, default=1, help="亂數種子")
+    parser.add_argument('--workdir', help="本機模式的工作目錄（預設為暫存目錄）")
+    parser.add_argument('--json', dest='json_path', help="另存報告為JSON檔")
+    parser.add_argument('--max-p99-ms', type=float, help="整體p99延遲上限")
+    parser.add_argument('--max-error-rate', type=float, help="整體錯誤率上限（0~1）")
+    args = parser.parse_args(argv)
+
+    try:
+        report = run(args)
+    except ValueError as e:
+        parser.error(str(e))
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    failed = False
+    if args.max_p99_ms is not None and (report['latency_ms']['p99'] or 0) > args.max_p99_ms:
+        print(f"p99 延遲 {report['latency_ms']['p99']}ms 超過上限 {args.max_p99_ms}ms")
+        failed = True
+    if args.max_error_rate is not None and report['error_rate'] > args.max_error_rate:
+        print(f"錯誤率 {report['error_rate']:.2%} 超過上限 {args.max_error_rate:.2%}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
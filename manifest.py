@@ -0,0 +1,143 @@
+"""預期清單（到貨清單）比對
+
+收貨時上傳棧板上應有的標籤，盤點時邊讀邊比對，即時得到 已比對 / 缺少 / 非預期 數量。
+清單可用三種方式指定，載入時分別建立雜湊索引：
+  EPC                     完整EPC
+  tag_id + product_id     標籤ID與產品ID（不管日期）
+  product_id + quantity   某產品應有的數量
+
+以 InventoryTable 的 listener 接收讀取，只處理第一次出現的標籤，每次讀取 O(1)；
+全部比對完成時呼叫 on_complete（例如自動停止盤點）。
+"""
+import threading
+import time
+
+from inventory import decode_epc
+
+
+def _normalize_epc(epc):
+    return epc.replace(' ', '').upper()
+
+
+class ManifestReconciler:
+    def __init__(self, epcs=(), items=(), name=None, on_complete=None):
+        self.name = name
+        self.on_complete = on_complete
+        self.lock = threading.Lock()
+        self.expected_epcs = {}
+        self.expected_keys = {}
+        self.product_quota = {}
+        self.product_seen = {}
+        for epc in epcs:
+            self.expected_epcs[_normalize_epc(epc)] = False
+        for item in items:
+            if item.get('epc'):
+                self.expected_epcs[_normalize_epc(item['epc'])] = False
+            elif item.get('tag_id') and item.get('product_id'):
+                self.expected_keys[(item['tag_id'].upper(), item['product_id'].upper())] = False
+            elif item.get('product_id'):
+                product_id = item['product_id'].upper()
+                self.product_quota[product_id] = self.product_quota.get(product_id, 0) + int(item.get('quantity', 1))
+            else:
+                raise ValueError(f"清單項目需包含 epc、tag_id + product_id 或 product_id: {item}")
+        self.expected = len(self.expected_epcs) + len(self.expected_keys) + sum(self.product_quota.values())
+        if not self.expected:
+            raise ValueError("清單是空的")
+        self.matched = 0
+        self.unexpected = {}
+        self.duplicates = 0
+        self.created = time.time()
+        self.completed = None
+
+    def reset(self):
+        """清除比對結果（盤點表清除時呼叫），之後讀到的標籤重新比對"""
+        with self.lock:
+            self.expected_epcs = dict.fromkeys(self.expected_epcs, False)
+            self.expected_keys = dict.fromkeys(self.expected_keys, False)
+            self.product_seen = {}
+            self.matched = 0
+            self.unexpected = {}
+            self.duplicates = 0
+            self.completed = None
+
+    def _match(self, epc, fields):
+        """比對單張新標籤，傳回是否符合清單（呼叫端需持有lock）"""
+        if epc in self.expected_epcs:
+            if self.expected_epcs[epc]:
+                self.duplicates += 1
+                return True
+            self.expected_epcs[epc] = True
+            self.matched += 1
+            return True
+        if fields:
+            product_id = fields.get('product_id')
+            key = (fields.get('tag_id'), product_id)
+            if key in self.expected_keys:
+                if self.expected_keys[key]:
+                    self.duplicates += 1
+                    return True
+                self.expected_keys[key] = True
+                self.matched += 1
+                return True
+            if product_id in self.product_quota:
+                seen = self.product_seen.get(product_id, 0)
+                if seen < self.product_quota[product_id]:
+                    self.product_seen[product_id] = seen + 1
+                    self.matched += 1
+                    return True
+        return False
+
+    def observe(self, epc, fields=None):
+        """加入一張新讀到的標籤"""
+        epc = _normalize_epc(epc)
+        if fields is None:
+            fields = decode_epc(epc)
+        completed = False
+        with self.lock:
+            if not self._match(epc, fields):
+                self.unexpected[epc] = fields.get('product_id') if fields else None
+            if self.completed is None and self.matched >= self.expected:
+                self.completed = time.time()
+                completed = True
+        if completed and self.on_complete:
+            self.on_complete(self)
+
+    def on_inventory(self, record, is_new):
+        """InventoryTable listener，只處理第一次出現的標籤"""
+        if is_new:
+            self.observe(record['epc'], record)
+
+    def reconcile(self, records):
+        """載入清單時比對已在盤點表中的標籤"""
+        for record in records:
+            self.observe(record['epc'], record)
+
+    def missing(self, limit=None):
+        """尚未讀到的項目"""
+        with self.lock:
+            result = [{'epc': epc} for epc, seen in self.expected_epcs.items() if not seen]
+            result += [{'tag_id': tag_id, 'product_id': product_id}
+                       for (tag_id, product_id), seen in self.expected_keys.items() if not seen]
+            for product_id, quota in self.product_quota.items():
+                remaining = quota - self.product_seen.get(product_id, 0)
+                if remaining:
+                    result.append({'product_id': product_id, 'quantity': remaining})
+        return result[:limit] if limit else result
+
+    def unexpected_tags(self, limit=None):
+        with self.lock:
+            result = [{'epc': epc, 'product_id': product_id} for epc, product_id in self.unexpected.items()]
+        return result[:limit] if limit else result
+
+    def status(self):
+        return {
+            'name': self.name,
+            'expected': self.expected,
+            'matched': self.matched,
+            'missing': self.expected - self.matched,
+            'unexpected': len(self.unexpected),
+            'duplicates': self.duplicates,
+            'complete': self.completed is not None,
+            'created': self.created,
+            'completed': self.completed
+        }
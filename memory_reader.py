@@ -0,0 +1,171 @@
+"""盤點後批次讀取 TID / User 記憶體
+
+對每張已盤點到的標籤依序 Select 後讀取指定記憶體區塊，指令以數張標籤為一批連續送出，
+收取上一批回應時下一批已在讀寫器排隊，不必每張標籤等待完整往返時間。
+結果依EPC快取，重複掃描時已讀過的標籤直接使用快取。
+
+controller 需提供 lock / send_frames / read_response / reset_input（與 EncodePipeline 相同）。
+"""
+import threading
+import time
+
+import rfid_protocol as proto
+import hex_codec
+from encode_pipeline import restore_select
+
+# 記憶體區塊名稱 -> (區塊代碼, 起始字組)
+MEMORY_BANKS = {
+    'tid': (proto.BANK_TID, 0),
+    'user': (proto.BANK_USER, 0)
+}
+
+DEFAULT_WORDS = {
+    'tid': 6,
+    'user': 4
+}
+
+
+class MemoryCache:
+    """EPC -> 已讀取的記憶體內容"""
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, epc):
+        return self.entries.get(epc)
+
+    def update(self, epc, values):
+        with self.lock:
+            entry = self.entries.get(epc)
+            if entry is None:
+                if len(self.entries) >= self.max_entries:
+                    # 移除最早加入的項目（dict保持加入順序）
+                    del self.entries[next(iter(self.entries))]
+                entry = self.entries[epc] = {}
+            entry.update(values)
+            entry['read_at'] = time.time()
+            return dict(entry)
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class BulkMemoryReader:
+    def __init__(self, controller, cache=None, timeout=1.0, depth=4):
+        self.controller = controller
+        self.cache = cache if cache is not None else MemoryCache()
+        self.timeout = timeout
+        self.depth = depth
+
+    def _tag_frames(self, epc, banks):
+        frames = [proto.build_select(bytes.fromhex(epc))]
+        for bank, words in banks:
+            bank_code, start = MEMORY_BANKS[bank]
+            frames.append(proto.build_read_memory(bank_code, start, words))
+        return frames
+
+    def _collect(self, count):
+        frames = []
+        for _ in range(count):
+            frame = self.controller.read_response(self.timeout)
+            if frame is None:
+                return None
+            frames.append(frame)
+        return frames
+
+    def _resync(self, outstanding):
+        """逾時後收掉已送出指令的殘餘回應（最多 outstanding 個，等待逾時視為已遺失）再清空，
+        之後重送的指令不會與舊回應錯位"""
+        for _ in range(outstanding):
+            if self.controller.read_response(self.timeout) is None:
+                break
+        self.controller.reset_input()
+
+    def _parse(self, epc, banks, responses):
+        result = {'epc': epc, 'cached': False, 'error': None}
+        select_resp, *read_resps = responses
+        error = proto.frame_error(select_resp)
+        if error:
+            result['error'] = error
+            return result
+        expected = bytes.fromhex(epc)
+        values = {}
+        errors = []
+        for (bank, _), frame in zip(banks, read_resps):
+            error = proto.frame_error(frame)
+            if error:
+                errors.append(f"{bank} 讀取失敗: {error}")
+                continue
+            pc_epc, data = proto.parse_memory_response(frame)
+            if pc_epc[2:] != expected:
+                errors.append(f"{bank} 回應的EPC不符: {hex_codec.to_hex(pc_epc[2:])}")
+                continue
+            values[bank] = hex_codec.to_hex(data)
+        if errors:
+            result['error'] = '; '.join(errors)
+        if values:
+            result.update(self.cache.update(epc, values))
+        return result
+
+    def run(self, epcs, banks=('tid',), words=None, refresh=False):
+        """讀取每張標籤的指定區塊，傳回每張標籤的結果（含快取命中）；還原Select設定失敗時拋出 OSError"""
+        for bank in banks:
+            if bank not in MEMORY_BANKS:
+                raise ValueError(f"不支援的記憶體區塊: {bank}")
+        words = dict(DEFAULT_WORDS, **(words or {}))
+        bank_words = [(bank, int(words[bank])) for bank in banks]
+
+        order = list(dict.fromkeys(epc.upper() for epc in epcs))
+        results = {}
+        todo = []
+        for epc in order:
+            cached = None if refresh else self.cache.get(epc)
+            if cached and all(bank in cached for bank in banks):
+                results[epc] = dict(cached, epc=epc, cached=True, error=None)
+            else:
+                todo.append(epc)
+
+        if todo:
+            per_tag = 1 + len(bank_words)
+            chunks = [todo[start:start + self.depth] for start in range(0, len(todo), self.depth)]
+            controller = self.controller
+            with controller.lock:
+                controller.reset_input()
+                # Select只套用於讀寫與鎖定指令
+                controller.send_frames([proto.build_select_mode(proto.SELECT_MODE_EXCEPT_POLL)])
+                if self._collect(1) is None:
+                    raise TimeoutError("設定Select模式逾時")
+
+                def send(chunk):
+                    controller.send_frames([frame for epc in chunk
+                                            for frame in self._tag_frames(epc, bank_words)])
+
+                try:
+                    # 雙緩衝：收取第 n 批回應時，第 n+1 批指令已送出
+                    sent = 0
+                    for index, chunk in enumerate(chunks):
+                        while sent < min(index + 2, len(chunks)):
+                            send(chunks[sent])
+                            sent += 1
+                        for position, epc in enumerate(chunk):
+                            responses = self._collect(per_tag)
+                            if responses is None:
+                                for lost in chunk[position:]:
+                                    results[lost] = {'epc': lost, 'cached': False, 'error': "等待回應逾時"}
+                                # 收完本批其餘與已送出的下一批的回應後，下一批已不在讀寫器中，下一輪重新送出
+                                in_flight = sum(len(queued) for queued in chunks[index + 1:sent])
+                                self._resync((len(chunk) - position + in_flight) * per_tag)
+                                sent = index + 1
+                                break
+                            results[epc] = self._parse(epc, bank_words, responses)
+                finally:
+                    restore_error = restore_select(controller, self.timeout)
+                if restore_error:
+                    raise OSError(restore_error)
+        return [results[epc] for epc in order]
@@ -1,6 +1,8 @@
 import { useState, useEffect } from 'react'
 
-const API_BASE_URL = 'http://localhost:5000/api'
+// 開發時連到本機後端；建置後由後端同一個行程提供，使用相對路徑
+const API_BASE_URL = import.meta.env.VITE_API_BASE_URL
+  || (import.meta.env.DEV ? 'http://localhost:5000/api' : '/api')
 
 function App() {
   const [status, setStatus] = useState('')
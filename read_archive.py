@@ -0,0 +1,415 @@
+"""標籤讀取歷史的欄式封存檔
+
+盤點期間由 ArchiveSink 收集讀取事件，盤點結束（或累積 max_rows 筆）時寫成一個區段檔 .rseg，
+每個欄位是連續的固定寬度陣列，可直接以 mmap 對應，不需要解析：
+
+  標頭 128 位元組   magic, 版本, 筆數, 基準時間(ms), 各欄位位移, footer 位移與長度
+  epc      uint8[n, 12]   12位元組EPC
+  ts       uint32[n]      與基準時間的差(ms)，依時間排序
+  rssi     int8[n]
+  reader   uint16[n]      讀寫器編號，名稱對照表在 footer
+  antenna  uint8[n]
+  count    uint16[n]      讀取次數（多讀寫器管線每列為一批次的彙總）
+  footer   JSON           時間/RSSI/EPC 最小最大值、讀寫器對照表、盤點資訊
+
+欄位位移皆對齊 64 位元組、小端序。有 NumPy 時欄位為 np.frombuffer 的零複製陣列，
+掃描為向量運算；沒有時以 memoryview.cast 逐筆比對。查詢先以 footer 的最小最大值
+略過不可能符合的區段。每列 22 位元組，每秒100列全年約 70GB。
+
+    python read_archive.py archive                       列出區段
+    python read_archive.py archive --epc 00ABCD... --since 2024-01-01
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import uuid
+from array import array
+from datetime import datetime
+
+from tag_sinks import TagSink
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MAGIC = b'RFSEG\x00\x00\x01'
+VERSION = 1
+HEADER_SIZE = 128
+EPC_WIDTH = 12
+ALIGN = 64
+COLUMNS = (
+    # 名稱, 每筆位元組數, NumPy型別, memoryview格式
+    ('epc', EPC_WIDTH, 'u1', 'B'),
+    ('ts', 4, '<u4', 'I'),
+    ('rssi', 1, 'i1', 'b'),
+    ('reader', 2, '<u2', 'H'),
+    ('antenna', 1, 'u1', 'B'),
+    ('count', 2, '<u2', 'H')
+)
+HEADER = struct.Struct(f'<8sIIQQ{len(COLUMNS)}QQQ')
+MAX_SPAN_MS = 0xFFFFFFFF
+
+
+def _aligned(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _epc_bytes(epc):
+    data = bytes.fromhex(epc.replace(' ', ''))
+    return data[:EPC_WIDTH].ljust(EPC_WIDTH, b'\x00')
+
+
+def write_segment(path, epcs, timestamps, rssi, readers, antennas, counts, reader_names, info=None):
+    """寫入一個區段；timestamps 為毫秒，各欄位等長（epcs 為 bytes，每筆 12 位元組）"""
+    count = len(timestamps)
+    if count == 0:
+        raise ValueError("沒有資料")
+    # 依時間排序，掃描時間範圍時可以二分搜尋
+    order = sorted(range(count), key=timestamps.__getitem__)
+    base = timestamps[order[0]]
+    if timestamps[order[-1]] - base > MAX_SPAN_MS:
+        raise ValueError("區段時間跨度超過 uint32 毫秒範圍")
+    columns = {
+        'epc': b''.join(epcs[i * EPC_WIDTH:(i + 1) * EPC_WIDTH] for i in order),
+        'ts': array('I', (timestamps[i] - base for i in order)),
+        'rssi': array('b', (rssi[i] for i in order)),
+        'reader': array('H', (readers[i] for i in order)),
+        'antenna': array('B', (antennas[i] for i in order)),
+        'count': array('H', (counts[i] for i in order))
+    }
+    if sys.byteorder != 'little':
+        for name in ('ts', 'reader', 'count'):
+            columns[name].byteswap()
+
+    epc_column = columns['epc']
+    epc_min = min(epc_column[i:i + EPC_WIDTH] for i in range(0, len(epc_column), EPC_WIDTH))
+    epc_max = max(epc_column[i:i + EPC_WIDTH] for i in range(0, len(epc_column), EPC_WIDTH))
+    footer = json.dumps({
+        'rows': count,
+        'ts_min': base,
+        'ts_max': timestamps[order[-1]],
+        'rssi_min': min(rssi),
+        'rssi_max': max(rssi),
+        'epc_min': epc_min.hex().upper(),
+        'epc_max': epc_max.hex().upper(),
+        'readers': reader_names,
+        'info': info or {}
+    }, ensure_ascii=False).encode('utf-8')
+
+    offsets = []
+    position = HEADER_SIZE
+    for name, width, _, _ in COLUMNS:
+        position = _aligned(position)
+        offsets.append(position)
+        position += width * count
+    footer_offset = _aligned(position)
+
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        header = HEADER.pack(MAGIC, VERSION, 0, count, base, *offsets, footer_offset, len(footer))
+        f.write(header.ljust(HEADER_SIZE, b'\x00'))
+        for (name, _, _, _), offset in zip(COLUMNS, offsets):
+            f.write(b'\x00' * (offset - f.tell()))
+            f.write(columns[name])
+        f.write(b'\x00' * (footer_offset - f.tell()))
+        f.write(footer)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    return path
+
+
+class Segment:
+    """以 mmap 開啟的區段，欄位為零複製的陣列"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, _, self.rows, self.base,
+         *offsets, footer_offset, footer_length) = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.mm.close()
+            raise ValueError(f"不是區段檔或版本不符: {path}")
+        self.offsets = dict(zip((name for name, _, _, _ in COLUMNS), offsets))
+        self.formats = {name: (width, dtype, fmt) for name, width, dtype, fmt in COLUMNS}
+        self.columns = {}
+        self.footer = json.loads(self.mm[footer_offset:footer_offset + footer_length])
+        self.reader_names = self.footer['readers']
+
+    def column(self, name):
+        """欄位陣列：有 NumPy 時為 ndarray（epc 為 n×12），否則為 memoryview"""
+        values = self.columns.get(name)
+        if values is None:
+            width, dtype, fmt = self.formats[name]
+            offset = self.offsets[name]
+            if np is not None:
+                values = np.frombuffer(self.mm, dtype=dtype, count=self.rows * width // np.dtype(dtype).itemsize,
+                                       offset=offset)
+                if name == 'epc':
+                    values = values.reshape(self.rows, EPC_WIDTH)
+            else:
+                values = memoryview(self.mm)[offset:offset + width * self.rows]
+                if name != 'epc':
+                    values = values.cast(fmt)
+            self.columns[name] = values
+        return values
+
+    def may_contain(self, epc=None, since=None, until=None, reader=None):
+        """依 footer 判斷區段是否可能有符合的資料"""
+        footer = self.footer
+        if since is not None and footer['ts_max'] < since:
+            return False
+        if until is not None and footer['ts_min'] > until:
+            return False
+        if epc is not None and not footer['epc_min'] <= epc <= footer['epc_max']:
+            return False
+        if reader is not None and reader not in self.reader_names:
+            return False
+        return True
+
+    def _time_range(self, since, until):
+        """時間欄位已排序，以二分搜尋取得列範圍"""
+        ts = self.column('ts')
+        low = 0 if since is None else max(0, since - self.base)
+        high = None if until is None else until - self.base
+        if np is not None:
+            start = int(np.searchsorted(ts, low, 'left'))
+            end = self.rows if high is None else int(np.searchsorted(ts, high, 'right'))
+            return start, end
+        from bisect import bisect_left, bisect_right
+        start = bisect_left(ts, low)
+        end = self.rows if high is None else bisect_right(ts, high)
+        return start, end
+
+    def scan(self, epc=None, since=None, until=None, reader=None, limit=None):
+        """符合條件的列；since / until 為毫秒"""
+        if not self.may_contain(epc, since, until, reader):
+            return []
+        if until is not None and until < self.base:
+            return []
+        start, end = self._time_range(since, until)
+        if start >= end:
+            return []
+        reader_id = self.reader_names.index(reader) if reader is not None else None
+        epc_bytes = _epc_bytes(epc) if epc is not None else None
+        if np is not None:
+            mask = np.ones(end - start, dtype=bool)
+            if epc_bytes is not None:
+                target = np.frombuffer(epc_bytes, dtype='u1')
+                mask &= (self.column('epc')[start:end] == target).all(axis=1)
+            if reader_id is not None:
+                mask &= self.column('reader')[start:end] == reader_id
+            rows = (np.flatnonzero(mask) + start).tolist()
+        else:
+            if epc_bytes is not None:
+                # 以 mmap.find 在EPC欄位內搜尋，只保留對齊列邊界的位置
+                base = self.offsets['epc']
+                stop = base + end * EPC_WIDTH
+                position = self.mm.find(epc_bytes, base + start * EPC_WIDTH, stop)
+                rows = []
+                while position >= 0:
+                    row, extra = divmod(position - base, EPC_WIDTH)
+                    if extra == 0:
+                        rows.append(row)
+                        position = self.mm.find(epc_bytes, position + EPC_WIDTH, stop)
+                    else:
+                        position = self.mm.find(epc_bytes, position + 1, stop)
+            else:
+                rows = range(start, end)
+            if reader_id is not None:
+                readers = self.column('reader')
+                rows = [row for row in rows if readers[row] == reader_id]
+        if limit is not None:
+            rows = rows[:limit]
+        return [self.row(row) for row in rows]
+
+    def row(self, row):
+        epc_offset = self.offsets['epc'] + row * EPC_WIDTH
+        return {
+            'ts': (self.base + int(self.column('ts')[row])) / 1000,
+            'epc': self.mm[epc_offset:epc_offset + EPC_WIDTH].hex().upper(),
+            'rssi': int(self.column('rssi')[row]),
+            'reader': self.reader_names[int(self.column('reader')[row])],
+            'antenna': int(self.column('antenna')[row]),
+            'count': int(self.column('count')[row])
+        }
+
+    def close(self):
+        columns, self.columns = self.columns, {}
+        for values in columns.values():
+            if isinstance(values, memoryview):
+                values.release()
+        del columns, values
+        try:
+            self.mm.close()
+        except BufferError:
+            # 查詢結果仍引用欄位陣列，由垃圾回收釋放
+            pass
+
+
+class ArchiveSink(TagSink):
+    """收集讀取事件，關閉或累積 max_rows 筆時寫成區段檔（類型事件如 zone/expiry 不封存）"""
+
+    def __init__(self, name, directory='archive', max_rows=1000000, info=None, **kwargs):
+        self.directory = directory
+        self.max_rows = max_rows
+        self.info = dict(info or {})
+        self.segments = []
+        self._reset_buffers()
+        super().__init__(name, **kwargs)
+
+    def _reset_buffers(self):
+        self.epcs = bytearray()
+        self.timestamps = array('q')
+        self.rssi = array('b')
+        self.readers = array('H')
+        self.antennas = array('B')
+        self.counts = array('H')
+        self.reader_names = []
+        self.reader_ids = {}
+
+    def open(self):
+        os.makedirs(self.directory, exist_ok=True)
+
+    def write_batch(self, events):
+        for event in events:
+            if event.get('type') or not event.get('epc'):
+                continue
+            reader = event.get('reader') or ''
+            reader_id = self.reader_ids.get(reader)
+            if reader_id is None:
+                reader_id = self.reader_ids[reader] = len(self.reader_names)
+                self.reader_names.append(reader)
+            ts = int(event['ts'] * 1000)
+            if self.timestamps and abs(ts - self.timestamps[0]) > MAX_SPAN_MS // 2:
+                # 長時間的盤點分成多個區段，時間差不超出 uint32
+                self.roll()
+                reader_id = self.reader_ids[reader] = 0
+                self.reader_names.append(reader)
+            rssi = event.get('rssi')
+            self.epcs += _epc_bytes(event['epc'])
+            self.timestamps.append(ts)
+            self.rssi.append(max(-128, min(127, int(rssi))) if rssi is not None else -128)
+            self.readers.append(reader_id)
+            self.antennas.append(int(event.get('antenna') or 0) & 0xFF)
+            self.counts.append(min(int(event.get('count', 1)), 0xFFFF))
+            if len(self.timestamps) >= self.max_rows:
+                self.roll()
+
+    def roll(self):
+        """把目前收集的讀取寫成區段檔"""
+        if not self.timestamps:
+            return None
+        started = datetime.fromtimestamp(min(self.timestamps) / 1000)
+        path = os.path.join(self.directory, f"{started:%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}.rseg")
+        write_segment(path, self.epcs, self.timestamps, self.rssi, self.readers, self.antennas,
+                      self.counts, self.reader_names, dict(self.info, closed=time.time()))
+        self.segments.append(path)
+        self._reset_buffers()
+        return path
+
+    def close_resources(self):
+        try:
+            self.roll()
+        except Exception as e:
+            self.errors += 1
+            self.last_error = str(e)
+
+
+class ReadArchive:
+    """封存目錄中的所有區段"""
+
+    def __init__(self, directory='archive'):
+        self.directory = directory
+        self.segments = {}
+        self.lock = threading.Lock()
+
+    def _refresh(self):
+        """開啟新增的區段（已開啟的沿用 mmap）"""
+        if not os.path.isdir(self.directory):
+            return []
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith('.rseg'))
+        with self.lock:
+            for name in names:
+                if name not in self.segments:
+                    try:
+                        self.segments[name] = Segment(os.path.join(self.directory, name))
+                    except (OSError, ValueError, struct.error) as e:
+                        print(f"無法開啟區段 {name}: {str(e)}")
+            return [self.segments[name] for name in names if name in self.segments]
+
+    def close(self):
+        with self.lock:
+            segments, self.segments = self.segments, {}
+        for segment in segments.values():
+            segment.close()
+
+    def list(self):
+        return [dict(segment.footer, file=os.path.basename(segment.path),
+                     bytes=os.path.getsize(segment.path)) for segment in self._refresh()]
+
+    def scan(self, epc=None, since=None, until=None, reader=None, limit=1000):
+        """掃描所有區段；since / until 為秒，傳回 (符合的列, 掃描的區段數, 略過的區段數)"""
+        epc = _epc_bytes(epc).hex().upper() if epc else None
+        since_ms = int(since * 1000) if since is not None else None
+        until_ms = int(until * 1000) if until is not None else None
+        rows = []
+        scanned = skipped = 0
+        for segment in self._refresh():
+            if not segment.may_contain(epc, since_ms, until_ms, reader):
+                skipped += 1
+                continue
+            scanned += 1
+            rows += segment.scan(epc, since_ms, until_ms, reader, limit - len(rows) if limit else None)
+            if limit and len(rows) >= limit:
+                break
+        return rows, scanned, skipped
+
+
+def parse_time(value):
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="讀取歷史封存檔")
+    parser.add_argument('directory', help="封存目錄")
+    parser.add_argument('--epc', help="EPC")
+    parser.add_argument('--reader', help="讀寫器名稱")
+    parser.add_argument('--since', help="起始時間（秒或 ISO 格式）")
+    parser.add_argument('--until', help="結束時間（秒或 ISO 格式）")
+    parser.add_argument('--limit', type=int, default=20, help="最多列出筆數")
+    args = parser.parse_args(argv)
+
+    archive = ReadArchive(args.directory)
+    if not (args.epc or args.reader or args.since or args.until):
+        for segment in archive.list():
+            print(f"{segment['file']}  {segment['rows']:>10} 筆  {segment['bytes'] / 1e6:>8.1f} MB  "
+                  f"{datetime.fromtimestamp(segment['ts_min'] / 1000):%Y-%m-%d %H:%M:%S} ~ "
+                  f"{datetime.fromtimestamp(segment['ts_max'] / 1000):%Y-%m-%d %H:%M:%S}")
+        return 0
+    started = time.perf_counter()
+    rows, scanned, skipped = archive.scan(args.epc, parse_time(args.since), parse_time(args.until),
+                                          args.reader, args.limit)
+    elapsed = time.perf_counter() - started
+    for row in rows:
+        print(f"{datetime.fromtimestamp(row['ts']):%Y-%m-%d %H:%M:%S.%f}  {row['epc']}  "
+              f"{row['rssi']:>4}  {row['reader']}/{row['antenna']}  x{row['count']}")
+    print(f"{len(rows)} 筆，掃描 {scanned} 個區段、略過 {skipped} 個，{elapsed * 1000:.1f} ms"
+          + ("" if np is not None else "（未安裝 NumPy）"))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
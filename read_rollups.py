@@ -0,0 +1,169 @@
+"""各讀寫器讀取率彙總
+
+儀表板需要最近一小時或一天各讀寫器的 讀取次數/秒、不同標籤數/秒 與RSSI，
+每次由原始事件計算太慢。這裡每筆讀取即時累加到固定大小的環狀桶：
+  1s  x 3600  最近一小時
+  1m  x 1440  最近一天
+  1h  x 168   最近一週
+每個 (讀寫器, 天線) 一組，另有 (讀寫器, None) 合計所有天線。
+桶內保存 讀取次數、不同標籤數、RSSI 總和/最小/最大；不同標籤數以每張標籤計入過的
+最新桶編號判斷（亂序的舊事件不會再計一次），超過最大解析度（1小時）沒有讀到的標籤
+會被移除，記憶體不隨時間成長。
+查詢成本與桶數成正比，與讀取次數無關。
+"""
+import threading
+import time
+from collections import OrderedDict
+
+RESOLUTIONS = OrderedDict([
+    ('1s', (1, 3600)),
+    ('1m', (60, 1440)),
+    ('1h', (3600, 168))
+])
+
+
+class RollupRing:
+    """固定解析度的環狀桶"""
+
+    def __init__(self, seconds, slots):
+        self.seconds = seconds
+        self.slots = slots
+        self.bucket_ids = [-1] * slots
+        self.reads = [0] * slots
+        self.unique = [0] * slots
+        self.rssi_sum = [0] * slots
+        self.rssi_count = [0] * slots
+        self.rssi_min = [0] * slots
+        self.rssi_max = [0] * slots
+
+    def add(self, bucket, count, new_tag, rssi):
+        slot = bucket % self.slots
+        if self.bucket_ids[slot] != bucket:
+            self.bucket_ids[slot] = bucket
+            self.reads[slot] = 0
+            self.unique[slot] = 0
+            self.rssi_sum[slot] = 0
+            self.rssi_count[slot] = 0
+        self.reads[slot] += count
+        if new_tag:
+            self.unique[slot] += 1
+        if rssi is not None:
+            if self.rssi_count[slot]:
+                self.rssi_min[slot] = min(self.rssi_min[slot], rssi)
+                self.rssi_max[slot] = max(self.rssi_max[slot], rssi)
+            else:
+                self.rssi_min[slot] = self.rssi_max[slot] = rssi
+            self.rssi_sum[slot] += rssi * count
+            self.rssi_count[slot] += count
+
+    def series(self, first, last):
+        """桶編號 first..last 的資料，以欄位陣列傳回（沒有讀取的桶為0 / None）"""
+        seconds = self.seconds
+        columns = {name: [] for name in ('ts', 'reads', 'unique', 'read_rate', 'unique_rate',
+                                          'rssi_avg', 'rssi_min', 'rssi_max')}
+        for bucket in range(max(first, last - self.slots + 1), last + 1):
+            slot = bucket % self.slots
+            columns['ts'].append(bucket * seconds)
+            if self.bucket_ids[slot] == bucket:
+                reads, unique, rssi_count = self.reads[slot], self.unique[slot], self.rssi_count[slot]
+            else:
+                reads = unique = rssi_count = 0
+            columns['reads'].append(reads)
+            columns['unique'].append(unique)
+            columns['read_rate'].append(reads / seconds)
+            columns['unique_rate'].append(unique / seconds)
+            if rssi_count:
+                columns['rssi_avg'].append(round(self.rssi_sum[slot] / rssi_count, 1))
+                columns['rssi_min'].append(self.rssi_min[slot])
+                columns['rssi_max'].append(self.rssi_max[slot])
+            else:
+                columns['rssi_avg'].append(None)
+                columns['rssi_min'].append(None)
+                columns['rssi_max'].append(None)
+        return columns
+
+
+class SourceRollup:
+    """單一 (讀寫器, 天線) 的各解析度環狀桶"""
+
+    def __init__(self):
+        self.rings = [RollupRing(seconds, slots) for seconds, slots in RESOLUTIONS.values()]
+        # epc -> 各解析度最後計入的桶編號，依最後讀取時間排序
+        self.last_buckets = OrderedDict()
+        self.total_reads = 0
+        self.last_seen = None
+
+    def add(self, ts, epc, rssi, count):
+        second = int(ts)
+        buckets = [second // ring.seconds for ring in self.rings]
+        previous = self.last_buckets.get(epc)
+        # 事件可能晚到或亂序：只有比已計入的桶更新時才算新標籤，舊桶的讀取不會重複計數
+        latest = buckets if previous is None else [max(pair) for pair in zip(previous, buckets)]
+        for index, ring in enumerate(self.rings):
+            ring.add(buckets[index], count, previous is None or buckets[index] > previous[index], rssi)
+        self.last_buckets[epc] = latest
+        if previous is None or latest[-1] != previous[-1]:
+            self.last_buckets.move_to_end(epc)
+        self.total_reads += count
+        self.last_seen = ts if self.last_seen is None else max(self.last_seen, ts)
+        # 移除超過最大解析度沒有讀到的標籤
+        oldest_bucket = int(self.last_seen) // self.rings[-1].seconds
+        while self.last_buckets:
+            first_epc, first_buckets = next(iter(self.last_buckets.items()))
+            if first_buckets[-1] >= oldest_bucket - 1:
+                break
+            del self.last_buckets[first_epc]
+
+
+class ReadRollups:
+    def __init__(self):
+        self.sources = {}
+        self.lock = threading.Lock()
+
+    def record(self, ts, epc, rssi=None, reader='', antenna=1, count=1):
+        """加入一筆讀取（count 為管線彙總的讀取次數）"""
+        with self.lock:
+            for key in ((reader, antenna), (reader, None)):
+                source = self.sources.get(key)
+                if source is None:
+                    source = self.sources[key] = SourceRollup()
+                source.add(ts, epc, rssi, count)
+
+    def series(self, resolution='1s', reader=None, antenna=None, window=None, now=None):
+        """各來源的時間序列；antenna 為 None 時傳回各讀寫器的天線合計"""
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"不支援的解析度: {resolution}（可用 {', '.join(RESOLUTIONS)}）")
+        index = list(RESOLUTIONS).index(resolution)
+        seconds, slots = RESOLUTIONS[resolution]
+        now = time.time() if now is None else now
+        window = seconds * slots if window is None else min(float(window), seconds * slots)
+        last = int(now) // seconds
+        first = int(now - window) // seconds + 1
+        result = []
+        with self.lock:
+            for (source_reader, source_antenna), source in self.sources.items():
+                if reader is not None and source_reader != reader:
+                    continue
+                if source_antenna != antenna:
+                    continue
+                result.append({
+                    'reader': source_reader,
+                    'antenna': source_antenna,
+                    'series': source.rings[index].series(first, last)
+                })
+        return result
+
+    def summary(self):
+        """各來源的累計讀取次數與最後讀取時間"""
+        with self.lock:
+            return [{
+                'reader': reader,
+                'antenna': antenna,
+                'total_reads': source.total_reads,
+                'tracked_tags': len(source.last_buckets),
+                'last_seen': source.last_seen
+            } for (reader, antenna), source in self.sources.items()]
+
+    def clear(self):
+        with self.lock:
+            self.sources = {}
@@ -0,0 +1,65 @@
+"""事件驅動的串口讀取排程
+
+取代固定 sleep(0.1) 的輪詢：阻塞等待串口可讀，有資料時一次取完；
+連續沒有資料時才逐步拉長等待時間，減少閒置時的喚醒次數。
+等待時間拉長不會增加延遲，資料一到就會立即返回。
+"""
+import os
+import select
+
+
+class ReadScheduler:
+    def __init__(self, serial_port, min_timeout=0.02, max_timeout=0.5, backoff=2.0):
+        self.serial_port = serial_port
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.backoff = backoff
+        self.timeout = min_timeout
+        self.wakeups = 0
+        self.idle_wakeups = 0
+        self.bytes_read = 0
+        # POSIX 串口可用 select 等待；Windows 則由串口本身的 timeout 阻塞
+        self.use_select = os.name != 'nt' and hasattr(serial_port, 'fileno')
+
+    def _wait(self):
+        if self.use_select:
+            try:
+                readable, _, _ = select.select([self.serial_port.fileno()], [], [], self.timeout)
+                if not readable:
+                    return b''
+                return self.serial_port.read(self.serial_port.in_waiting or 1)
+            except (ValueError, OSError, AttributeError):
+                # 不支援 fileno 的串口（例如 loop:// 或模擬器）改用阻塞讀取
+                self.use_select = False
+        # 串口的 timeout 也供 send_command 等其他讀取使用，讀完後還原
+        original = self.serial_port.timeout
+        if original != self.timeout:
+            self.serial_port.timeout = self.timeout
+        try:
+            return self.serial_port.read(self.serial_port.in_waiting or 1)
+        finally:
+            if original != self.timeout:
+                self.serial_port.timeout = original
+
+    def read_available(self):
+        """等待資料並一次取出所有可讀位元組，逾時傳回空位元組"""
+        data = self._wait()
+        self.wakeups += 1
+        if data:
+            waiting = self.serial_port.in_waiting
+            if waiting:
+                data += self.serial_port.read(waiting)
+            self.bytes_read += len(data)
+            self.timeout = self.min_timeout
+        else:
+            self.idle_wakeups += 1
+            self.timeout = min(self.timeout * self.backoff, self.max_timeout)
+        return data
+
+    def stats(self):
+        return {
+            'wakeups': self.wakeups,
+            'idle_wakeups': self.idle_wakeups,
+            'bytes_read': self.bytes_read,
+            'timeout': self.timeout
+        }
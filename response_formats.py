@@ -0,0 +1,112 @@
+"""API回應格式協商：JSON / MessagePack / 固定長度EPC二進位陣列
+
+用戶端可用 Accept 標頭或 ?format=json|msgpack|binary 指定格式。
+
+二進位格式 (application/vnd.rfid.epc-records):
+  標頭: 'EPC1' + uint16 記錄長度 + uint32 記錄數 (little-endian)
+  記錄: 固定長度EPC位元組，不足補0
+"""
+import json
+import struct
+from flask import Response, jsonify
+
+try:
+    import msgpack
+except ImportError:  # 未安裝時只提供JSON與二進位格式
+    msgpack = None
+
+MIME_JSON = 'application/json'
+MIME_MSGPACK = 'application/msgpack'
+MIME_MSGPACK_LEGACY = 'application/x-msgpack'
+MIME_EPC_RECORDS = 'application/vnd.rfid.epc-records'
+
+EPC_RECORD_SIZE = 12
+RECORDS_MAGIC = b'EPC1'
+RECORDS_HEADER = struct.Struct('<4sHI')
+
+FORMAT_NAMES = {
+    'json': MIME_JSON,
+    'msgpack': MIME_MSGPACK,
+    'binary': MIME_EPC_RECORDS
+}
+
+
+def negotiate(request):
+    """決定回應格式，傳回 'json' / 'msgpack' / 'binary'，無法提供時傳回None
+
+    Accept 明確列出支援的格式時依品質值選擇；只靠萬用字元比對到（例如瀏覽器送出的
+    text/html,...,*/*;q=0.8）或含無法解析的類型時回應JSON；
+    只有 Accept 列出的類型全都不支援（或被 q=0 排除）時才傳回None(406)。
+    """
+    name = request.args.get('format')
+    if name:
+        if name not in FORMAT_NAMES or (name == 'msgpack' and msgpack is None):
+            return None
+        return name
+
+    offered = [MIME_JSON, MIME_EPC_RECORDS]
+    if msgpack is not None:
+        offered[1:1] = [MIME_MSGPACK, MIME_MSGPACK_LEGACY]
+    accept = request.accept_mimetypes
+    if not accept:
+        return 'json'
+    refused = {value.lower() for value, quality in accept if quality <= 0}
+    offered = [mime for mime in offered if mime not in refused]
+    explicit = {value.lower() for value, quality in accept if quality > 0 and '*' not in value}
+    best = accept.best_match(offered)
+    if best is not None and best in explicit:
+        return _format_name(best)
+    # 沒有明確列出支援的格式：含萬用字元或無法解析的類型時優先JSON
+    if best is not None or any('*' in value or '/' not in value for value, quality in accept if quality > 0):
+        return 'json' if MIME_JSON in offered else _format_name(best)
+    return None
+
+
+def _format_name(mime):
+    if mime in (MIME_MSGPACK, MIME_MSGPACK_LEGACY):
+        return 'msgpack'
+    if mime == MIME_EPC_RECORDS:
+        return 'binary'
+    return 'json'
+
+
+def not_acceptable():
+    """無法提供要求的格式"""
+    body = json.dumps({"error": "不支援的回應格式", "formats": available_formats()}, ensure_ascii=False)
+    return Response(body, status=406, mimetype=MIME_JSON)
+
+
+def available_formats():
+    return [name for name in FORMAT_NAMES if name != 'msgpack' or msgpack is not None]
+
+
+def pack_epc_records(epcs, record_size=EPC_RECORD_SIZE):
+    """將EPC位元組列表打包成固定長度記錄陣列"""
+    body = bytearray(RECORDS_HEADER.pack(RECORDS_MAGIC, record_size, len(epcs)))
+    padding = b'\x00' * record_size
+    for epc in epcs:
+        body += bytes(epc[:record_size]) + padding[len(epc):]
+    return bytes(body)
+
+
+def unpack_epc_records(data):
+    """解開固定長度記錄陣列，傳回EPC位元組列表"""
+    magic, record_size, count = RECORDS_HEADER.unpack_from(data)
+    if magic != RECORDS_MAGIC:
+        raise ValueError("不是EPC記錄格式")
+    view = memoryview(data)[RECORDS_HEADER.size:]
+    return [bytes(view[i * record_size:(i + 1) * record_size]) for i in range(count)]
+
+
+def make_response(fmt, payload, epcs=None, status=200):
+    """依格式產生回應；binary 只輸出 epcs，msgpack 中的EPC保留為原始位元組"""
+    if fmt == 'binary':
+        response = Response(pack_epc_records(epcs or []), status=status, mimetype=MIME_EPC_RECORDS)
+    elif fmt == 'msgpack':
+        response = Response(msgpack.packb(payload, use_bin_type=True), status=status,
+                            mimetype=MIME_MSGPACK)
+    else:
+        response = jsonify(payload)
+        response.status_code = status
+    response.headers['Vary'] = 'Accept'
+    return response
@@ -0,0 +1,568 @@
+"""RFID 後端 API 的 Python 用戶端（同步與 asyncio 兩種版本，只使用標準函式庫）
+
+    client = RFIDClient('http://station-1:5000')
+    tag = client.read()                       # TagRecord(tag_id=..., product_id=..., year=...)
+    result = client.write('0123456789ABC')    # 自動帶冪等鍵，連線中斷重試不會重複編碼
+    future = client.submit_write('0123456789ABC', lock=True)   # 自動合併成 /write/batch
+    for event in client.events():             # OldBackend 的 /api/events/stream
+        print(event.epc, event.rssi)
+
+    async with AsyncRFIDClient('http://station-1:5000') as client:
+        tag = await client.read()
+
+- 連線池：同一個主機保留多條 HTTP/1.1 keep-alive 連線重複使用，伺服器關閉閒置連線時自動重連一次
+  （只重送 GET 等冪等方法或帶 Idempotency-Key 的請求；/write 與 /write/batch 一律帶冪等鍵）
+- 批次寫入：submit_write 放入佇列，累積到 batch_size 筆或等待 batch_interval 秒後
+  以一次 /write/batch 送出（未指定 target_epc 的項目由伺服器各綁定一張未寫入的標籤），
+  各筆結果分別回到自己的 Future
+- 事件串流：逐行讀取 NDJSON，讀取事件轉為 TagEvent，區域/過期等其他事件保留為 dict
+"""
+import asyncio
+import http.client
+import json
+import queue
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import Future
+from datetime import date
+from urllib.parse import urlencode, urlsplit
+
+# 與 Backend.parse_epc_data 傳回的欄位相同（legacy 格式另有 status）
+TAG_FIELDS = ('schema', 'tag_id', 'product_id', 'year', 'month', 'day', 'status', 'raw_data')
+EVENT_FIELDS = ('ts', 'epc', 'rssi', 'reader', 'antenna', 'count', 'type', 'extra')
+
+# 可安全重試的連線錯誤（伺服器已關閉 keep-alive 連線）
+RETRYABLE_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine,
+                    ConnectionResetError, BrokenPipeError, ConnectionAbortedError)
+# 伺服器可能已處理請求才斷線，只自動重送冪等的方法或帶冪等鍵的請求
+IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'))
+
+
+class RFIDClientError(Exception):
+    def __init__(self, message, status=None, payload=None):
+        super().__init__(message)
+        self.status = status
+        self.payload = payload
+
+
+class TagRecord(namedtuple('TagRecord', TAG_FIELDS, defaults=(None,) * len(TAG_FIELDS))):
+    """解析後的標籤資料"""
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{name: data.get(name) for name in cls._fields})
+
+    @property
+    def date(self):
+        try:
+            return date(self.year, self.month, self.day)
+        except (TypeError, ValueError):
+            return None
+
+
+class TagEvent(namedtuple('TagEvent', EVENT_FIELDS, defaults=(1, 'read', None))):
+    """事件串流中的一筆讀取"""
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, data):
+        extra = {key: value for key, value in data.items() if key not in cls._fields}
+        return cls(data.get('ts'), data.get('epc'), data.get('rssi'), data.get('reader'),
+                   data.get('antenna'), data.get('count', 1), data.get('type', 'read'), extra or None)
+
+
+def _parse_event(line):
+    """解析一行事件，空行（伺服器的保持連線）傳回None"""
+    line = line.strip()
+    if not line:
+        return None
+    event = json.loads(line)
+    if event.get('type', 'read') == 'read' and 'epc' in event:
+        return TagEvent.from_dict(event)
+    return event
+
+
+def _decode(status, body):
+    """解析JSON回應，HTTP錯誤或含 error 欄位時丟出 RFIDClientError"""
+    try:
+        payload = json.loads(body) if body else {}
+    except ValueError:
+        raise RFIDClientError(f"回應不是JSON (HTTP {status})", status, body)
+    if status >= 400 or (isinstance(payload, dict) and 'error' in payload):
+        message = payload.get('error') or payload.get('message') if isinstance(payload, dict) else None
+        raise RFIDClientError(message or f"HTTP {status}", status, payload)
+    return payload
+
+
+def _write_body(product_id, verify, lock, idempotency_key):
+    body = {'product_id': product_id, 'verify': verify, 'lock': lock}
+    return body, {'Idempotency-Key': idempotency_key or uuid.uuid4().hex}
+
+
+def _batch_body(items, lock, bind):
+    body = {'items': [{'product_id': item} if isinstance(item, str) else item for item in items],
+            'lock': lock}
+    if bind:
+        body['bind'] = True
+    return body
+
+
+def _batch_headers(idempotency_key=None):
+    """批次寫入的冪等鍵，重送同一批次時伺服器只重新編碼尚未成功的項目"""
+    return {'Idempotency-Key': idempotency_key or uuid.uuid4().hex}
+
+
+def _retry_safe(method, headers):
+    return method in IDEMPOTENT_METHODS or 'Idempotency-Key' in headers
+
+
+def _batch_item(product_id, lock, target_epc):
+    item = {'product_id': product_id, 'lock': lock}
+    if target_epc:
+        item['target_epc'] = target_epc
+    return item
+
+
+def _read_result(payload):
+    if not payload.get('success'):
+        raise RFIDClientError(payload.get('message') or "讀取失敗", payload=payload)
+    return TagRecord.from_dict(payload['data'])
+
+
+class ConnectionPool:
+    """同一主機的 keep-alive 連線池（執行緒安全）"""
+
+    def __init__(self, base_url, size=4, timeout=10.0):
+        parts = urlsplit(base_url)
+        self.https = parts.scheme == 'https'
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.https else 80)
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+        self.created = 0
+        self.reused = 0
+
+    def _connect(self, timeout=None):
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        self.created += 1
+        return cls(self.host, self.port, timeout=timeout or self.timeout)
+
+    def request(self, method, path, body=None, headers=None):
+        """送出請求並讀完回應，傳回 (status, 回應內容)"""
+        headers = dict(headers or {})
+        if body is not None:
+            body = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        self.slots.acquire()
+        try:
+            for attempt in range(2):
+                try:
+                    conn = self.idle.get_nowait()
+                    reused = True
+                except queue.Empty:
+                    conn = self._connect()
+                    reused = False
+                try:
+                    conn.request(method, self.prefix + path, body, headers)
+                    response = conn.getresponse()
+                    data = response.read()
+                except RETRYABLE_ERRORS:
+                    conn.close()
+                    # 重用的連線可能已被伺服器關閉，以新連線重試一次
+                    if reused and attempt == 0 and _retry_safe(method, headers):
+                        continue
+                    raise
+                except Exception:
+                    conn.close()
+                    raise
+                if response.will_close:
+                    conn.close()
+                else:
+                    self.reused += reused
+                    self.idle.put(conn)
+                return response.status, data
+        finally:
+            self.slots.release()
+
+    def stream(self, path, timeout=None):
+        """開啟獨立的長連線（不佔用連線池），傳回 (連線, 回應)"""
+        conn = self._connect(timeout)
+        conn.request('GET', self.prefix + path, headers={'Accept': 'application/x-ndjson'})
+        response = conn.getresponse()
+        if response.status >= 400:
+            body = response.read()
+            conn.close()
+            _decode(response.status, body)
+        return conn, response
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class RFIDClient:
+    def __init__(self, base_url='http://127.0.0.1:5000', pool_size=4, timeout=10.0,
+                 batch_size=20, batch_interval=0.05):
+        self.pool = ConnectionPool(base_url, pool_size, timeout)
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.pending = queue.Queue()
+        self.batch_thread = None
+        self.batch_lock = threading.Lock()
+        self.closed = False
+
+    def _call(self, method, path, body=None, headers=None):
+        status, data = self.pool.request(method, path, body, headers)
+        return _decode(status, data)
+
+    def read(self):
+        """讀取一張標籤"""
+        return _read_result(self._call('GET', '/read'))
+
+    def write(self, product_id, verify=False, lock=False, idempotency_key=None):
+        """寫入一張標籤；未指定冪等鍵時自動產生，連線中斷重試不會重複編碼"""
+        body, headers = _write_body(product_id, verify, lock, idempotency_key)
+        return self._call('POST', '/write', body, headers)
+
+    def write_batch(self, items, lock=False, idempotency_key=None, bind=False):
+        """以 /write/batch 一次編碼多張標籤，items 為 product_id 或 {'product_id':..., ...}
+
+        未指定冪等鍵時自動產生；以同一個鍵重送時已完成的項目不會重複編碼。
+        bind 為 True 時由伺服器為未指定 target_epc 的項目各綁定一張尚未寫入的標籤
+        """
+        return self._call('POST', '/write/batch', _batch_body(items, lock, bind),
+                          _batch_headers(idempotency_key))['results']
+
+    def submit_write(self, product_id, lock=False, target_epc=None):
+        """加入批次寫入佇列，傳回 Future（結果為該筆的編碼結果）"""
+        if self.closed:
+            raise RFIDClientError("用戶端已關閉")
+        future = Future()
+        self.pending.put((_batch_item(product_id, lock, target_epc), future))
+        with self.batch_lock:
+            if self.batch_thread is None:
+                self.batch_thread = threading.Thread(target=self._batch_loop, name='rfid-client-batch',
+                                                     daemon=True)
+                self.batch_thread.start()
+        return future
+
+    def _batch_loop(self):
+        while True:
+            entry = self.pending.get()
+            if entry is None:
+                return
+            batch = [entry]
+            deadline = time.monotonic() + self.batch_interval
+            while len(batch) < self.batch_size:
+                try:
+                    entry = self.pending.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if entry is None:
+                    self.pending.put(None)
+                    break
+                batch.append(entry)
+            self._send_batch(batch)
+
+    def _send_batch(self, batch):
+        try:
+            # 未指定 target_epc 的項目由伺服器各綁定一張尚未寫入的標籤
+            results = self._call('POST', '/write/batch', _batch_body([item for item, _ in batch], False, True),
+                                 _batch_headers())['results']
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def job(self, job_id):
+        return self._call('GET', f'/write/jobs/{job_id}')['job']
+
+    def job_by_key(self, key):
+        """以冪等鍵查詢寫入工作，伺服器沒有記錄時傳回None"""
+        status, data = self.pool.request('GET', '/write/jobs?' + urlencode({'key': key}))
+        if status == 404:
+            return None
+        return _decode(status, data)['job']
+
+    def health(self):
+        status, data = self.pool.request('GET', '/health')
+        return json.loads(data)
+
+    def tags(self, **filters):
+        """OldBackend /api/tags 查詢，自動翻頁逐筆產生標籤紀錄"""
+        filters = {key: value for key, value in filters.items() if value is not None}
+        while True:
+            payload = self._call('GET', '/api/tags?' + urlencode(filters))
+            yield from payload['data']
+            if not payload.get('next_cursor'):
+                return
+            filters['cursor'] = payload['next_cursor']
+
+    def events(self, path='/api/events/stream', timeout=60.0):
+        """逐筆產生 OldBackend 事件串流中的事件（TagEvent 或 dict）"""
+        conn, response = self.pool.stream(path, timeout)
+        try:
+            while True:
+                line = response.readline()
+                if not line:
+                    return
+                event = _parse_event(line)
+                if event is not None:
+                    yield event
+        finally:
+            conn.close()
+
+    def close(self):
+        """送出佇列中剩餘的批次寫入並關閉連線"""
+        self.closed = True
+        if self.batch_thread is not None:
+            self.pending.put(None)
+            self.batch_thread.join()
+        self.pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AsyncConnectionPool:
+    """asyncio 版 keep-alive 連線池（HTTP/1.1，支援 Content-Length 與 chunked 回應）"""
+
+    def __init__(self, base_url, size=4, timeout=10.0):
+        parts = urlsplit(base_url)
+        self.https = parts.scheme == 'https'
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.https else 80)
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self.idle = []
+        self.slots = asyncio.Semaphore(size)
+        self.created = 0
+        self.reused = 0
+
+    async def _connect(self):
+        self.created += 1
+        return await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=True if self.https else None), self.timeout)
+
+    async def _send(self, writer, method, path, body, headers):
+        lines = [f"{method} {self.prefix + path} HTTP/1.1", f"Host: {self.host}:{self.port}",
+                 "Connection: keep-alive"]
+        if body is not None:
+            lines.append(f"Content-Length: {len(body)}")
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + (body or b''))
+        await writer.drain()
+
+    @staticmethod
+    async def _read_head(reader):
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("伺服器已關閉連線")
+        parts = status_line.decode('latin-1').split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+            raise RFIDClientError(f"無效的回應: {status_line!r}")
+        version, status = parts[0], int(parts[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        will_close = (headers.get('connection', '').lower() == 'close'
+                      or (version == 'HTTP/1.0' and headers.get('connection', '').lower() != 'keep-alive'))
+        return status, headers, will_close
+
+    @staticmethod
+    async def _iter_body(reader, headers):
+        """依 chunked / Content-Length / 關閉連線 讀取回應內容"""
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size = int((await reader.readline()).split(b';')[0].strip(), 16)
+                if size == 0:
+                    # 略過 trailer
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    return
+                yield await reader.readexactly(size)
+                await reader.readexactly(2)
+        elif 'content-length' in headers:
+            length = int(headers['content-length'])
+            if length:
+                yield await reader.readexactly(length)
+        else:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    return
+                yield data
+
+    async def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        if body is not None:
+            body = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        async with self.slots:
+            for attempt in range(2):
+                reused = bool(self.idle)
+                reader, writer = self.idle.pop() if reused else await self._connect()
+                try:
+                    await self._send(writer, method, path, body, headers)
+                    status, response_headers, will_close = await asyncio.wait_for(
+                        self._read_head(reader), self.timeout)
+                    chunks = []
+                    async for chunk in self._iter_body(reader, response_headers):
+                        chunks.append(chunk)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if reused and attempt == 0 and _retry_safe(method, headers):
+                        continue
+                    raise
+                except BaseException:
+                    writer.close()
+                    raise
+                if will_close or 'content-length' not in response_headers \
+                        and response_headers.get('transfer-encoding', '').lower() != 'chunked':
+                    writer.close()
+                else:
+                    self.reused += reused
+                    self.idle.append((reader, writer))
+                return status, b''.join(chunks)
+
+    async def stream_lines(self, path):
+        """開啟獨立的長連線，逐行產生回應內容"""
+        reader, writer = await self._connect()
+        try:
+            await self._send(writer, 'GET', path, None, {'Accept': 'application/x-ndjson'})
+            status, headers, _ = await self._read_head(reader)
+            if status >= 400:
+                body = b''.join([chunk async for chunk in self._iter_body(reader, headers)])
+                _decode(status, body)
+            buffer = b''
+            async for chunk in self._iter_body(reader, headers):
+                buffer += chunk
+                *lines, buffer = buffer.split(b'\n')
+                for line in lines:
+                    yield line
+            if buffer:
+                yield buffer
+        finally:
+            writer.close()
+
+    def close(self):
+        for _, writer in self.idle:
+            writer.close()
+        self.idle = []
+
+
+class AsyncRFIDClient:
+    def __init__(self, base_url='http://127.0.0.1:5000', pool_size=4, timeout=10.0,
+                 batch_size=20, batch_interval=0.05):
+        self.pool = AsyncConnectionPool(base_url, pool_size, timeout)
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.pending = None
+        self.batch_task = None
+
+    async def _call(self, method, path, body=None, headers=None):
+        status, data = await self.pool.request(method, path, body, headers)
+        return _decode(status, data)
+
+    async def read(self):
+        return _read_result(await self._call('GET', '/read'))
+
+    async def write(self, product_id, verify=False, lock=False, idempotency_key=None):
+        body, headers = _write_body(product_id, verify, lock, idempotency_key)
+        return await self._call('POST', '/write', body, headers)
+
+    async def write_batch(self, items, lock=False, idempotency_key=None, bind=False):
+        return (await self._call('POST', '/write/batch', _batch_body(items, lock, bind),
+                                 _batch_headers(idempotency_key)))['results']
+
+    def submit_write(self, product_id, lock=False, target_epc=None):
+        """加入批次寫入佇列，傳回 asyncio.Future"""
+        if self.pending is None:
+            self.pending = asyncio.Queue()
+            self.batch_task = asyncio.ensure_future(self._batch_loop())
+        future = asyncio.get_running_loop().create_future()
+        self.pending.put_nowait((_batch_item(product_id, lock, target_epc), future))
+        return future
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            entry = await self.pending.get()
+            if entry is None:
+                return
+            batch = [entry]
+            deadline = loop.time() + self.batch_interval
+            while len(batch) < self.batch_size:
+                try:
+                    entry = await asyncio.wait_for(self.pending.get(), max(0.0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    break
+                if entry is None:
+                    self.pending.put_nowait(None)
+                    break
+                batch.append(entry)
+            try:
+                results = (await self._call('POST', '/write/batch',
+                                            _batch_body([item for item, _ in batch], False, True),
+                                            _batch_headers()))['results']
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    async def job(self, job_id):
+        return (await self._call('GET', f'/write/jobs/{job_id}'))['job']
+
+    async def health(self):
+        status, data = await self.pool.request('GET', '/health')
+        return json.loads(data)
+
+    async def tags(self, **filters):
+        filters = {key: value for key, value in filters.items() if value is not None}
+        while True:
+            payload = await self._call('GET', '/api/tags?' + urlencode(filters))
+            for record in payload['data']:
+                yield record
+            if not payload.get('next_cursor'):
+                return
+            filters['cursor'] = payload['next_cursor']
+
+    async def events(self, path='/api/events/stream'):
+        async for line in self.pool.stream_lines(path):
+            event = _parse_event(line)
+            if event is not None:
+                yield event
+
+    async def close(self):
+        if self.batch_task is not None:
+            self.pending.put_nowait(None)
+            await self.batch_task
+            self.batch_task = None
+        self.pool.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
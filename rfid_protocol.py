@@ -0,0 +1,268 @@
+"""RFID讀寫器通訊協定：封包組裝與解析
+
+封包格式: BB + Type + Command + PL(2) + Parameter + Checksum + 7E
+校驗和為 Type 到 Parameter 最後一個位元組的總和取低8位
+"""
+from collections import namedtuple
+
+HEADER = 0xBB
+END = 0x7E
+
+# 封包類型
+TYPE_COMMAND = 0x00
+TYPE_RESPONSE = 0x01
+TYPE_NOTICE = 0x02
+
+# 指令代碼
+CMD_GET_INFO = 0x03
+CMD_SET_SELECT = 0x0C
+CMD_SET_QUERY = 0x0E
+CMD_SET_BAUDRATE = 0x11
+CMD_SET_SELECT_MODE = 0x12
+CMD_SINGLE_POLL = 0x22
+CMD_MULTI_POLL = 0x27
+CMD_STOP_POLL = 0x28
+CMD_READ_MEMORY = 0x39
+CMD_WRITE_MEMORY = 0x49
+CMD_LOCK = 0x82
+CMD_SET_POWER = 0xB6
+CMD_ERROR = 0xFF
+
+# 記憶體區塊
+BANK_RESERVED = 0x00
+BANK_EPC = 0x01
+BANK_TID = 0x02
+BANK_USER = 0x03
+
+# Select模式
+SELECT_MODE_ALWAYS = 0x00
+SELECT_MODE_NONE = 0x01
+SELECT_MODE_EXCEPT_POLL = 0x02
+
+# 錯誤代碼
+ERROR_NO_TAG = 0x09
+ERROR_MESSAGES = {
+    0x09: "找不到標籤",
+    0x15: "寫入失敗",
+    0x16: "存取密碼不正確",
+    0x17: "標籤通訊錯誤",
+    0xA3: "超出晶片容量範圍"
+}
+
+# 鎖定區塊在Lock payload中的位置（由高位起算，每區塊2 bits）
+LOCK_BANK_SHIFT = {
+    'kill': 8,
+    'access': 6,
+    'epc': 4,
+    'tid': 2,
+    'user': 0
+}
+
+# 鎖定動作: (pwd-write, permalock)
+LOCK_ACTIONS = {
+    'unlock': 0b00,
+    'perma_unlock': 0b01,
+    'lock': 0b10,
+    'perma_lock': 0b11
+}
+
+# 單一封包參數長度上限，超過視為錯誤的標頭
+MAX_PARAM_LENGTH = 512
+
+Frame = namedtuple('Frame', ['type', 'command', 'params'])
+
+
+def calculate_checksum(data):
+    """計算校驗和"""
+    return sum(data) & 0xFF
+
+
+def build_frame(command, params=b'', frame_type=TYPE_COMMAND):
+    """組合完整封包（含校驗和與結束符）"""
+    params = bytes(params)
+    body = bytes([frame_type, command, len(params) >> 8, len(params) & 0xFF]) + params
+    return bytes([HEADER]) + body + bytes([calculate_checksum(body), END])
+
+
+def error_message(error_code):
+    """錯誤代碼轉換為說明文字"""
+    return ERROR_MESSAGES.get(error_code, f"未知錯誤(0x{error_code:02X})")
+
+
+def frame_error_code(frame):
+    """錯誤回應的錯誤代碼，不是錯誤回應時傳回None"""
+    if frame.command != CMD_ERROR:
+        return None
+    return frame.params[0] if frame.params else 0
+
+
+def frame_error(frame):
+    """若為錯誤回應則傳回錯誤說明，否則傳回None"""
+    if frame.command != CMD_ERROR:
+        return None
+    error_code = frame.params[0] if frame.params else 0
+    return error_message(error_code)
+
+
+def build_get_info(kind=0x00):
+    """查詢讀寫器資訊（0x00 硬體版本, 0x01 軟體版本, 0x02 製造商）"""
+    return build_frame(CMD_GET_INFO, [kind])
+
+
+def build_single_poll():
+    """單次盤點，每張讀到的標籤回傳一個盤點通知，沒有標籤時回傳錯誤"""
+    return build_frame(CMD_SINGLE_POLL)
+
+
+def build_set_baudrate(baudrate):
+    """設定串口鮑率，參數為鮑率/100，讀寫器回應後即切換"""
+    value = baudrate // 100
+    return build_frame(CMD_SET_BAUDRATE, [value >> 8, value & 0xFF])
+
+
+def build_select(epc, bank=BANK_EPC, pointer=0x20):
+    """設定Select參數，以EPC遮罩選取單一標籤"""
+    mask = bytes(epc)
+    params = bytes([
+        bank & 0x03,                        # Target=S0, Action=000, MemBank
+        (pointer >> 24) & 0xFF, (pointer >> 16) & 0xFF,
+        (pointer >> 8) & 0xFF, pointer & 0xFF,
+        len(mask) * 8,                      # MaskLen (bits)
+        0x00                                # Truncate
+    ]) + mask
+    return build_frame(CMD_SET_SELECT, params)
+
+
+def build_select_mode(mode):
+    """設定Select模式"""
+    return build_frame(CMD_SET_SELECT_MODE, [mode])
+
+
+def build_set_power(dbm):
+    """設定發射功率（單位 dBm，例如 26 或 26.5）"""
+    value = int(round(dbm * 100))
+    return build_frame(CMD_SET_POWER, [value >> 8, value & 0xFF])
+
+
+def build_set_query(q=4, session=0, target=0, sel=0):
+    """設定Query參數: DR=8, M=1, TRext=1, Sel, Session, Target, Q"""
+    if not 0 <= q <= 15:
+        raise ValueError("Q值必須介於0到15")
+    value = (1 << 12) | ((sel & 0x03) << 10) | ((session & 0x03) << 8) | ((target & 0x01) << 7) | (q << 3)
+    return build_frame(CMD_SET_QUERY, [value >> 8, value & 0xFF])
+
+
+def build_read_memory(bank, start_word, word_count, access_password=b'\x00\x00\x00\x00'):
+    """讀取標籤記憶體"""
+    params = bytes(access_password) + bytes([
+        bank,
+        start_word >> 8, start_word & 0xFF,
+        word_count >> 8, word_count & 0xFF
+    ])
+    return build_frame(CMD_READ_MEMORY, params)
+
+
+def build_write_memory(bank, start_word, data, access_password=b'\x00\x00\x00\x00'):
+    """寫入標籤記憶體（資料長度必須為偶數位元組）"""
+    data = bytes(data)
+    if len(data) % 2:
+        raise ValueError("寫入資料長度必須為字組(2 bytes)的倍數")
+    word_count = len(data) // 2
+    params = bytes(access_password) + bytes([
+        bank,
+        start_word >> 8, start_word & 0xFF,
+        word_count >> 8, word_count & 0xFF
+    ]) + data
+    return build_frame(CMD_WRITE_MEMORY, params)
+
+
+def build_lock_payload(banks, action='lock'):
+    """產生20 bits Lock payload（高10 bits為Mask，低10 bits為Action）"""
+    if action not in LOCK_ACTIONS:
+        raise ValueError(f"不支援的鎖定動作: {action}")
+    mask = 0
+    bits = 0
+    for bank in banks:
+        if bank not in LOCK_BANK_SHIFT:
+            raise ValueError(f"不支援的鎖定區塊: {bank}")
+        shift = LOCK_BANK_SHIFT[bank]
+        mask |= 0b11 << shift
+        bits |= LOCK_ACTIONS[action] << shift
+    return (mask << 10) | bits
+
+
+def build_lock(banks, action='lock', access_password=b'\x00\x00\x00\x00'):
+    """鎖定標籤記憶體區塊"""
+    payload = build_lock_payload(banks, action)
+    params = bytes(access_password) + payload.to_bytes(3, 'big')
+    return build_frame(CMD_LOCK, params)
+
+
+def parse_memory_response(frame):
+    """解析讀取記憶體回應: UL + PC + EPC + Data，傳回(PC+EPC, Data)"""
+    params = frame.params
+    ul = params[0]
+    return params[1:1 + ul], params[1 + ul:]
+
+
+def parse_poll_notice(frame):
+    """解析盤點通知: RSSI + PC + EPC + CRC"""
+    params = frame.params
+    rssi = params[0] - 256 if params[0] > 127 else params[0]
+    pc = (params[1] << 8) | params[2]
+    return {
+        'rssi': rssi,
+        'pc': pc,
+        'epc': params[3:-2]
+    }
+
+
+class FrameDecoder:
+    """串流封包解碼器，處理分段與黏包並於錯誤時重新同步"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.frame_count = 0
+        self.checksum_errors = 0
+        self.dropped_bytes = 0
+
+    def reset(self):
+        """清除緩衝資料"""
+        self.buffer.clear()
+
+    def feed(self, data):
+        """加入新收到的資料，傳回已完整解出的封包列表"""
+        buf = self.buffer
+        buf += data
+        frames = []
+        pos = 0
+        size = len(buf)
+        while True:
+            start = buf.find(HEADER, pos)
+            if start < 0:
+                self.dropped_bytes += size - pos
+                pos = size
+                break
+            self.dropped_bytes += start - pos
+            if size - start < 7:
+                pos = start
+                break
+            length = (buf[start + 3] << 8) | buf[start + 4]
+            if length > MAX_PARAM_LENGTH:
+                # 標頭不合理，跳過此位元組重新同步
+                self.checksum_errors += 1
+                pos = start + 1
+                continue
+            end = start + 7 + length
+            if end > size:
+                pos = start
+                break
+            if buf[end - 1] != END or calculate_checksum(buf[start + 1:end - 2]) != buf[end - 2]:
+                self.checksum_errors += 1
+                pos = start + 1
+                continue
+            frames.append(Frame(buf[start + 1], buf[start + 2], bytes(buf[start + 5:end - 2])))
+            pos = end
+        del buf[:pos]
+        self.frame_count += len(frames)
+        return frames
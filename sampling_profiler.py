@@ -0,0 +1,203 @@
+"""線上取樣分析器
+
+在執行中的後端開啟 N 秒取樣：背景執行緒每隔 interval 秒以 sys._current_frames()
+取得所有執行緒（Flask 請求、串口讀取、盤點管線…）目前的呼叫堆疊並計數，
+結束後輸出 collapsed stack 格式（每行「執行緒;外層函式;…;內層函式 次數」，
+可直接給 flamegraph.pl / speedscope），以及每個執行緒在期間內使用的CPU時間。
+
+不修改被分析的程式、不使用 sys.setprofile，負擔只有取樣執行緒本身
+（預設 200Hz，結果中附上取樣執行緒自己的CPU時間）；同一時間只允許一個取樣。
+各執行緒CPU時間在 Linux / macOS 以 pthread_getcpuclockid、Windows 以 GetThreadTimes 取得，
+其他平台 thread_cpu_supported 為 false。
+"""
+import hmac
+import ipaddress
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+MAX_SECONDS = 60.0
+MIN_INTERVAL = 0.001
+
+_active = threading.Lock()
+
+
+if sys.platform == 'win32':
+    import ctypes
+    from ctypes import wintypes
+
+    THREAD_QUERY_LIMITED_INFORMATION = 0x0800
+    _kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    _kernel32.OpenThread.restype = wintypes.HANDLE
+    _kernel32.OpenThread.argtypes = (wintypes.DWORD, wintypes.BOOL, wintypes.DWORD)
+    _kernel32.GetThreadTimes.argtypes = (wintypes.HANDLE,) + (ctypes.POINTER(wintypes.FILETIME),) * 4
+    _kernel32.CloseHandle.argtypes = (wintypes.HANDLE,)
+
+    def _thread_cpu_clock(thread):
+        """執行緒的 handle（Windows 以 GetThreadTimes 取得CPU時間），無法開啟時傳回None"""
+        native_id = getattr(thread, 'native_id', None)
+        if native_id is None:
+            return None
+        return _kernel32.OpenThread(THREAD_QUERY_LIMITED_INFORMATION, False, native_id) or None
+
+    def _cpu_time(clock):
+        times = [wintypes.FILETIME() for _ in range(4)]
+        if not _kernel32.GetThreadTimes(clock, *(ctypes.byref(item) for item in times)):
+            return None
+        # 核心 + 使用者時間，單位 100ns
+        return sum((item.dwHighDateTime << 32 | item.dwLowDateTime) for item in times[2:]) / 1e7
+
+    def _release_clock(clock):
+        _kernel32.CloseHandle(clock)
+else:
+    def _thread_cpu_clock(thread):
+        """執行緒的CPU時鐘（Linux / macOS），不支援時傳回None"""
+        try:
+            return time.pthread_getcpuclockid(thread.ident)
+        except (AttributeError, OSError, OverflowError):
+            return None
+
+    def _cpu_time(clock):
+        try:
+            return time.clock_gettime(clock)
+        except OSError:
+            # 執行緒已結束
+            return None
+
+    def _release_clock(clock):
+        pass
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    def __init__(self, interval=0.005, max_depth=64):
+        self.interval = max(float(interval), MIN_INTERVAL)
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.thread_samples = Counter()
+        self.samples = 0
+        self.labels = {}
+
+    def _label(self, code):
+        label = self.labels.get(code)
+        if label is None:
+            label = self.labels[code] = _frame_label(code)
+        return label
+
+    def _sample(self, own_ident, names):
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            stack.reverse()
+            self.stacks[';'.join(stack)] += 1
+            self.thread_samples[ident] += 1
+        self.samples += 1
+
+    def run(self, seconds):
+        """取樣 seconds 秒，傳回結果；已有取樣進行中時丟出 RuntimeError"""
+        seconds = min(max(float(seconds), self.interval), MAX_SECONDS)
+        if not _active.acquire(blocking=False):
+            raise RuntimeError("已有取樣進行中")
+        clocks = {}
+        own_clock = None
+        try:
+            own_ident = threading.get_ident()
+            own_clock = _thread_cpu_clock(threading.current_thread())
+            own_start = _cpu_time(own_clock) if own_clock is not None else None
+            cpu_start = {}
+            names = {}
+            process_start = time.process_time()
+            started = time.monotonic()
+            deadline = started + seconds
+            next_sample = started
+            while True:
+                # 每次取樣前更新執行緒列表，期間新建立的執行緒也會列入
+                for thread in threading.enumerate():
+                    ident = thread.ident
+                    if ident is None or ident in names:
+                        continue
+                    names[ident] = thread.name
+                    clock = _thread_cpu_clock(thread)
+                    if clock is not None:
+                        clocks[ident] = clock
+                        cpu_start[ident] = _cpu_time(clock)
+                self._sample(own_ident, names)
+                next_sample += self.interval
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                if next_sample > now:
+                    time.sleep(min(next_sample - now, deadline - now))
+                else:
+                    # 落後時不補取樣，避免負載高時取樣執行緒佔用更多CPU
+                    next_sample = now
+            elapsed = time.monotonic() - started
+            threads = []
+            for ident, name in names.items():
+                if ident == own_ident:
+                    continue
+                cpu = None
+                if ident in clocks and cpu_start[ident] is not None:
+                    end = _cpu_time(clocks[ident])
+                    if end is not None:
+                        cpu = round(end - cpu_start[ident], 4)
+                threads.append({
+                    'name': name,
+                    'ident': ident,
+                    'samples': self.thread_samples.get(ident, 0),
+                    'cpu_seconds': cpu
+                })
+            threads.sort(key=lambda item: item['cpu_seconds'] or 0, reverse=True)
+            own_cpu = None
+            if own_start is not None:
+                own_end = _cpu_time(own_clock)
+                own_cpu = round(own_end - own_start, 4) if own_end is not None else None
+            return {
+                'seconds': round(elapsed, 3),
+                'interval': self.interval,
+                'samples': self.samples,
+                'process_cpu_seconds': round(time.process_time() - process_start, 4),
+                'profiler_cpu_seconds': own_cpu,
+                # 平台不支援各執行緒CPU時間時，cpu_seconds 皆為None
+                'thread_cpu_supported': own_clock is not None,
+                'threads': threads
+            }
+        finally:
+            for clock in clocks.values():
+                _release_clock(clock)
+            if own_clock is not None:
+                _release_clock(own_clock)
+            _active.release()
+
+    def collapsed(self):
+        """collapsed stack 格式文字"""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def profile(seconds=10.0, interval=0.005):
+    """取樣 seconds 秒，傳回 (統計資料, collapsed stack 文字)"""
+    profiler = SamplingProfiler(interval)
+    summary = profiler.run(seconds)
+    return summary, profiler.collapsed()
+
+
+def authorized(request):
+    """設定環境變數 RFID_ADMIN_TOKEN 時需以 X-Admin-Token 標頭提供相同的值，
+    未設定時只允許本機（loopback）連線"""
+    token = os.environ.get('RFID_ADMIN_TOKEN')
+    if token:
+        return hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode(), token.encode())
+    try:
+        return ipaddress.ip_address(request.remote_addr or '').is_loopback
+    except ValueError:
+        return False
@@ -0,0 +1,156 @@
+"""串口連線監控與自動重連
+
+發生I/O錯誤、連續命令逾時或盤點中長時間沒有資料時，關閉串口並以指數退避重新連線；
+連線成功後依序重送已記錄的讀寫器設定（Select、功率、Q值），再通知註冊的回呼
+（例如恢復盤點），其他執行緒只會拿到已完成設定的串口。
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import serial
+
+
+class SerialSupervisor:
+    def __init__(self, port, baudrate, timeout=1, min_backoff=0.5, max_backoff=30.0,
+                 max_timeouts=3, stall_timeout=30.0, serial_factory=None, config_frames=None):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.max_timeouts = max_timeouts
+        self.stall_timeout = stall_timeout
+        self.serial_factory = serial_factory or serial.Serial
+        self.serial = None
+        self.state = 'connecting'
+        # 取代舊的監控器時沿用已記錄的設定，第一次連線就會重送
+        self.config_frames = OrderedDict(config_frames or ())
+        self.connect_callbacks = []
+        self.expect_data = False
+        self.connected = threading.Event()
+        self.wake = threading.Event()
+        self.lock = threading.Lock()
+        self.closed = False
+        self.connects = 0
+        self.failures = 0
+        self.consecutive_timeouts = 0
+        self.backoff = min_backoff
+        self.last_error = None
+        self.last_rx = time.monotonic()
+        self.connected_since = None
+        self.thread = threading.Thread(target=self._run, name=f"supervisor-{port}")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def remember(self, name, frame):
+        """記錄設定命令，重新連線後會依序重送"""
+        self.config_frames[name] = bytes(frame)
+        self.config_frames.move_to_end(name)
+
+    def forget(self, name):
+        """移除記錄的設定命令"""
+        self.config_frames.pop(name, None)
+
+    def add_connect_callback(self, callback):
+        """註冊連線完成回呼 callback(serial)，在其他執行緒取得串口前執行"""
+        self.connect_callbacks.append(callback)
+
+    def wait_connected(self, timeout=None):
+        """等待連線完成，傳回串口物件，逾時傳回None"""
+        if self.connected.wait(timeout):
+            return self.serial
+        return None
+
+    def record_rx(self):
+        """收到資料時呼叫"""
+        self.last_rx = time.monotonic()
+        self.consecutive_timeouts = 0
+
+    def record_timeout(self):
+        """命令逾時時呼叫，連續多次視為連線異常"""
+        self.consecutive_timeouts += 1
+        if self.consecutive_timeouts >= self.max_timeouts:
+            self.report_error(TimeoutError(f"讀寫器連續 {self.consecutive_timeouts} 次無回應"))
+
+    def report_error(self, error):
+        """回報I/O錯誤，關閉串口並排程重新連線"""
+        with self.lock:
+            self.last_error = str(error)
+            if self.serial is None:
+                return
+            self.connected.clear()
+            self.state = 'reconnecting'
+            try:
+                self.serial.close()
+            except Exception:
+                pass
+            self.serial = None
+            self.connected_since = None
+        self.wake.set()
+
+    def _open(self):
+        ser = self.serial_factory(self.port, self.baudrate, timeout=self.timeout)
+        # 重送設定並丟棄回應
+        for frame in self.config_frames.values():
+            ser.write(frame)
+            time.sleep(0.05)
+        if self.config_frames:
+            ser.reset_input_buffer()
+        for callback in self.connect_callbacks:
+            callback(ser)
+        return ser
+
+    def _run(self):
+        while not self.closed:
+            if self.connected.is_set():
+                self.wake.wait(1.0)
+                self.wake.clear()
+                idle = time.monotonic() - self.last_rx
+                if self.expect_data and self.stall_timeout and idle > self.stall_timeout:
+                    self.report_error(TimeoutError(f"盤點中 {idle:.0f} 秒未收到資料"))
+                continue
+            try:
+                ser = self._open()
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                self.state = 'reconnecting'
+                self.wake.wait(self.backoff)
+                self.wake.clear()
+                self.backoff = min(self.backoff * 2, self.max_backoff)
+                continue
+            with self.lock:
+                self.serial = ser
+                self.state = 'connected'
+                self.connects += 1
+                self.backoff = self.min_backoff
+                self.consecutive_timeouts = 0
+                self.last_rx = time.monotonic()
+                self.connected_since = time.time()
+                self.connected.set()
+
+    def health(self):
+        return {
+            'port': self.port,
+            'state': self.state,
+            'connected': self.connected.is_set(),
+            'connected_since': self.connected_since,
+            'connects': self.connects,
+            'reconnects': max(0, self.connects - 1),
+            'failures': self.failures,
+            'last_error': self.last_error,
+            'next_backoff': self.backoff,
+            'last_rx_age': round(time.monotonic() - self.last_rx, 1),
+            'config': list(self.config_frames)
+        }
+
+    def close(self):
+        self.closed = True
+        self.wake.set()
+        with self.lock:
+            self.connected.clear()
+            if self.serial is not None:
+                self.serial.close()
+                self.serial = None
+            self.state = 'closed'
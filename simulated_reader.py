@@ -0,0 +1,262 @@
+"""模擬讀寫器
+
+提供與 serial.Serial 相同的介面（write / read / in_waiting / timeout），
+可直接作為 SerialSupervisor 的 serial_factory，不接硬體也能執行後端與壓力測試。
+
+讀寫器一次只處理一個命令：命令依序排入佇列，由背景執行緒模擬空中介面與
+串口傳輸時間後放入接收緩衝；多次盤點期間沒有命令時持續送出盤點通知。
+同一個串口名稱的標籤資料共用，串口重新開啟後寫入的EPC仍然存在。
+"""
+import functools
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import rfid_protocol as proto
+from epc_schema import registry as epc_schemas
+
+DEFAULT_PC = b'\x30\x00'
+
+# 各命令的空中介面處理時間（秒）
+AIR_TIME = {
+    proto.CMD_SINGLE_POLL: 0.005,
+    proto.CMD_READ_MEMORY: 0.008,
+    proto.CMD_WRITE_MEMORY: 0.015,
+    proto.CMD_LOCK: 0.010
+}
+
+
+class TagField:
+    """讀寫器天線範圍內的標籤"""
+
+    def __init__(self, count=50, seed=None):
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.tags = []
+        for index in range(count):
+            epc = epc_schemas.encode('standard', tag_id=f"{index & 0xFFFF:04X}",
+                                     product_id=f"{self.random.getrandbits(52):013X}",
+                                     year=2024, month=self.random.randint(1, 12),
+                                     day=self.random.randint(1, 28))
+            # TID: 廠商代碼 E280 + 型號 + 48位元序號，唯讀
+            tid = bytes.fromhex('E2801105') + bytes([0x20, 0x00]) + self.random.getrandbits(48).to_bytes(6, 'big')
+            self.tags.append({'epc': bytearray.fromhex(epc), 'tid': tid, 'user': bytearray(64)})
+
+    def pick(self, mask=None):
+        """依Select遮罩挑選標籤，沒有符合的傳回None"""
+        with self.lock:
+            if mask:
+                for tag in self.tags:
+                    if tag['epc'].startswith(mask):
+                        return tag
+                return None
+            return self.random.choice(self.tags) if self.tags else None
+
+
+_fields = {}
+_fields_lock = threading.Lock()
+
+
+def tag_field(port, count=50, seed=None):
+    """取得串口對應的標籤資料（第一次呼叫時建立）"""
+    with _fields_lock:
+        if port not in _fields:
+            _fields[port] = TagField(count, seed)
+        return _fields[port]
+
+
+def factory_from_env():
+    """設定環境變數 RFID_SIMULATE 時傳回模擬讀寫器工廠，否則傳回None（使用實體串口）"""
+    if not os.environ.get('RFID_SIMULATE'):
+        return None
+    return functools.partial(
+        SimulatedReader,
+        tags=int(os.environ.get('RFID_SIMULATE_TAGS', 50)),
+        write_failure_rate=float(os.environ.get('RFID_SIMULATE_WRITE_FAILURES', 0)))
+
+
+class SimulatedReader:
+    def __init__(self, port='SIM', baudrate=115200, timeout=1, tags=50,
+                 write_failure_rate=0.0, poll_interval=0.005, seed=None):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.field = tag_field(port, tags, seed)
+        self.write_failure_rate = write_failure_rate
+        self.poll_interval = poll_interval
+        self.random = random.Random(seed)
+        self.is_open = True
+        self.decoder = proto.FrameDecoder()
+        self.commands = deque()
+        self.rx = bytearray()
+        self.cond = threading.Condition()
+        self.select_mask = None
+        self.select_mode = proto.SELECT_MODE_ALWAYS
+        self.inventory_remaining = 0
+        self.command_count = 0
+        self.notice_count = 0
+        self.max_queue = 0
+        self.busy_time = 0.0
+        self.thread = threading.Thread(target=self._run, name=f"simulated-{port}")
+        self.thread.daemon = True
+        self.thread.start()
+
+    # 串口介面
+
+    @property
+    def in_waiting(self):
+        return len(self.rx)
+
+    def write(self, data):
+        if not self.is_open:
+            raise OSError("模擬串口已關閉")
+        with self.cond:
+            self.commands.extend(self.decoder.feed(data))
+            self.max_queue = max(self.max_queue, len(self.commands))
+            self.cond.notify_all()
+        return len(data)
+
+    def read(self, size=1):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self.cond:
+            while len(self.rx) < size and self.is_open:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+            data = bytes(self.rx[:size])
+            del self.rx[:size]
+            return data
+
+    def reset_input_buffer(self):
+        with self.cond:
+            self.rx.clear()
+
+    def reset_output_buffer(self):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        with self.cond:
+            self.is_open = False
+            self.cond.notify_all()
+
+    # 讀寫器行為
+
+    def _deliver(self, frame, air_time=0.0):
+        # 空中介面時間加上串口傳輸時間（每位元組10 bits）
+        delay = air_time + len(frame) * 10 / self.baudrate
+        time.sleep(delay)
+        self.busy_time += delay
+        with self.cond:
+            self.rx += frame
+            self.cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.is_open and not self.commands and not self.inventory_remaining:
+                    self.cond.wait()
+                if not self.is_open:
+                    return
+                frame = self.commands.popleft() if self.commands else None
+            if frame is None:
+                self._inventory_round()
+                continue
+            self.command_count += 1
+            response = self._handle(frame)
+            if response is not None:
+                self._deliver(response, AIR_TIME.get(frame.command, 0.001))
+
+    def _inventory_round(self):
+        self.inventory_remaining -= 1
+        tag = self.field.pick()
+        if tag is not None:
+            self.notice_count += 1
+            self._deliver(self._notice(tag), self.poll_interval)
+
+    def _notice(self, tag):
+        rssi = self.random.randint(-75, -40) & 0xFF
+        params = bytes([rssi]) + DEFAULT_PC + bytes(tag['epc']) + b'\x00\x00'
+        return proto.build_frame(proto.CMD_SINGLE_POLL, params, proto.TYPE_NOTICE)
+
+    def _reply(self, command, params=b'\x00'):
+        return proto.build_frame(command, params, proto.TYPE_RESPONSE)
+
+    def _error(self, code):
+        return proto.build_frame(proto.CMD_ERROR, [code], proto.TYPE_RESPONSE)
+
+    def _tag_header(self, tag):
+        pc_epc = DEFAULT_PC + bytes(tag['epc'])
+        return bytes([len(pc_epc)]) + pc_epc
+
+    def _handle(self, frame):
+        command = frame.command
+        params = frame.params
+        if command == proto.CMD_GET_INFO:
+            return self._reply(command, bytes(params[:1]) + b'M100 simulated')
+        if command == proto.CMD_SINGLE_POLL:
+            tag = self.field.pick()
+            return self._notice(tag) if tag is not None else self._error(0x15)
+        if command == proto.CMD_MULTI_POLL:
+            self.inventory_remaining = (params[1] << 8) | params[2] if len(params) >= 3 else 0
+            return None
+        if command == proto.CMD_STOP_POLL:
+            self.inventory_remaining = 0
+            return self._reply(command)
+        if command == proto.CMD_SET_SELECT:
+            mask_length = params[5] // 8 if len(params) > 5 else 0
+            self.select_mask = bytes(params[7:7 + mask_length]) or None
+            return self._reply(command)
+        if command == proto.CMD_SET_SELECT_MODE:
+            self.select_mode = params[0] if params else proto.SELECT_MODE_ALWAYS
+            return self._reply(command)
+        if command in (proto.CMD_SET_POWER,
+                       proto.CMD_SET_QUERY, proto.CMD_SET_BAUDRATE):
+            return self._reply(command)
+        if command in (proto.CMD_READ_MEMORY, proto.CMD_WRITE_MEMORY, proto.CMD_LOCK):
+            mask = None if self.select_mode == proto.SELECT_MODE_NONE else self.select_mask
+            tag = self.field.pick(mask)
+            if tag is None:
+                return self._error(0x09)
+            if command == proto.CMD_LOCK:
+                return self._reply(command, self._tag_header(tag) + b'\x00')
+            bank = params[4]
+            start = (params[5] << 8) | params[6]
+            words = (params[7] << 8) | params[8]
+            return self._memory(command, tag, bank, start, words, bytes(params[9:]))
+        return self._error(0x17)
+
+    def _memory(self, command, tag, bank, start, words, data):
+        if bank == proto.BANK_EPC:
+            memory, offset = tag['epc'], (start - 2) * 2
+        elif bank == proto.BANK_USER:
+            memory, offset = tag['user'], start * 2
+        elif bank == proto.BANK_TID and command == proto.CMD_READ_MEMORY:
+            memory, offset = tag['tid'], start * 2
+        else:
+            return self._error(0xA3)
+        end = offset + words * 2
+        if offset < 0 or end > len(memory):
+            return self._error(0xA3)
+        if command == proto.CMD_READ_MEMORY:
+            return self._reply(command, self._tag_header(tag) + bytes(memory[offset:end]))
+        if self.random.random() < self.write_failure_rate:
+            return self._error(0x15)
+        header = self._tag_header(tag)
+        with self.field.lock:
+            memory[offset:end] = data[:end - offset]
+        return self._reply(command, header + b'\x00')
+
+    def stats(self):
+        return {
+            'port': self.port,
+            'commands': self.command_count,
+            'notices': self.notice_count,
+            'max_queue': self.max_queue,
+            'busy_time': round(self.busy_time, 3)
+        }
@@ -0,0 +1,231 @@
+"""前端靜態檔案服務
+
+取代每次請求都 send_file 讀檔、沒有快取標頭的作法：
+- 檔案第一次被請求時讀入記憶體，之後直接由記憶體回應（檔案修改時間改變才重新讀取）
+- 預先壓縮：優先使用建置時產生的 .br / .gz，沒有時於載入時以 gzip（及 brotli，若已安裝）壓縮一次
+- ETag + If-None-Match 回應 304；Vite 建置的 assets/ 檔名含雜湊，設為 immutable 長期快取，
+  index.html 等其他檔案則每次重新驗證
+- 找不到且不像檔案的路徑回傳 index.html（前端路由）
+
+可掛到 Frontendserver.py，也可由環境變數 RFID_STATIC_ROOT 掛到 API 同一個行程：
+
+    python static_assets.py my-rfid-app/dist     建置後預先壓縮
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import sys
+import threading
+import time
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+IMMUTABLE_DIRS = ('assets/',)
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json',
+                      'application/xml', 'image/svg+xml', 'application/manifest+json')
+MIN_COMPRESS_SIZE = 1024
+
+
+def _compressible(content_type):
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def _accepted_encodings(header):
+    """解析 Accept-Encoding，傳回接受的編碼集合（q=0 視為不接受）"""
+    accepted = set()
+    for item in (header or '').split(','):
+        name, _, params = item.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        params = params.replace(' ', '')
+        if params.startswith('q='):
+            try:
+                if float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name)
+    return accepted
+
+
+class StaticAsset:
+    def __init__(self, path, relative):
+        stat = os.stat(path)
+        self.mtime = stat.st_mtime_ns
+        with open(path, 'rb') as f:
+            self.body = f.read()
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/') or self.content_type == 'application/javascript':
+            self.content_type += '; charset=utf-8'
+        self.etag = hashlib.sha1(self.body).hexdigest()[:20]
+        self.immutable = relative.startswith(IMMUTABLE_DIRS)
+        self.variants = {}
+        if _compressible(self.content_type) and len(self.body) >= MIN_COMPRESS_SIZE:
+            self.variants['br'] = self._variant(path + '.br', lambda data: brotli.compress(data) if brotli else None)
+            self.variants['gzip'] = self._variant(path + '.gz', lambda data: gzip.compress(data, 9, mtime=0))
+            self.variants = {name: body for name, body in self.variants.items()
+                             if body is not None and len(body) < len(self.body)}
+
+    def _variant(self, precompressed_path, compress):
+        """使用較新的預先壓縮檔，否則即時壓縮一次"""
+        try:
+            if os.stat(precompressed_path).st_mtime_ns >= self.mtime:
+                with open(precompressed_path, 'rb') as f:
+                    return f.read()
+        except OSError:
+            pass
+        return compress(self.body)
+
+    def cache_control(self):
+        if self.immutable:
+            return 'public, max-age=31536000, immutable'
+        return 'no-cache'
+
+    def response(self):
+        headers = {
+            'ETag': f'"{self.etag}"',
+            'Cache-Control': self.cache_control(),
+            'Vary': 'Accept-Encoding'
+        }
+        if self.etag in request.headers.get('If-None-Match', ''):
+            return Response(status=304, headers=headers)
+        body = self.body
+        accepted = _accepted_encodings(request.headers.get('Accept-Encoding'))
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and encoding in accepted:
+                body = self.variants[encoding]
+                headers['Content-Encoding'] = encoding
+                break
+        headers['Content-Length'] = str(len(body))
+        return Response(body, status=200, headers=headers, content_type=self.content_type)
+
+
+class StaticSite:
+    """指定目錄的靜態檔案與記憶體快取"""
+
+    def __init__(self, root, index='index.html', check_interval=2.0, only=None):
+        self.root = os.path.realpath(root)
+        self.index = index
+        # only: 只允許提供的相對路徑（根目錄不是專用的建置目錄時使用）
+        self.only = set(only) if only else None
+        self.check_interval = check_interval
+        self.cache = {}
+        self.checked = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+
+    def _resolve(self, relative):
+        if self.only is not None and relative not in self.only:
+            return None
+        path = os.path.realpath(os.path.join(self.root, relative))
+        # 禁止以 .. 跳出根目錄
+        if path != self.root and not path.startswith(self.root + os.sep):
+            return None
+        return path if os.path.isfile(path) else None
+
+    def get(self, relative):
+        """取得檔案（記憶體快取），不存在傳回None"""
+        asset = self.cache.get(relative)
+        now = time.monotonic()
+        if asset is not None and (asset.immutable or now - self.checked[relative] < self.check_interval):
+            self.hits += 1
+            return asset
+        path = self._resolve(relative)
+        if path is None:
+            return None
+        if asset is not None and os.stat(path).st_mtime_ns == asset.mtime:
+            self.checked[relative] = now
+            self.hits += 1
+            return asset
+        asset = StaticAsset(path, relative)
+        with self.lock:
+            self.cache[relative] = asset
+            self.checked[relative] = now
+            self.loads += 1
+        return asset
+
+    def serve(self, relative=''):
+        relative = relative.lstrip('/') or self.index
+        asset = self.get(relative)
+        if asset is None:
+            # 沒有副檔名的路徑視為前端路由，回傳 index.html（API路徑除外）
+            if '.' in os.path.basename(relative) or relative.startswith('api/'):
+                return Response('Not Found', status=404)
+            asset = self.get(self.index)
+            if asset is None:
+                return Response('Not Found', status=404)
+        return asset.response()
+
+    def stats(self):
+        return {
+            'root': self.root,
+            'files': len(self.cache),
+            'bytes': sum(len(asset.body) + sum(len(body) for body in asset.variants.values())
+                         for asset in self.cache.values()),
+            'hits': self.hits,
+            'loads': self.loads,
+            'brotli': brotli is not None
+        }
+
+
+def register(app, root, url_prefix='', only=None):
+    """將靜態網站掛到 Flask app；API 的固定路由優先於這裡的萬用路由"""
+    site = StaticSite(root, only=only)
+
+    def serve_index():
+        return site.serve()
+
+    def serve_path(path):
+        return site.serve(path)
+
+    app.add_url_rule(f'{url_prefix}/', 'static_site_index', serve_index, methods=['GET', 'HEAD'])
+    app.add_url_rule(f'{url_prefix}/<path:path>', 'static_site', serve_path, methods=['GET', 'HEAD'])
+    return site
+
+
+def register_from_env(app):
+    """設定環境變數 RFID_STATIC_ROOT 時，由 API 行程一併提供前端"""
+    root = os.environ.get('RFID_STATIC_ROOT')
+    if not root:
+        return None
+    if not os.path.isdir(root):
+        print(f"找不到前端目錄: {root}")
+        return None
+    return register(app, root)
+
+
+def precompress(root):
+    """建置後為可壓縮的檔案產生 .gz 與 .br（需安裝 brotli）"""
+    count = 0
+    for directory, _, files in os.walk(root):
+        for name in files:
+            if name.endswith(('.gz', '.br')):
+                continue
+            path = os.path.join(directory, name)
+            content_type = mimetypes.guess_type(path)[0] or ''
+            if not _compressible(content_type) or os.path.getsize(path) < MIN_COMPRESS_SIZE:
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            with open(path + '.gz', 'wb') as f:
+                f.write(gzip.compress(data, 9, mtime=0))
+            if brotli is not None:
+                with open(path + '.br', 'wb') as f:
+                    f.write(brotli.compress(data))
+            count += 1
+    return count
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print("用法: python static_assets.py <前端建置目錄>")
+        sys.exit(1)
+    print(f"已壓縮 {precompress(sys.argv[1])} 個檔案" + ("" if brotli else "（未安裝 brotli，只產生 .gz）"))
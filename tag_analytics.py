@@ -0,0 +1,327 @@
+"""標籤讀取紀錄離線分析工具
+
+支援兩種輸入：
+  事件紀錄 (.jsonl / .csv)：每筆包含 ts, epc, rssi, reader, antenna
+  讀寫器擷取檔 (.cap)：每行為「時間戳 十六進位原始資料」，以封包解碼器還原盤點通知
+
+檔案依行切成區塊，由多個行程平行解析成欄位陣列後彙總，最後合併：
+  - 各產品ID / 各編碼日期的讀取次數與標籤數
+  - 每張標籤的停留時間 (最後讀取 - 首次讀取)
+  - 每秒讀取率分佈
+  - 重複EPC報告（同一UUID出現在不同EPC、同一EPC被多台讀寫器讀到）
+
+用法:
+  python tag_analytics.py events.jsonl [更多檔案...] --workers 8 --chunk-mb 64
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from array import array
+from collections import Counter
+from multiprocessing import Pool
+
+import rfid_protocol as proto
+import hex_codec
+from inventory import decode_epc
+
+# 停留時間分佈區間（秒）
+DWELL_BUCKETS = [1, 5, 10, 30, 60, 300, 900, 3600, 86400]
+
+
+def parse_epc_fields(epc):
+    """依 parse_epc_data 的格式解析EPC，傳回 (tag_id, product_id, 日期字串)，格式不符傳回None"""
+    fields = decode_epc(epc)
+    if fields is None:
+        return None
+    return (fields['tag_id'], fields['product_id'],
+            f"{fields['year']:04d}-{fields['month']:02d}-{fields['day']:02d}")
+
+
+def split_chunks(path, chunk_size):
+    """將檔案切成以換行對齊的 (起點, 終點) 區塊"""
+    size = os.path.getsize(path)
+    chunks = []
+    with open(path, 'rb') as f:
+        start = 0
+        while start < size:
+            end = min(start + chunk_size, size)
+            if end < size:
+                f.seek(end)
+                f.readline()
+                end = f.tell()
+            chunks.append((path, start, end))
+            start = end
+    return chunks
+
+
+def _columns_from_jsonl(lines):
+    """JSONL 轉換為欄位陣列"""
+    ts, epcs, rssi, readers = array('d'), [], array('h'), []
+    errors = 0
+    loads = json.loads
+    for line in lines:
+        if not line:
+            continue
+        try:
+            event = loads(line)
+            ts.append(float(event['ts']))
+            epcs.append(event['epc'].upper())
+            rssi.append(int(event.get('rssi', 0)))
+            readers.append(str(event.get('reader', '')))
+        except (ValueError, KeyError, TypeError):
+            errors += 1
+    return ts, epcs, rssi, readers, errors
+
+
+def _columns_from_csv(lines):
+    """CSV (ts,epc,rssi,reader,antenna) 轉換為欄位陣列，略過標題列"""
+    ts, epcs, rssi, readers = array('d'), [], array('h'), []
+    errors = 0
+    for row in csv.reader(lines):
+        if not row or row[0] == 'ts':
+            continue
+        try:
+            ts.append(float(row[0]))
+            epcs.append(row[1].upper())
+            rssi.append(int(row[2]) if len(row) > 2 and row[2] else 0)
+            readers.append(row[3] if len(row) > 3 else '')
+        except (ValueError, IndexError):
+            errors += 1
+    return ts, epcs, rssi, readers, errors
+
+
+def _columns_from_capture(lines, reader_name):
+    """擷取檔轉換為欄位陣列，每行為「時間戳 十六進位資料」"""
+    ts, epcs, rssi, readers = array('d'), [], array('h'), []
+    errors = 0
+    decoder = proto.FrameDecoder()
+    for line in lines:
+        parts = line.split(None, 1)
+        if len(parts) != 2:
+            continue
+        try:
+            stamp = float(parts[0])
+            raw = bytes.fromhex(parts[1])
+        except ValueError:
+            errors += 1
+            continue
+        for frame in decoder.feed(raw):
+            if frame.type != proto.TYPE_NOTICE or frame.command != proto.CMD_SINGLE_POLL:
+                continue
+            notice = proto.parse_poll_notice(frame)
+            ts.append(stamp)
+            epcs.append(hex_codec.to_hex(notice['epc']))
+            rssi.append(notice['rssi'])
+            readers.append(reader_name)
+    return ts, epcs, rssi, readers, errors + decoder.checksum_errors
+
+
+def analyze_chunk(task):
+    """子行程：解析單一區塊並計算部分彙總"""
+    path, start, end = task
+    with open(path, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode('utf-8', errors='replace')
+    lines = text.splitlines()
+
+    lower = path.lower()
+    if lower.endswith('.csv'):
+        ts, epcs, rssi, readers, errors = _columns_from_csv(lines)
+    elif lower.endswith('.cap'):
+        reader_name = os.path.splitext(os.path.basename(path))[0]
+        ts, epcs, rssi, readers, errors = _columns_from_capture(lines, reader_name)
+    else:
+        ts, epcs, rssi, readers, errors = _columns_from_jsonl(lines)
+
+    # 以EPC為鍵彙總：[讀取次數, 首次時間, 最後時間, 讀寫器集合, RSSI總和]
+    per_epc = {}
+    for stamp, epc, value, reader in zip(ts, epcs, rssi, readers):
+        stats = per_epc.get(epc)
+        if stats is None:
+            per_epc[epc] = [1, stamp, stamp, {reader}, value]
+        else:
+            stats[0] += 1
+            if stamp < stats[1]:
+                stats[1] = stamp
+            if stamp > stats[2]:
+                stats[2] = stamp
+            stats[3].add(reader)
+            stats[4] += value
+
+    per_second = Counter(int(stamp) for stamp in ts)
+    per_reader_second = Counter(zip(readers, (int(stamp) for stamp in ts)))
+    return {
+        'reads': len(ts),
+        'errors': errors,
+        'per_epc': per_epc,
+        'per_second': per_second,
+        'per_reader_second': per_reader_second
+    }
+
+
+def merge_results(parts):
+    """合併各區塊的部分彙總"""
+    merged = {
+        'reads': 0,
+        'errors': 0,
+        'per_epc': {},
+        'per_second': Counter(),
+        'per_reader_second': Counter()
+    }
+    per_epc = merged['per_epc']
+    for part in parts:
+        merged['reads'] += part['reads']
+        merged['errors'] += part['errors']
+        merged['per_second'].update(part['per_second'])
+        merged['per_reader_second'].update(part['per_reader_second'])
+        for epc, stats in part['per_epc'].items():
+            current = per_epc.get(epc)
+            if current is None:
+                per_epc[epc] = stats
+            else:
+                current[0] += stats[0]
+                current[1] = min(current[1], stats[1])
+                current[2] = max(current[2], stats[2])
+                current[3] |= stats[3]
+                current[4] += stats[4]
+    return merged
+
+
+def _histogram(values, edges):
+    """依區間上限統計數量，最後一個區間為超過最大上限者"""
+    counts = [0] * (len(edges) + 1)
+    for value in values:
+        for i, edge in enumerate(edges):
+            if value < edge:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+    labels = [f"<{edge}" for edge in edges] + [f">={edges[-1]}"]
+    return dict(zip(labels, counts))
+
+
+def build_report(merged, top=20):
+    """由合併後的資料產生報告（每個唯一EPC只解析一次）"""
+    product_reads = Counter()
+    product_tags = Counter()
+    date_reads = Counter()
+    date_tags = Counter()
+    tag_id_epcs = {}
+    unparsed = 0
+    dwell_times = []
+    multi_reader = []
+
+    for epc, (count, first, last, readers, _) in merged['per_epc'].items():
+        dwell_times.append(last - first)
+        if len(readers) > 1:
+            multi_reader.append({'epc': epc, 'readers': sorted(readers), 'reads': count})
+        fields = parse_epc_fields(epc)
+        if fields is None:
+            unparsed += 1
+            continue
+        tag_id, product_id, date = fields
+        product_reads[product_id] += count
+        product_tags[product_id] += 1
+        date_reads[date] += count
+        date_tags[date] += 1
+        tag_id_epcs.setdefault(tag_id, []).append(epc)
+
+    duplicate_tag_ids = {tag_id: epcs for tag_id, epcs in tag_id_epcs.items() if len(epcs) > 1}
+
+    rates = list(merged['per_second'].values())
+    rate_edges = [1, 5, 10, 20, 50, 100, 200, 500]
+    reader_rates = {}
+    for (reader, _), count in merged['per_reader_second'].items():
+        reader_rates.setdefault(reader, []).append(count)
+
+    return {
+        'total_reads': merged['reads'],
+        'parse_errors': merged['errors'],
+        'unique_epcs': len(merged['per_epc']),
+        'unparsed_epcs': unparsed,
+        'products': [
+            {'product_id': product_id, 'reads': reads, 'tags': product_tags[product_id]}
+            for product_id, reads in product_reads.most_common(top)
+        ],
+        'dates': [
+            {'date': date, 'reads': date_reads[date], 'tags': date_tags[date]}
+            for date in sorted(date_reads)
+        ],
+        'dwell_histogram': _histogram(dwell_times, DWELL_BUCKETS),
+        'read_rate_histogram': _histogram(rates, rate_edges),
+        'peak_read_rate': max(rates) if rates else 0,
+        'reader_peak_rates': {reader: max(counts) for reader, counts in reader_rates.items()},
+        'duplicate_tag_ids': dict(sorted(duplicate_tag_ids.items())[:top]),
+        'duplicate_tag_id_count': len(duplicate_tag_ids),
+        'multi_reader_epcs': sorted(multi_reader, key=lambda item: -item['reads'])[:top],
+        'multi_reader_epc_count': len(multi_reader)
+    }
+
+
+def print_report(report):
+    """以文字格式輸出報告"""
+    print(f"總讀取次數: {report['total_reads']}  唯一EPC: {report['unique_epcs']}  "
+          f"解析錯誤: {report['parse_errors']}  無法解析EPC: {report['unparsed_epcs']}")
+    print("\n產品ID統計:")
+    for item in report['products']:
+        print(f"  {item['product_id']}  讀取 {item['reads']}  標籤 {item['tags']}")
+    print("\n編碼日期統計:")
+    for item in report['dates']:
+        print(f"  {item['date']}  讀取 {item['reads']}  標籤 {item['tags']}")
+    print("\n停留時間分佈（秒）:")
+    for label, count in report['dwell_histogram'].items():
+        print(f"  {label:>8}  {count}")
+    print(f"\n每秒讀取率分佈（峰值 {report['peak_read_rate']} 次/秒）:")
+    for label, count in report['read_rate_histogram'].items():
+        print(f"  {label:>8}  {count}")
+    print("\n各讀寫器峰值讀取率:")
+    for reader, rate in sorted(report['reader_peak_rates'].items()):
+        print(f"  {reader or '(未指定)'}  {rate} 次/秒")
+    print(f"\n重複UUID: {report['duplicate_tag_id_count']} 組")
+    for tag_id, epcs in report['duplicate_tag_ids'].items():
+        print(f"  {tag_id}: {', '.join(epcs)}")
+    print(f"\n多台讀寫器讀到的EPC: {report['multi_reader_epc_count']} 個")
+    for item in report['multi_reader_epcs']:
+        print(f"  {item['epc']}  {', '.join(item['readers'])}  讀取 {item['reads']}")
+
+
+def run(paths, workers=None, chunk_mb=64, top=20):
+    """切割、平行分析並合併，傳回報告"""
+    tasks = []
+    for path in paths:
+        tasks.extend(split_chunks(path, chunk_mb * 1024 * 1024))
+    if workers == 1 or len(tasks) <= 1:
+        parts = map(analyze_chunk, tasks)
+        return build_report(merge_results(parts), top)
+    with Pool(workers) as pool:
+        parts = pool.imap_unordered(analyze_chunk, tasks)
+        return build_report(merge_results(parts), top)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="標籤讀取紀錄離線分析")
+    parser.add_argument('paths', nargs='+', help="事件紀錄(.jsonl/.csv)或擷取檔(.cap)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="平行行程數")
+    parser.add_argument('--chunk-mb', type=int, default=64, help="每個區塊大小(MB)")
+    parser.add_argument('--top', type=int, default=20, help="各清單顯示筆數")
+    parser.add_argument('--json', dest='json_path', help="另存報告為JSON檔")
+    args = parser.parse_args(argv)
+
+    started = time.time()
+    report = run(args.paths, args.workers, args.chunk_mb, args.top)
+    print_report(report)
+    print(f"\n分析耗時: {time.time() - started:.1f} 秒")
+
+    if args.json_path:
+        with io.open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,248 @@
+"""盤點資料表查詢索引
+
+以 InventoryTable 的 listener 增量維護排序索引，查詢不必傾印整個資料表：
+  product    (產品ID, EPC)
+  date       (編碼日期 YYYYMMDD, EPC)
+  last_seen  (-最後讀取秒數, EPC)，最新讀到的在前；同一秒內重複讀取不必更新索引
+  epc        EPC
+查詢依條件挑選一個索引做範圍掃描，其他條件逐筆過濾；分頁以上一頁最後一筆的索引鍵
+作為游標(keyset)，不使用 offset，翻到後面的頁也不會變慢。
+排序索引為分段排序串列（每段最多 2×load 筆），插入、刪除與定位都只搬動一段。
+"""
+import base64
+import json
+import threading
+from bisect import bisect_left, bisect_right, insort
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+MAX_SCAN = 100000
+
+
+class SortedKeys:
+    """分段排序串列"""
+
+    def __init__(self, load=512):
+        self.load = load
+        self.chunks = []
+        self.maxes = []
+        self.size = 0
+
+    def add(self, key):
+        chunks, maxes = self.chunks, self.maxes
+        self.size += 1
+        if not chunks:
+            chunks.append([key])
+            maxes.append(key)
+            return
+        index = bisect_left(maxes, key)
+        if index == len(maxes):
+            index -= 1
+            chunks[index].append(key)
+            maxes[index] = key
+        else:
+            insort(chunks[index], key)
+        chunk = chunks[index]
+        if len(chunk) > self.load * 2:
+            half = chunk[self.load:]
+            del chunk[self.load:]
+            chunks.insert(index + 1, half)
+            maxes[index] = chunk[-1]
+            maxes.insert(index + 1, half[-1])
+
+    def discard(self, key):
+        chunks, maxes = self.chunks, self.maxes
+        index = bisect_left(maxes, key)
+        if index == len(maxes):
+            return
+        chunk = chunks[index]
+        position = bisect_left(chunk, key)
+        if position == len(chunk) or chunk[position] != key:
+            return
+        del chunk[position]
+        self.size -= 1
+        if chunk:
+            maxes[index] = chunk[-1]
+        else:
+            del chunks[index]
+            del maxes[index]
+
+    def iter_from(self, start=None, exclusive=False):
+        """由 start 開始依序產生鍵（exclusive 時不含 start）"""
+        chunks = self.chunks
+        if start is None:
+            index, position = 0, 0
+        else:
+            index = (bisect_right if exclusive else bisect_left)(self.maxes, start)
+            if index == len(chunks):
+                return
+            position = (bisect_right if exclusive else bisect_left)(chunks[index], start)
+        while index < len(chunks):
+            chunk = chunks[index]
+            for position in range(position, len(chunk)):
+                yield chunk[position]
+            index += 1
+            position = 0
+
+    def __len__(self):
+        return self.size
+
+
+def date_key(record):
+    year, month, day = record.get('year'), record.get('month'), record.get('day')
+    if year is None or month is None or day is None:
+        return None
+    return year * 10000 + month * 100 + day
+
+
+def parse_date(value):
+    """YYYY-MM-DD 或 YYYYMMDD 轉為 YYYYMMDD 整數"""
+    digits = value.replace('-', '').replace('/', '')
+    if len(digits) != 8 or not digits.isdigit():
+        raise ValueError(f"日期格式錯誤: {value}")
+    return int(digits)
+
+
+def encode_cursor(index, key):
+    text = json.dumps([index, list(key) if isinstance(key, tuple) else key], separators=(',', ':'))
+    return base64.urlsafe_b64encode(text.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        index, key = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError("游標格式錯誤")
+    return index, tuple(key) if isinstance(key, list) else key
+
+
+class TagQueryIndex:
+    def __init__(self, table, load=512):
+        self.table = table
+        self.load = load
+        self.lock = threading.Lock()
+        self._reset()
+        self.rebuild()
+        table.add_listener(self.on_inventory)
+
+    def _reset(self):
+        self.by_epc = SortedKeys(self.load)
+        self.by_product = SortedKeys(self.load)
+        self.by_date = SortedKeys(self.load)
+        self.by_seen = SortedKeys(self.load)
+        self.seen_keys = {}
+
+    def rebuild(self):
+        """由資料表目前內容重建索引"""
+        with self.lock:
+            self._reset()
+            for record in self.table.snapshot():
+                self._insert(record)
+
+    def clear(self):
+        with self.lock:
+            self._reset()
+
+    def _insert(self, record):
+        """加入新標籤（呼叫端需持有lock）"""
+        epc = record['epc']
+        if epc in self.seen_keys:
+            return
+        self.by_epc.add(epc)
+        if record.get('product_id'):
+            self.by_product.add((record['product_id'], epc))
+        date = date_key(record)
+        if date is not None:
+            self.by_date.add((date, epc))
+        seen_key = (-int(record['last_seen']), epc)
+        self.by_seen.add(seen_key)
+        self.seen_keys[epc] = seen_key
+
+    def on_inventory(self, record, is_new):
+        """InventoryTable listener"""
+        with self.lock:
+            epc = record['epc']
+            if epc not in self.seen_keys:
+                self._insert(record)
+                return
+            seen_key = (-int(record['last_seen']), epc)
+            old_key = self.seen_keys[epc]
+            if seen_key < old_key:
+                self.by_seen.discard(old_key)
+                self.by_seen.add(seen_key)
+                self.seen_keys[epc] = seen_key
+
+    def _plan(self, product_id, date_from, date_to, seen_from, seen_to):
+        """挑選索引，傳回 (索引名稱, 排序串列, 起始鍵, 是否仍在範圍內的函式)"""
+        if product_id:
+            return ('product', self.by_product, (product_id,),
+                    lambda key: key[0] == product_id)
+        if date_from is not None or date_to is not None:
+            upper = date_to if date_to is not None else 99999999
+            return ('date', self.by_date, (date_from or 0,),
+                    lambda key: key[0] <= upper)
+        if seen_from is not None or seen_to is not None:
+            lower = -int(seen_from) if seen_from is not None else 0
+            start = (-int(seen_to),) if seen_to is not None else None
+            return ('last_seen', self.by_seen, start,
+                    lambda key: key[0] <= lower)
+        return 'epc', self.by_epc, None, lambda key: True
+
+    def query(self, product_id=None, date_from=None, date_to=None, seen_from=None, seen_to=None,
+              reader=None, limit=DEFAULT_LIMIT, cursor=None, max_scan=MAX_SCAN):
+        """依條件查詢，傳回 {'data', 'next_cursor', 'index', 'scanned'}"""
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        product_id = product_id.upper() if product_id else None
+        name, keys, start, in_range = self._plan(product_id, date_from, date_to, seen_from, seen_to)
+        exclusive = False
+        if cursor:
+            cursor_index, cursor_key = decode_cursor(cursor)
+            if cursor_index != name:
+                raise ValueError("游標與查詢條件不符")
+            start, exclusive = cursor_key, True
+
+        tags = self.table.tags
+        data = []
+        scanned = 0
+        last_key = None
+        exhausted = True
+        with self.lock:
+            for key in keys.iter_from(start, exclusive):
+                if not in_range(key):
+                    break
+                if scanned >= max_scan or len(data) >= limit:
+                    exhausted = False
+                    break
+                scanned += 1
+                last_key = key
+                epc = key if name == 'epc' else key[1]
+                record = tags.get(epc)
+                if record is None:
+                    continue
+                if product_id and record.get('product_id') != product_id:
+                    continue
+                if date_from is not None or date_to is not None:
+                    date = date_key(record)
+                    if date is None or (date_from is not None and date < date_from) \
+                            or (date_to is not None and date > date_to):
+                        continue
+                if seen_from is not None and record['last_seen'] < seen_from:
+                    continue
+                if seen_to is not None and record['last_seen'] > seen_to:
+                    continue
+                if reader is not None and record.get('reader') != reader:
+                    continue
+                data.append(dict(record))
+        return {
+            'data': data,
+            'next_cursor': None if exhausted or last_key is None else encode_cursor(name, last_key),
+            'index': name,
+            'scanned': scanned
+        }
+
+    def stats(self):
+        return {
+            'tags': len(self.by_epc),
+            'products': len(self.by_product),
+            'dated': len(self.by_date)
+        }
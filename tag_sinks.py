@@ -0,0 +1,406 @@
+"""標籤事件輸出通道
+
+每個輸出通道有自己的工作執行緒與有界佇列，依批次大小或時間間隔寫出。
+佇列滿時直接丟棄並計數，慢速的輸出端不會拖慢串口讀取。
+
+事件格式: {'ts': 時間戳, 'epc': 十六進位字串, 'rssi': int, 'reader': 讀寫器名稱, 'antenna': int}
+
+由設定建立的檔案與資料庫輸出只能寫在輸出目錄內（環境變數 RFID_SINK_DIR，預設 sinks）；
+TCP/UDP 輸出只能送到本機或允許清單內的主機（環境變數 RFID_SINK_HOSTS，以逗號分隔）。
+"""
+import csv
+import io
+import ipaddress
+import json
+import os
+import re
+import socket
+import sqlite3
+import threading
+import time
+from queue import Queue, Empty, Full
+
+EVENT_FIELDS = ['ts', 'epc', 'rssi', 'reader', 'antenna']
+TABLE_NAME = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+class TagSink:
+    """輸出通道基底類別，子類別實作 write_batch"""
+
+    def __init__(self, name, batch_size=500, flush_interval=1.0, queue_size=10000):
+        self.name = name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = Queue(maxsize=queue_size)
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_error = None
+        self.last_flush = None
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.running = True
+        # 在呼叫端開啟資源，失敗時直接丟出例外，不會建立無法寫出的通道
+        self.open()
+        self.thread = threading.Thread(target=self._worker, name=f"sink-{name}")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, event):
+        """加入事件，不會阻塞；佇列已滿時丟棄"""
+        self.submitted += 1
+        try:
+            self.queue.put_nowait(event)
+        except Full:
+            self.dropped += 1
+
+    def write_batch(self, events):
+        raise NotImplementedError
+
+    def open(self):
+        """建立時開啟資源（在呼叫端執行緒）"""
+
+    def close_resources(self):
+        """於工作執行緒中釋放資源"""
+
+    def _flush(self, batch):
+        try:
+            self.write_batch(batch)
+            self.written += len(batch)
+        except Exception as e:
+            self.errors += 1
+            self.dropped += len(batch)
+            self.last_error = str(e)
+        now = time.time()
+        self.last_flush = now
+        self.last_lag = now - batch[0].get('ts', now)
+        self.max_lag = max(self.max_lag, self.last_lag)
+
+    def _worker(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while self.running or not self.queue.empty():
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+                # 一次取完佇列中已有的事件
+                while len(batch) < self.batch_size:
+                    batch.append(self.queue.get_nowait())
+            except Empty:
+                pass
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval
+        if batch:
+            self._flush(batch)
+        self.close_resources()
+
+    def close(self, timeout=5.0):
+        """停止並寫出剩餘事件"""
+        self.running = False
+        self.thread.join(timeout=timeout)
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'type': type(self).__name__,
+            'submitted': self.submitted,
+            'written': self.written,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'last_error': self.last_error,
+            'queue_depth': self.queue.qsize(),
+            'last_flush': self.last_flush,
+            'last_lag': round(self.last_lag, 3),
+            'max_lag': round(self.max_lag, 3)
+        }
+
+
+class RotatingFileSink(TagSink):
+    """依檔案大小輪替的檔案輸出：path, path.1, path.2 ..."""
+
+    def __init__(self, name, path, max_bytes=64 * 1024 * 1024, backup_count=10, **kwargs):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.file = None
+        super().__init__(name, **kwargs)
+
+    def open(self):
+        self.file = open(self.path, 'a', encoding='utf-8', newline='')
+        if self.file.tell() == 0:
+            self.write_header()
+
+    def write_header(self):
+        pass
+
+    def close_resources(self):
+        if self.file:
+            self.file.close()
+
+    def rotate(self):
+        self.file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.open()
+
+    def format_batch(self, events):
+        raise NotImplementedError
+
+    def write_batch(self, events):
+        self.file.write(self.format_batch(events))
+        self.file.flush()
+        if self.max_bytes and self.file.tell() >= self.max_bytes:
+            self.rotate()
+
+
+class JsonlFileSink(RotatingFileSink):
+    """每行一筆JSON"""
+
+    def format_batch(self, events):
+        return ''.join(json.dumps(event, ensure_ascii=False) + '\n' for event in events)
+
+
+class CsvFileSink(RotatingFileSink):
+    """CSV格式，新檔案會寫入標題列"""
+
+    def write_header(self):
+        self.file.write(self.format_rows([EVENT_FIELDS]))
+
+    def format_rows(self, rows):
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator='\n').writerows(rows)
+        return buffer.getvalue()
+
+    def format_batch(self, events):
+        return self.format_rows([event.get(field, '') for field in EVENT_FIELDS] for event in events)
+
+
+class SQLiteSink(TagSink):
+    """寫入SQLite資料表，每批一個交易"""
+
+    def __init__(self, name, path, table='tag_events', **kwargs):
+        if not isinstance(table, str) or not TABLE_NAME.match(table):
+            raise ValueError(f"資料表名稱不正確: {table}")
+        self.path = path
+        self.table = table
+        self.conn = None
+        super().__init__(name, **kwargs)
+
+    def open(self):
+        # 連線在呼叫端建立，之後只由工作執行緒使用
+        try:
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.table} '
+                '(ts REAL, epc TEXT, rssi INTEGER, reader TEXT, antenna INTEGER)')
+            self.conn.execute(f'CREATE INDEX IF NOT EXISTS {self.table}_epc ON {self.table}(epc)')
+        except sqlite3.Error as e:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+            raise OSError(f"無法開啟資料庫 {self.path}: {str(e)}")
+
+    def close_resources(self):
+        if self.conn:
+            self.conn.close()
+
+    def write_batch(self, events):
+        rows = [tuple(event.get(field) for field in EVENT_FIELDS) for event in events]
+        with self.conn:
+            self.conn.executemany(f'INSERT INTO {self.table} VALUES (?, ?, ?, ?, ?)', rows)
+
+
+class TcpSink(TagSink):
+    """以TCP送出JSON行，斷線時下一批自動重連"""
+
+    def __init__(self, name, host='127.0.0.1', port=9000, connect_timeout=2.0, **kwargs):
+        self.host, self.port = resolve_sink_address(host, port)
+        self.connect_timeout = connect_timeout
+        self.sock = None
+        super().__init__(name, **kwargs)
+
+    def close_resources(self):
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+    def write_batch(self, events):
+        payload = ''.join(json.dumps(event, ensure_ascii=False) + '\n' for event in events)
+        if self.sock is None:
+            self.sock = socket.create_connection((self.host, self.port), timeout=self.connect_timeout)
+        try:
+            self.sock.sendall(payload.encode('utf-8'))
+        except OSError:
+            self.close_resources()
+            raise
+
+
+class UdpSink(TagSink):
+    """以UDP送出JSON行，每個封包不超過max_datagram位元組"""
+
+    def __init__(self, name, host='127.0.0.1', port=9001, max_datagram=8192, **kwargs):
+        self.address = resolve_sink_address(host, port)
+        self.max_datagram = max_datagram
+        self.sock = None
+        super().__init__(name, **kwargs)
+
+    def open(self):
+        family = socket.AF_INET6 if ':' in self.address[0] else socket.AF_INET
+        self.sock = socket.socket(family, socket.SOCK_DGRAM)
+
+    def close_resources(self):
+        if self.sock:
+            self.sock.close()
+
+    def write_batch(self, events):
+        chunk = bytearray()
+        for event in events:
+            line = (json.dumps(event, ensure_ascii=False) + '\n').encode('utf-8')
+            if chunk and len(chunk) + len(line) > self.max_datagram:
+                self.sock.sendto(chunk, self.address)
+                chunk = bytearray()
+            chunk += line
+        if chunk:
+            self.sock.sendto(chunk, self.address)
+
+
+class StreamSink(TagSink):
+    """提供給串流連線（例如 HTTP 事件串流）的輸出通道，由連線端以 next_chunk 取出JSON行
+
+    連線端讀取太慢時批次佇列滿，後續批次直接丟棄並計數，不影響其他通道。
+    """
+
+    def __init__(self, name, max_pending=64, **kwargs):
+        self.pending = Queue(maxsize=max_pending)
+        super().__init__(name, **kwargs)
+
+    def write_batch(self, events):
+        payload = ''.join(json.dumps(event, ensure_ascii=False) + '\n' for event in events)
+        try:
+            self.pending.put_nowait(payload)
+        except Full:
+            self.dropped += len(events)
+            self.written -= len(events)
+
+    def next_chunk(self, timeout=None):
+        """取出下一批JSON行，逾時傳回None"""
+        try:
+            return self.pending.get(timeout=timeout)
+        except Empty:
+            return None
+
+
+SINK_TYPES = {
+    'jsonl': JsonlFileSink,
+    'csv': CsvFileSink,
+    'sqlite': SQLiteSink,
+    'tcp': TcpSink,
+    'udp': UdpSink
+}
+
+
+def resolve_sink_path(path, base=None):
+    """設定中的檔案路徑限制在輸出目錄內，不接受絕對路徑與 .."""
+    base = base or os.environ.get('RFID_SINK_DIR', 'sinks')
+    if not isinstance(path, str) or not path:
+        raise ValueError("必須提供輸出路徑")
+    if os.path.isabs(path) or os.path.splitdrive(path)[0] or path.startswith(('/', '\\')):
+        raise ValueError("輸出路徑必須是輸出目錄內的相對路徑")
+    if '..' in re.split(r'[\\/]', path):
+        raise ValueError("輸出路徑不可包含 ..")
+    root = os.path.realpath(base)
+    full = os.path.realpath(os.path.join(root, path))
+    # 經由符號連結指到目錄外也拒絕
+    if os.path.commonpath([root, full]) != root:
+        raise ValueError("輸出路徑必須在輸出目錄內")
+    os.makedirs(os.path.dirname(full), exist_ok=True)
+    return full
+
+
+def resolve_sink_address(host, port, allowed=None):
+    """網路輸出的目的地限制在本機或允許清單內的主機，傳回 (host, port)
+
+    允許清單預設取自環境變數 RFID_SINK_HOSTS。清單外只接受 localhost 與迴路位址，
+    不解析其他主機名稱，避免DNS把名稱指到外部主機。
+    """
+    if allowed is None:
+        allowed = [entry.strip() for entry in os.environ.get('RFID_SINK_HOSTS', '').split(',')]
+    if not isinstance(host, str) or not host:
+        raise ValueError("必須提供輸出主機")
+    if isinstance(port, bool) or not isinstance(port, int) or not 0 < port < 65536:
+        raise ValueError("輸出埠號必須是 1~65535 的整數")
+    if host.lower() in {entry.lower() for entry in allowed if entry} | {'localhost'}:
+        return host, port
+    try:
+        loopback = ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        loopback = False
+    if not loopback:
+        raise ValueError(f"輸出主機必須是本機或在 RFID_SINK_HOSTS 允許清單內: {host}")
+    return host, port
+
+
+def create_sink(config):
+    """依設定建立輸出通道，例如 {'type': 'jsonl', 'name': 'log', 'path': 'tags.jsonl'}
+
+    path 為輸出目錄內的相對路徑，tcp/udp 的 host 為本機或允許清單內的主機；
+    無法開啟檔案或資料庫時丟出 OSError。
+    """
+    config = dict(config)
+    sink_type = config.pop('type', None)
+    if sink_type not in SINK_TYPES:
+        raise ValueError(f"不支援的輸出類型: {sink_type}")
+    if sink_type in ('jsonl', 'csv', 'sqlite'):
+        config['path'] = resolve_sink_path(config.get('path'))
+    name = config.pop('name', sink_type)
+    return SINK_TYPES[sink_type](name, **config)
+
+
+class SinkManager:
+    """管理多個輸出通道，將事件分送給每個通道"""
+
+    def __init__(self):
+        self.sinks = {}
+        self.lock = threading.Lock()
+
+    def add(self, sink):
+        with self.lock:
+            if sink.name in self.sinks:
+                sink.close()
+                raise ValueError(f"輸出通道名稱重複: {sink.name}")
+            self.sinks = {**self.sinks, sink.name: sink}
+        return sink
+
+    def remove(self, name, timeout=5.0):
+        """移除輸出通道，最多等待 timeout 秒寫出剩餘事件（0 表示在背景寫出、不等待）"""
+        with self.lock:
+            sinks = dict(self.sinks)
+            sink = sinks.pop(name, None)
+            self.sinks = sinks
+        if sink:
+            sink.close(timeout)
+        return sink is not None
+
+    def publish(self, event):
+        # 讀取端不加鎖，新增/移除時以替換整個dict的方式更新
+        for sink in self.sinks.values():
+            sink.submit(event)
+
+    def stats(self):
+        return [sink.stats() for sink in self.sinks.values()]
+
+    def close(self):
+        for name in list(self.sinks):
+            self.remove(name)
@@ -0,0 +1,233 @@
+"""可持久化的寫入工作佇列
+
+每個 /write 請求都建立一筆工作並寫入預寫日誌(WAL)：
+  create  建立工作（工作ID、冪等鍵、要寫入的EPC）
+  attempt 即將送出寫入命令（嘗試次數+1），此時狀態為 sending
+  outcome 寫入結果（done / failed）
+
+程式中斷時停在 sending 的工作，重新啟動後標記為 interrupted，
+表示無法確定是否已寫入標籤，重試時會讀回比對。
+記憶體中以 dict 索引工作ID與冪等鍵，查詢為 O(1)；
+WAL 超過門檻時寫出快照並清空，避免重新啟動時重播過多紀錄：
+持有鎖時只複製工作並把 WAL 改名為 jobs.wal.old，快照在鎖外寫出後才取代舊快照；
+完成前中斷時重新啟動會依序重播 舊快照 → jobs.wal.old → jobs.wal。
+"""
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+STATUS_PENDING = 'pending'
+STATUS_SENDING = 'sending'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+STATUS_INTERRUPTED = 'interrupted'
+
+
+class WriteJobStore:
+    def __init__(self, directory='write_jobs', compact_threshold=100000, fsync=True):
+        self.directory = directory
+        self.wal_path = os.path.join(directory, 'jobs.wal')
+        self.rotated_path = self.wal_path + '.old'
+        self.snapshot_path = os.path.join(directory, 'jobs.snapshot')
+        self.compact_threshold = compact_threshold
+        self.fsync = fsync
+        self.jobs = {}
+        self.keys = {}
+        self.lock = threading.Lock()
+        self.wal_records = 0
+        self.compacting = False
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+        self.wal = open(self.wal_path, 'a', encoding='utf-8')
+
+    def _load(self):
+        """讀取快照與WAL重建狀態"""
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, encoding='utf-8') as f:
+                for line in f:
+                    job = json.loads(line)
+                    self._index(job)
+        # 上次壓縮未完成時，改名的 WAL 中的紀錄不一定在快照內，先重播
+        for path in (self.rotated_path, self.wal_path):
+            if not os.path.exists(path):
+                continue
+            self._truncate_partial_tail(path)
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 寫入到一半中斷的最後一行
+                        continue
+                    self._apply(record)
+                    self.wal_records += 1
+        for job in self.jobs.values():
+            if job['status'] == STATUS_SENDING:
+                job['status'] = STATUS_INTERRUPTED
+
+    def _truncate_partial_tail(self, path):
+        """移除寫入到一半中斷的最後一行，避免之後的紀錄接在後面"""
+        with open(path, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size == 0:
+                return
+            position = size
+            while position > 0:
+                step = min(4096, position)
+                f.seek(position - step)
+                block = f.read(step)
+                newline = block.rfind(b'\n')
+                if newline >= 0:
+                    position = position - step + newline + 1
+                    break
+                position -= step
+            if position != size:
+                f.truncate(position)
+
+    def _index(self, job):
+        self.jobs[job['id']] = job
+        if job.get('key'):
+            self.keys[job['key']] = job['id']
+
+    def _apply(self, record):
+        op = record['op']
+        if op == 'create':
+            self._index({
+                'id': record['id'],
+                'key': record.get('key'),
+                'epc': record['epc'],
+                'info': record.get('info'),
+                'status': STATUS_PENDING,
+                'attempts': 0,
+                'result': None,
+                'created': record['ts'],
+                'updated': record['ts']
+            })
+            return
+        job = self.jobs.get(record['id'])
+        if job is None:
+            return
+        if op == 'attempt':
+            job['status'] = STATUS_SENDING
+            job['attempts'] = record['attempts']
+        elif op == 'outcome':
+            job['status'] = record['status']
+            job['result'] = record.get('result')
+        job['updated'] = record['ts']
+
+    def _append(self, record):
+        """寫入WAL並套用到記憶體狀態（呼叫端需持有lock）"""
+        record['ts'] = time.time()
+        self.wal.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.wal.flush()
+        if self.fsync:
+            os.fsync(self.wal.fileno())
+        self._apply(record)
+        self.wal_records += 1
+
+    def _rotate_wal(self):
+        """WAL 改名為 jobs.wal.old 並開新檔（呼叫端需持有lock）
+
+        上次壓縮失敗留下的 jobs.wal.old 不能覆蓋，把目前的 WAL 接在後面。
+        """
+        self.wal.close()
+        if os.path.exists(self.rotated_path):
+            with open(self.wal_path, 'rb') as src, open(self.rotated_path, 'ab') as dst:
+                shutil.copyfileobj(src, dst)
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.remove(self.wal_path)
+        else:
+            os.replace(self.wal_path, self.rotated_path)
+        self.wal = open(self.wal_path, 'a', encoding='utf-8')
+        self.wal_records = 0
+
+    def _compact_if_due(self):
+        """WAL 超過門檻時寫出完整快照（不可持有lock，快照在鎖外寫出）"""
+        with self.lock:
+            if self.compacting or self.wal_records < self.compact_threshold:
+                return
+            self.compacting = True
+            # 工作內容由 _apply 原地更新，複製一份後就可以在鎖外序列化
+            jobs = [dict(job) for job in self.jobs.values()]
+            self._rotate_wal()
+        try:
+            temp_path = self.snapshot_path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                for job in jobs:
+                    f.write(json.dumps(job, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.snapshot_path)
+            os.remove(self.rotated_path)
+        finally:
+            self.compacting = False
+
+    def create(self, epc, info=None, key=None):
+        """建立工作；冪等鍵已存在時傳回既有工作與 False"""
+        with self.lock:
+            if key and key in self.keys:
+                return self.jobs[self.keys[key]], False
+            job_id = uuid.uuid4().hex
+            self._append({'op': 'create', 'id': job_id, 'key': key, 'epc': epc, 'info': info})
+        self._compact_if_due()
+        return self.jobs[job_id], True
+
+    def begin_attempt(self, job_id):
+        """送出命令前記錄，若工作正在執行中傳回None"""
+        with self.lock:
+            job = self.jobs[job_id]
+            if job['status'] == STATUS_SENDING:
+                return None
+            self._append({'op': 'attempt', 'id': job_id, 'attempts': job['attempts'] + 1})
+        self._compact_if_due()
+        return job
+
+    def finish(self, job_id, success, result):
+        with self.lock:
+            self._append({
+                'op': 'outcome',
+                'id': job_id,
+                'status': STATUS_DONE if success else STATUS_FAILED,
+                'result': result
+            })
+        self._compact_if_due()
+        return self.jobs[job_id]
+
+    def interrupt(self, job_id, error=None):
+        """送出命令後發生例外、無法確定是否已寫入時記錄為 interrupted，重試前需先確認"""
+        with self.lock:
+            self._append({
+                'op': 'outcome',
+                'id': job_id,
+                'status': STATUS_INTERRUPTED,
+                'result': {'error': error}
+            })
+        self._compact_if_due()
+        return self.jobs[job_id]
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def get_by_key(self, key):
+        job_id = self.keys.get(key)
+        return self.jobs.get(job_id) if job_id else None
+
+    def unfinished(self):
+        """尚未完成（pending / interrupted）的工作"""
+        return [job for job in self.jobs.values()
+                if job['status'] in (STATUS_PENDING, STATUS_INTERRUPTED)]
+
+    def stats(self):
+        counts = {}
+        for job in self.jobs.values():
+            counts[job['status']] = counts.get(job['status'], 0) + 1
+        return {'jobs': len(self.jobs), 'wal_records': self.wal_records, 'status': counts}
+
+    def close(self):
+        with self.lock:
+            self.wal.close()
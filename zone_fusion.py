@@ -0,0 +1,183 @@
+"""多讀寫器讀取融合與區域判定
+
+相鄰的碼頭門都會讀到同一張標籤，各讀寫器各自回報，無法判斷標籤實際在哪裡。
+這裡把同一個EPC在時間窗內的讀取合併：
+- 每個區域（讀寫器或多台讀寫器組成的區域）維護指數平滑RSSI，超過時間窗沒有讀到的區域不列入比較
+- 第一次讀到後等待 settle 秒，讓相鄰讀寫器都有機會回報，再指派到平滑RSSI最強的區域
+- 之後只有其他區域強過目前區域 hysteresis dB 以上，或目前區域已離開時間窗，才改變區域
+- 指派或改變區域時送出一筆標準事件
+
+記憶體有上限：每張標籤最多保留區域數量的狀態，標籤數超過 max_tags 或閒置超過 tag_ttl
+時由最久未讀到的開始移除，20台讀寫器全速盤點時每次讀取仍為 O(區域數)。
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class ZoneFusion:
+    def __init__(self, zones=None, window=2.0, settle=0.3, alpha=0.3, hysteresis=3.0,
+                 max_tags=100000, tag_ttl=60.0, on_event=None):
+        # zones: 讀寫器名稱 -> 區域名稱，未指定的讀寫器以自己的名稱為區域
+        self.zones = dict(zones or {})
+        self.window = window
+        self.settle = settle
+        self.alpha = alpha
+        self.hysteresis = hysteresis
+        self.max_tags = max_tags
+        self.tag_ttl = tag_ttl
+        self.on_event = on_event
+        self.tags = OrderedDict()
+        self.pending = deque()
+        self.lock = threading.Lock()
+        self.observations = 0
+        self.events = 0
+        self.moves = 0
+        self.evicted = 0
+        self.thread = None
+        self.running = False
+
+    def zone_of(self, reader):
+        return self.zones.get(reader, reader)
+
+    def observe(self, epc, ts, rssi, reader, antenna=1, count=1):
+        """加入一筆讀取（count 為管線彙總的讀取次數）"""
+        zone = self.zone_of(reader)
+        events = []
+        with self.lock:
+            self.observations += count
+            state = self.tags.get(epc)
+            if state is None:
+                state = {'zone': None, 'first': ts, 'last': ts, 'reads': 0, 'signals': {}}
+                self.tags[epc] = state
+                self.pending.append((ts, epc))
+                if len(self.pending) > self.max_tags:
+                    self.pending.popleft()
+                if len(self.tags) > self.max_tags:
+                    self.tags.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self.tags.move_to_end(epc)
+            state['last'] = max(state['last'], ts)
+            state['reads'] += count
+            signals = state['signals']
+            signal = signals.get(zone)
+            if rssi is None:
+                rssi = -100
+            if signal is None or ts - signal[1] > self.window:
+                signals[zone] = [rssi, ts, reader, antenna]
+            else:
+                signal[0] += self.alpha * (rssi - signal[0])
+                signal[1] = max(signal[1], ts)
+                signal[2] = reader
+                signal[3] = antenna
+            if state['zone'] is not None or ts - state['first'] >= self.settle:
+                event = self._decide(epc, state, ts)
+                if event:
+                    events.append(event)
+        self._emit(events)
+
+    def _decide(self, epc, state, now):
+        """依平滑RSSI指派區域，區域改變時傳回事件（呼叫端需持有lock）"""
+        signals = state['signals']
+        for zone in [zone for zone, signal in signals.items() if now - signal[1] > self.window]:
+            del signals[zone]
+        if not signals:
+            return None
+        best = max(signals, key=lambda zone: signals[zone][0])
+        current = state['zone']
+        if best == current:
+            return None
+        if current in signals and signals[best][0] - signals[current][0] < self.hysteresis:
+            return None
+        state['zone'] = best
+        signal = signals[best]
+        if current is not None:
+            self.moves += 1
+        self.events += 1
+        return {
+            'ts': state['last'],
+            'epc': epc,
+            'zone': best,
+            'previous_zone': current,
+            'rssi': round(signal[0], 1),
+            'reader': signal[2],
+            'antenna': signal[3],
+            'readers': len(signals),
+            'count': state['reads']
+        }
+
+    def _emit(self, events):
+        if self.on_event:
+            for event in events:
+                self.on_event(event)
+
+    def flush(self, now=None):
+        """指派已超過 settle 時間但之後沒有再讀到的標籤，並移除閒置標籤"""
+        now = time.time() if now is None else now
+        events = []
+        with self.lock:
+            pending = self.pending
+            while pending and now - pending[0][0] >= self.settle:
+                _, epc = pending.popleft()
+                state = self.tags.get(epc)
+                if state is not None and state['zone'] is None:
+                    event = self._decide(epc, state, max(now, state['last']))
+                    if event is None:
+                        # 時間窗內沒有有效讀取，不指派區域
+                        del self.tags[epc]
+                    else:
+                        events.append(event)
+            tags = self.tags
+            while tags:
+                epc, state = next(iter(tags.items()))
+                if now - state['last'] <= self.tag_ttl:
+                    break
+                del tags[epc]
+                self.evicted += 1
+        self._emit(events)
+
+    def start(self, interval=None):
+        """啟動背景執行緒定期 flush"""
+        if self.running:
+            return
+        self.running = True
+        interval = interval or max(self.settle / 2, 0.05)
+
+        def loop():
+            while self.running:
+                time.sleep(interval)
+                self.flush()
+
+        self.thread = threading.Thread(target=loop, name='zone-fusion', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=1)
+            self.thread = None
+
+    def assignments(self, zone=None, limit=None):
+        """目前各標籤所在區域"""
+        with self.lock:
+            result = [{'epc': epc, 'zone': state['zone'], 'last_seen': state['last']}
+                      for epc, state in self.tags.items()
+                      if state['zone'] is not None and (zone is None or state['zone'] == zone)]
+        return result[:limit] if limit else result
+
+    def stats(self):
+        with self.lock:
+            per_zone = {}
+            for state in self.tags.values():
+                if state['zone'] is not None:
+                    per_zone[state['zone']] = per_zone.get(state['zone'], 0) + 1
+            return {
+                'tags': len(self.tags),
+                'pending': len(self.pending),
+                'observations': self.observations,
+                'events': self.events,
+                'moves': self.moves,
+                'evicted': self.evicted,
+                'zones': per_zone
+            }